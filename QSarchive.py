@@ -108,7 +108,7 @@ def LoadDatabaseAndAddMissingOps(opSet: set[str]) -> Tuple[dict,set[str]]:
         if 'ParseCSV' not in opSet and not opSet.intersection(requireSpreadsheetDBset) and \
                       not Utils.DependenciesModified(clOptions.renderedDatabase,[clOptions.spreadsheetDatabase]):
             try:
-                newDB = Database.LoadDatabase(clOptions.renderedDatabase)
+                newDB = Database.LoadDatabase(clOptions.renderedDatabase,clOptions.compactRecords)
                 return newDB,opSet
             except OSError:
                 pass
@@ -116,7 +116,7 @@ def LoadDatabaseAndAddMissingOps(opSet: set[str]) -> Tuple[dict,set[str]]:
     
     if 'ParseCSV' not in opSet and opSet.intersection(requireSpreadsheetDBset):
         try:
-            newDB = Database.LoadDatabase(clOptions.spreadsheetDatabase)
+            newDB = Database.LoadDatabase(clOptions.spreadsheetDatabase,clOptions.compactRecords)
             return newDB,opSet
         except OSError:
             opSet.add('ParseCSV')
@@ -145,9 +145,9 @@ SplitMp3 - split mp3 files into individual excerpts based on the times in Spread
 Link - try to find valid links to excerpt mp3 files, session mp3 files, and references.
 Render - use pryatemp and markdown to convert excerpts into html and saves to RenderedDatabase.json.
 Build - create html files for all menus and excerpts.
-SetupSearch - create SearchDatabase.json.
+SetupSearch - create SearchDatabase.json and the search shards in assets/search.
 SetupAutoComplete - create AutoCompleteDatabase.json
-SetupFeatured - create FeaturedDatabase.json.
+SetupFeatured - create FeaturedDatabase.json and its date-windowed shards read by the homepage.
 TagMp3 - update the ID3 tags on excerpt mp3 files.
 PrepareUpload - move files that don't need to be uploaded to noUpload directories.
 CheckLinks - validate hyperlinks in documentation files and excerpts.
@@ -161,6 +161,8 @@ parser.add_argument('--skip',type=str,default='',help='A comma-separated list of
 parser.add_argument('--events',type=str,default='All',help='A comma-separated list of event codes to process; Default: All')
 parser.add_argument('--spreadsheetDatabase',type=str,default='pages/assets/SpreadsheetDatabase.json',help='Database created from the csv files; keys match spreadsheet headings; Default: pages/assets/SpreadsheetDatabase.json')
 parser.add_argument('--multithread',**Utils.STORE_TRUE,help="Multithread some operations")
+parser.add_argument('--jobs',type=int,default=1,help="Number of processes used to render excerpts and make excerpt search items; 0 means one per CPU; never more than the number of CPUs; Default: 1")
+parser.add_argument('--compactRecords',**Utils.STORE_TRUE,help="Store excerpts, annotations, sessions, and events as compact records to save memory")
 parser.add_argument('--dumpArgs',**Utils.STORE_TRUE,help="Print the argument parser arguments and exit")
 
 for mod in modules.values():
@@ -252,6 +254,8 @@ for verb in skipOps:
 opSet -= skipOps
 
 database, newOpSet = LoadDatabaseAndAddMissingOps(opSet)
+if database:
+    Database.BuildAnnotationTrees(database["excerpts"])
 if newOpSet != opSet:
     Alert.info(f"Will run additional module(s): {newOpSet.difference(opSet)}.")
     opSet = newOpSet
@@ -261,6 +265,7 @@ for mod in modules.values():
     mod.gDatabase = database
 for mod in utilityModules:
     mod.gDatabase = database
+Utils.NewDatabaseGeneration() # Discard any data cached from a previous database
 
 # Then run the specified operations in sequential order
 initialized = False
@@ -275,6 +280,10 @@ for moduleName in moduleList:
         modules[moduleName].main()
 PrintModuleSeparator("")
 
+if clOptions.debug:
+    Alert.debug("Derived data cache statistics:")
+    Utils.ReportCacheStatistics(Alert.debug)
+
 if clOptions.ignoreTeacherConsent:
     Alert.warning("Teacher consent has been ignored. This should only be used for testing and debugging purposes.")
 if clOptions.includePending:
@@ -1,5 +1,5 @@
 // homepage.js scripts the pages homepage.html and search/Featured.html
-// Both pages rely on ./assets/FeaturedDatabase.json
+// Both pages rely on the shards of the featured database in ./assets/featured written by SetupFeatured.py
 
 import {configureLinks, openLocalPage, framePage} from './frame.js';
 import './autoComplete.js';
@@ -8,7 +8,9 @@ import {SearchQuery,gSearchers,loadSearchDatabase,encodeSearchQuery} from './sea
 const DEBUG = false;
 const PEEK_FUTURE = true;
 
-let gFeaturedDatabase = null; // The global database, loaded from assets/FeaturedDatabase.json
+let gFeaturedDatabase = null; // The featured calendar entries loaded so far, starting with assets/featured/current.json
+let gFeaturedIndex = null; // A promise of assets/featured/index.json, which lists the monthly shards of the calendar
+let gFeaturedShards = {}; // A promise of each monthly shard loaded so far
 let gNavBar = null; // The main navigation bar, set after all DOM content loaded
 
 let gTodaysExcerpt = 0; // the featured excerpt currently displayed on the homepage
@@ -19,7 +21,7 @@ let gRandomExcerpts = []; // The random excerpts we have generated this session.
 function calendarModulus(index) {
     // Return index modulo the length of the calendar
 
-    let excerptCount = gFeaturedDatabase.calendar.length;
+    let excerptCount = gFeaturedDatabase.calendarLength;
     return ((index % excerptCount) + excerptCount) % excerptCount;
 }
 
@@ -35,6 +37,54 @@ function holidayHtml(date) {
     return ""
 }
 
+async function loadFeaturedDatabase() {
+    // Load the calendar entries around today's date.
+    // Fall back to the full database if the shards can't be loaded.
+    try {
+        gFeaturedDatabase = await fetchJson("assets/featured/current.json");
+    } catch (error) {
+        gFeaturedDatabase = await fetchJson("assets/FeaturedDatabase.json");
+        gFeaturedDatabase.calendarLength = gFeaturedDatabase.calendar.length;
+        let excerptIndex = {};
+        gFeaturedDatabase.calendar.forEach((code,index) => {
+            if (!(code in excerptIndex))
+                excerptIndex[code] = index;
+        });
+        gFeaturedIndex = Promise.resolve({months: {},excerptIndex: excerptIndex});
+    }
+    debugLog("Loaded homepage database.");
+}
+
+function featuredIndex() {
+    // Return a promise of assets/featured/index.json
+    if (!gFeaturedIndex)
+        gFeaturedIndex = fetchJson("assets/featured/index.json")
+            .catch((error) => {
+                gFeaturedIndex = null; // Try again next time
+                throw error;
+            });
+    return gFeaturedIndex;
+}
+
+async function loadCalendarEntry(index) {
+    // Return the code of the excerpt featured on calendar day index after loading the shard containing it if needed.
+    if (!(index in gFeaturedDatabase.calendar)) {
+        let month = Object.values((await featuredIndex()).months).find((month) => month.first <= index && index <= month.last);
+        if (!gFeaturedShards[month.file])
+            gFeaturedShards[month.file] = fetchJson(`assets/featured/${month.file}?v=${month.hash}`)
+                .then((shard) => {
+                    Object.assign(gFeaturedDatabase.calendar,shard.calendar);
+                    Object.assign(gFeaturedDatabase.excerpts,shard.excerpts);
+                })
+                .catch((error) => {
+                    delete gFeaturedShards[month.file]; // Try again next time
+                    throw error;
+                });
+        await gFeaturedShards[month.file];
+    }
+    return gFeaturedDatabase.calendar[index];
+}
+
 let gDebugDateOffset = 0;
 function initializeTodaysExcerpt(todaysDate) {
     // Calculate which featured excerpt to display based on today's date
@@ -51,31 +101,36 @@ function initializeTodaysExcerpt(todaysDate) {
     gTodaysHolidayHtml = holidayHtml(todaysDate);
 }
 
-function displayFeaturedExcerpt() {
+async function displayFeaturedExcerpt() {
     // Display the html code for current featured excerpt on search/Featured.html
 
-    let excerptToDisplay = gFeaturedDatabase.calendar[calendarModulus(gTodaysExcerpt + gSearchFeaturedOffset)];
+    let offset = gSearchFeaturedOffset;
+    let calendarIndex = calendarModulus(gTodaysExcerpt + offset);
     
     let title = "Today's featured excerpt";
     let prefix = "";
-    if (gSearchFeaturedOffset > 0 && !(DEBUG && PEEK_FUTURE)) {
-        let excerptCodes = Object.keys(gFeaturedDatabase.excerpts);
-        while (gRandomExcerpts.length < gSearchFeaturedOffset) {
-            let randomIndex = Math.floor(Math.random() * excerptCodes.length);
-            gRandomExcerpts.push(excerptCodes[randomIndex]);
+    if (offset > 0 && !(DEBUG && PEEK_FUTURE)) {
+        let firstDays = Object.values((await featuredIndex()).excerptIndex); // The first calendar day of each excerpt
+        while (gRandomExcerpts.length < offset) {
+            let randomIndex = Math.floor(Math.random() * firstDays.length);
+            gRandomExcerpts.push(firstDays[randomIndex]);
         }
-        excerptToDisplay = gRandomExcerpts[gSearchFeaturedOffset - 1];
-        title = `Random featured excerpt (${gSearchFeaturedOffset})`;
+        calendarIndex = gRandomExcerpts[offset - 1];
+        title = `Random featured excerpt (${offset})`;
     } else {
         let pastDate = new Date();
-        pastDate.setDate(pastDate.getDate() + gSearchFeaturedOffset);
+        pastDate.setDate(pastDate.getDate() + offset);
         prefix = holidayHtml(pastDate);
-        if (gSearchFeaturedOffset != 0) {
+        if (offset != 0) {
             let options = { weekday: 'long', year: 'numeric', month: 'long', day: 'numeric' };
             title = `Excerpt featured on ${pastDate.toLocaleDateString("en-us",options)}`;
         }
     }
 
+    let excerptToDisplay = await loadCalendarEntry(calendarIndex);
+    if (offset !== gSearchFeaturedOffset)
+        return; // The user moved to another excerpt while the shard was loading
+
     let displayArea = document.getElementById("random-excerpt");
     displayArea.innerHTML = prefix + gFeaturedDatabase.excerpts[excerptToDisplay].html;
     configureLinks(displayArea,"search/homepage.html");
@@ -88,7 +143,7 @@ function displayNextFeaturedExcerpt(increment) {
     // display the next or previous (increment = -1) random excerpt
     gSearchFeaturedOffset += increment;
 
-    displayFeaturedExcerpt();
+    return displayFeaturedExcerpt();
 }
 
 // Homepage date display
@@ -243,7 +298,7 @@ function configurePopupMenus(loadedFrame) {
     }
 }
 
-function initializeHomepage() {
+async function initializeHomepage() {
     // This code to configure the homepage runs only for homepage.html
     let featuredExcerptContainer = document.getElementById("todays-excerpt");
     if (!featuredExcerptContainer)
@@ -253,14 +308,15 @@ function initializeHomepage() {
     document.getElementById("details-link").addEventListener("click",function() {
         gSearchFeaturedOffset = 0; // The details link always goes to the excerpt featured on the homepage
     });
-    featuredExcerptContainer.innerHTML = holidayHtml(new Date()) + gFeaturedDatabase.excerpts[gFeaturedDatabase.calendar[gTodaysExcerpt]].shortHtml;
+    let todaysCode = await loadCalendarEntry(gTodaysExcerpt);
+    featuredExcerptContainer.innerHTML = holidayHtml(new Date()) + gFeaturedDatabase.excerpts[todaysCode].shortHtml;
     configureLinks(featuredExcerptContainer,"search/homepage.html");
         // links in excerpts are relative to depth 1 pages
 
     updateDate();
 }
 
-function initializeSearchFeatured() {
+async function initializeSearchFeatured() {
     // This initialization code runs only for search/Featured.html
     let prevButton = document.getElementById("random-prev");
     let nextButton = document.getElementById("random-next");
@@ -272,7 +328,7 @@ function initializeSearchFeatured() {
             displayNextFeaturedExcerpt((event.shiftKey && DEBUG) ? 30: 1);
         });
         initializeTodaysExcerpt();
-        displayNextFeaturedExcerpt(0);
+        await displayNextFeaturedExcerpt(0);
     }
 }
 
@@ -284,20 +340,15 @@ export async function loadHomepage(loadedFrame) {
     gNavBar.querySelector('.main-nav').classList.remove("active");
     
     if (!gFeaturedDatabase) {
-        await fetch('./assets/FeaturedDatabase.json')
-        .then((response) => response.json())
-        .then((json) => {
-            gFeaturedDatabase = json; 
-            debugLog("Loaded homepage database.");
-        });
+        await loadFeaturedDatabase();
         initializeTodaysExcerpt()
     }
 
     highlightNavMenuItem();
     configurePopupMenus(loadedFrame);
 
-    initializeHomepage();
-    initializeSearchFeatured();
+    await initializeHomepage();
+    await initializeSearchFeatured();
     lucide.createIcons(lucide.icons);
 }
 
@@ -321,7 +372,7 @@ function dropdownMenuClick(clickedItem) {
         let searchBar = document.getElementById('floating-search-input');
         searchBar.focus();
         searchBar.value = gQuery;
-        loadSearchDatabase(); // load the search database in preparation for displaying how many excerpts we've found
+        loadSearchDatabase("x"); // load the excerpt search in preparation for displaying how many excerpts we've found
         if (searchBar.value.trim()) // If the search bar contains text, display the auto complete menu
             setTimeout(function() {
                 gAutoComplete.start();
@@ -416,10 +467,47 @@ function setupNavMenuTriggers() {
     });
 }
 
-let gAutoCompleteDatabase = {};
+let gAutoCompleteDatabase = null; // A promise of the full auto complete database, loaded only if there is no prefix index
+let gAutoCompleteIndex = null; // A promise of assets/autocomplete/index.json, which lists the prefix buckets written by SetupAutoComplete.py
+let gAutoCompleteBuckets = {}; // A promise of each prefix bucket loaded so far
 let gQuery = "";
 let gAutoComplete = null;
 
+function fetchJson(url) {
+    return fetch(url).then((response) => response.json());
+}
+
+function normalizeAutoComplete(text) {
+    // Convert to lowercase and remove diacritics as autoComplete.js does with diacritics: true
+    return text.toLowerCase().normalize("NFD").replace(/[\u0300-\u036f]/g, "").normalize("NFC");
+}
+
+async function autoCompleteEntries(query) {
+    // Return the auto complete entries which could match query.
+    // autoComplete.js matches query anywhere in an entry, so these are the entries in the bucket
+    // for the first characters of query, which contains every entry with those characters.
+    // Fall back to the full database if the prefix index can't be loaded.
+    if (!gAutoCompleteIndex)
+        gAutoCompleteIndex = fetchJson("assets/autocomplete/index.json").catch(() => null);
+    let index = await gAutoCompleteIndex;
+    if (!index) {
+        if (!gAutoCompleteDatabase)
+            gAutoCompleteDatabase = fetchJson("assets/AutoCompleteDatabase.json");
+        return gAutoCompleteDatabase;
+    }
+
+    let bucket = index.buckets[normalizeAutoComplete(query).slice(0,index.prefixLength)];
+    if (!bucket)
+        return []; // No entry contains these characters
+    if (!gAutoCompleteBuckets[bucket.file])
+        gAutoCompleteBuckets[bucket.file] = fetchJson(`assets/autocomplete/${bucket.file}?v=${bucket.hash}`)
+            .catch((error) => {
+                delete gAutoCompleteBuckets[bucket.file]; // Try again next time
+                throw error;
+            });
+    return gAutoCompleteBuckets[bucket.file];
+}
+
 function setupAutoComplete() {
     // Code to configure floating menu autocomplete functionality
     // See https://tarekraafat.github.io/autoComplete.js/#/usage for details
@@ -428,19 +516,16 @@ function setupAutoComplete() {
         placeHolder: "Search the teachings...",
         diacritics: true, // Don't be picky about diacritics
         data: {
-            src: async () => {
+            src: async (query) => {
                 try {
-                    // Fetch External Data Source
-                    const source = await fetch("assets/AutoCompleteDatabase.json");
-                    gAutoCompleteDatabase = await source.json();
-                    // Returns Fetched data
-                    return gAutoCompleteDatabase;
+                    // Fetch only the entries which could match query
+                    return await autoCompleteEntries(query);
                 } catch (error) {
                     return error;
                 }
             },
             keys: ["short","long","number"],
-            cache: true,
+            cache: false, // autoCompleteEntries caches the buckets it fetches
             filter: (results) => {
                 // Filter entries that link to the same file
                 let links = new Set();
@@ -579,7 +664,7 @@ document.addEventListener('DOMContentLoaded', () => {
     setupOptionalSuttaRefs();
 
     if (DEBUG) { // Configure keyboard shortcuts to change homepage featured excerpt
-        document.addEventListener("keydown", function(event) {
+        document.addEventListener("keydown", async function(event) {
             let featuredExcerptContainer = document.getElementById("todays-excerpt");
             if (!featuredExcerptContainer)
                 return;
@@ -592,8 +677,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 let debugDate = new Date();
                 debugDate.setDate(debugDate.getDate() + gDebugDateOffset);
                 initializeTodaysExcerpt(debugDate);
+                let excerptCode = await loadCalendarEntry(gTodaysExcerpt);
                 featuredExcerptContainer.innerHTML = gTodaysHolidayHtml + 
-                    gFeaturedDatabase.excerpts[gFeaturedDatabase.calendar[gTodaysExcerpt]].shortHtml;
+                    gFeaturedDatabase.excerpts[excerptCode].shortHtml;
                 configureLinks(featuredExcerptContainer,"search/homepage.html");
                 updateDate(debugDate);
             }
@@ -61,18 +61,48 @@ function modulus(numerator,denominator) {
     return ((numerator % denominator) + denominator) % denominator;
 }
 
-export async function loadSearchDatabase() {
-    if (!gSearchDatabase) {
-        await fetch('./assets/SearchDatabase.json')
-        .then((response) => response.json())
-        .then((json) => {
-            gSearchDatabase = json; 
-            debugLog("Loaded search database.");
-            for (let code in gSearchers) {
-                gSearchers[code].loadItemsFomDatabase(gSearchDatabase)
+function fetchSearchShard(shard) {
+    // Fetch a file listed in the search manifest. The hash changes whenever the file does, so browsers cache it until then.
+    return fetch(`${SEARCH_DIRECTORY}${shard.file}?v=${shard.hash}`)
+        .then((response) => response.json());
+}
+
+function loadSearchCode(manifest,code) {
+    // Return a promise that resolves when search code and its index have been loaded and passed to the searchers.
+    if (!gSearchLoads[code]) {
+        let entry = manifest.searches[code];
+        // The index and link results are optional; without them we match the query against every item.
+        let index = entry.index ? fetchSearchShard(entry.index).catch(() => null) : Promise.resolve(null);
+        if (!gSearchLinkResults)
+            gSearchLinkResults = manifest.links ? fetchSearchShard(manifest.links).catch(() => ({})) : Promise.resolve({});
+        gSearchLoads[code] = Promise.all([Promise.all(entry.shards.map(fetchSearchShard)),index,gSearchLinkResults])
+        .then(([shards,indexData,linkResults]) => {
+            let search = shards[0];
+            for (let shard of shards.slice(1)) { // Append the items of the remaining shards and merge their other keys
+                search.items.push(...shard.items);
+                for (let key in shard) {
+                    if (key !== "items")
+                        search[key] = Object.assign(search[key] || {},shard[key]);
+                }
+            }
+            gSearchDatabase.searches[code] = search;
+            debugLog("Loaded search",code,"from",shards.length,"shard(s).");
+            for (let searchCode in gSearchers) {
+                gSearchers[searchCode].loadSearch(code,gSearchDatabase,indexData,linkResults[code] || null);
             }
         });
     }
+    return gSearchLoads[code];
+}
+
+export async function loadSearchDatabase(searchKind = null) {
+    // Load the searches used by gSearchers[searchKind] from the shards in assets/search.
+    // searchKind = null loads all searches.
+    if (!gSearchManifest)
+        gSearchManifest = fetch(`${SEARCH_DIRECTORY}manifest.json`).then((response) => response.json());
+    let manifest = await gSearchManifest;
+    let codes = searchKind ? gSearchers[searchKind].searchCodes() : Object.keys(manifest.searches);
+    await Promise.all(codes.map((code) => loadSearchCode(manifest,code)));
 }
 
 export async function loadSearchPage() {
@@ -99,9 +129,7 @@ export async function loadSearchPage() {
     if (!query)
         document.getElementById("search-text").focus();
 
-    await loadSearchDatabase();
-
-    searchFromURL();
+    await searchFromURL();
     if (query) // Set the scroll position after displaying search results.
         scrollToInitialPosition();
 }
@@ -150,6 +178,76 @@ function substituteWildcards(regExpString) {
     return bounded.replaceAll("\\*",`[^${ESCAPED_HTML_CHARS}]*?`).replaceAll("_",`[^${ESCAPED_HTML_CHARS}]`).replaceAll("\\$","\\b");
 }
 
+function intersectSorted(a,b) {
+    // Return the intersection of two sorted arrays of numbers
+    let result = [];
+    let i = 0, j = 0;
+    while (i < a.length && j < b.length) {
+        if (a[i] < b[j])
+            i++;
+        else if (a[i] > b[j])
+            j++;
+        else {
+            result.push(a[i]);
+            i++; j++;
+        }
+    }
+    return result;
+}
+
+function unionSorted(arrays) {
+    // Return the union of sorted arrays of numbers as a sorted array
+    return [...new Set(arrays.flat())].sort((a,b) => a - b);
+}
+
+class SearchIndex {
+    // The n-gram index of one search kind written by SetupSearch.SearchIndex.
+    // postings maps each n-gram to the delta-encoded list of items whose blobs contain it.
+    // N-grams which occur in too many items to be useful are listed in common and have no postings.
+    gramLength; // The length of the indexed n-grams
+    itemCount; // The number of items in this search
+    common; // A Set of n-grams that aren't indexed
+    encodedPostings; // The delta-encoded posting lists from the index file
+    decodedPostings = new Map(); // Posting lists we have already decoded
+
+    constructor(indexData) {
+        this.gramLength = indexData.gramLength;
+        this.itemCount = indexData.itemCount;
+        this.common = new Set(indexData.common);
+        this.encodedPostings = indexData.postings;
+    }
+
+    postings(gram) {
+        // Return the sorted item numbers containing gram; null if gram is too common to be indexed.
+        if (this.common.has(gram))
+            return null;
+        let postings = this.decodedPostings.get(gram);
+        if (!postings) {
+            postings = [];
+            let itemNumber = 0;
+            for (const delta of (Object.hasOwn(this.encodedPostings,gram) ? this.encodedPostings[gram] : [])) {
+                itemNumber += delta;
+                postings.push(itemNumber);
+            }
+            this.decodedPostings.set(gram,postings);
+        }
+        return postings;
+    }
+
+    literalCandidates(literals) {
+        // Return the items which contain all of literals; null means all items.
+        let result = null;
+        for (const literal of literals) {
+            for (let n = 0; n + this.gramLength <= literal.length; n++) {
+                let postings = this.postings(literal.slice(n,n + this.gramLength));
+                if (postings)
+                    result = result ? intersectSorted(result,postings) : postings;
+            }
+        }
+        return result;
+    }
+}
+
 class SearchBase {
     // Abstract search class; matches either nothing or everything depending on negate
     negate = false; // This flag negates the search
@@ -167,6 +265,12 @@ class SearchBase {
         return result;
     }
 
+    candidates(index) {
+        // Return a sorted array of the numbers of items that could match this search; null means all items.
+        // The candidates always include every matching item.
+        return null;
+    }
+
     regExpBits() { 
         // Return a list of regular expressions included in the search.
         // Used to sort the search results.
@@ -180,6 +284,7 @@ class SearchTerm extends SearchBase {
     matcher; // A RegEx created from searchElement
     matchesMetadata = false; // Does this search term apply to metadata?
     rawRegExp = false; // Was this created from a raw regular expression enclosed in backquotes?
+    literals = []; // Strings that every matching blob must contain; used to narrow the search with SearchIndex
     boldTextMatcher = ""; // A RegEx string used to highlight this term when displaying results
 
     constructor(searchElement) {
@@ -218,6 +323,7 @@ class SearchTerm extends SearchBase {
             unwrapped = unwrapped.replace(/(\W)\$$/,"$1");
             // Replace inner * and $ with appropriate operators.
             escaped = substituteWildcards(unwrapped);
+            this.literals = unwrapped.split(/[*_$]/).filter((s) => s);
             
 
             finalRegEx = escaped;
@@ -270,6 +376,12 @@ class SearchTerm extends SearchBase {
         return this.negate;
     }
 
+    candidates(index) {
+        if (this.negate || this.rawRegExp)
+            return null;
+        return index.literalCandidates(this.literals);
+    }
+
     regExpBits() {
         return this.negate ? [] : [this.matcher];
     }
@@ -296,6 +408,18 @@ class SearchGroup extends SearchBase {
         return this.negate; // Subclasses must implement this for functionality
     }
 
+    candidates(index) { // Items must match all terms by default
+        if (this.negate)
+            return null;
+        let result = null;
+        for (const term of this.terms) {
+            let termCandidates = term.candidates(index);
+            if (termCandidates)
+                result = result ? intersectSorted(result,termCandidates) : termCandidates;
+        }
+        return result;
+    }
+
     get boldTextMatcher() {
         // Join the regular expressions of our terms with "|" to match any of them
         let boldRegExps = this.terms.map((term) => term.boldTextMatcher).filter((regExp) => regExp);
@@ -342,6 +466,15 @@ class SearchOr extends SearchGroup {
         }
         return this.negate;
     }
+
+    candidates(index) {
+        if (this.negate)
+            return null;
+        let termCandidates = this.terms.map((term) => term.candidates(index));
+        if (termCandidates.includes(null))
+            return null;
+        return unionSorted(termCandidates);
+    }
 }
 
 class SingleItemSearch extends SearchGroup {
@@ -369,6 +502,7 @@ export class SearchQuery {
     // An array of searchGroups that describes an entire search query
     searcher; // A searchGroup representing the query
     queryText; // The text of the query
+    strict; // Must all terms match a single blob?
     boldTextRegex; // A regular expression matching found texts which should be displayed in bold
 
     constructor(queryText,strict=false) {
@@ -385,6 +519,7 @@ export class SearchQuery {
             // Blobs do not contain the character "\", so a non-RegExp query containing "\" won't match anything anyway. 
         queryText = queryText.normalize("NFD").replace(/[\u0300-\u036f]/g, ""); // https://stackoverflow.com/questions/990904/remove-accents-diacritics-in-a-string-in-javascript
         this.queryText = queryText;
+        this.strict = strict;
 
         // 1. Build a regex to parse queryText into items
         let regularTextParts = [
@@ -469,12 +604,17 @@ export class SearchQuery {
         let newSearcher = strict ? new SingleItemSearch() : new SearchAnd();
         newSearcher.terms = this.searcher.terms;
         this.searcher = newSearcher;
+        this.strict = strict;
     }
 
     filterItems(items) { // Return an array containing items that match all groups in this query
         return this.searcher.filterItems(items);
     }
 
+    candidates(index) { // Return the numbers of the items that could match this query; null means all items
+        return this.searcher.candidates(index);
+    }
+
     displayMatchesInBold(string) { // Add <b> and </b> tags to string to display matches in bold
         let boldRegExp = this.boldTextRegex;
         function boldText(text) {
@@ -569,6 +709,8 @@ class Searcher {
         // database[n].blobs: an array of search blobs to match
         // database[n].html: the html code to display this item when found
     query = null; // A searchQuery object describing the search
+    index = null; // A SearchIndex object used to narrow the items we match against the query
+    linkResults = {}; // The delta-encoded item numbers found by the queries of search links in the website
     foundItems = []; // The items we have found.
     multiSearcher = null; // Set to the MultiSearcher object we are part of.
     
@@ -584,10 +726,38 @@ class Searcher {
         this.items = database.searches[this.code].items;
     }
 
+    searchCodes() { // Return the codes of the searches we need to load
+        return [this.code];
+    }
+
+    loadSearch(code,database,indexData,linkResults) {
+        // Called when search code has been loaded into database; indexData is its index or null.
+        // linkResults contains the precomputed results of search link queries or is null.
+        // Ignore the index and link results if they don't match the database.
+        if (code !== this.code)
+            return;
+        this.loadItemsFomDatabase(database);
+        if (indexData && indexData.itemCount === this.items.length)
+            this.index = new SearchIndex(indexData);
+        if (linkResults && linkResults.itemCount === this.items.length)
+            this.linkResults = linkResults.results;
+    }
+
     search(searchQuery) {
         debugLog(this.name,"search.");
         this.query = searchQuery
-        this.foundItems = searchQuery.filterItems(this.items);
+        if (!searchQuery.strict && Object.hasOwn(this.linkResults,searchQuery.queryText)) {
+            debugLog("Using the precomputed results of this query.");
+            let itemNumber = 0;
+            this.foundItems = this.linkResults[searchQuery.queryText].map((delta) => this.items[itemNumber += delta]);
+            return;
+        }
+        let candidates = this.index ? searchQuery.candidates(this.index) : null;
+        if (candidates) {
+            debugLog("Index narrowed search to",candidates.length,"of",this.items.length,"items.");
+            this.foundItems = searchQuery.filterItems(candidates.map((n) => this.items[n]));
+        } else
+            this.foundItems = searchQuery.filterItems(this.items);
     }
 
     renderItems(startItem = 0,endItem = null) {
@@ -833,6 +1003,46 @@ class PagedSearcher extends Searcher {
     }
 }
 
+function expandHtml(search) {
+    // Prepare to expand the excerpt html compressed by SetupSearch.CompressExcerptHtml.
+    // Tokens ^<key><parameters separated by |>^ expand into htmlTemplates[key];
+    // tokens ^<number>^ refer to the token bodies in htmlDictionary.
+    // Each item's html is expanded the first time it is read, so we only expand the excerpts we display.
+    if (!search.htmlTemplates)
+        return; // The html is not compressed or has already been prepared
+    let templateParts = {}; // Even elements are literal text; odd elements are parameter numbers
+    for (let key in search.htmlTemplates)
+        templateParts[key] = search.htmlTemplates[key].split(/\{(\d)\}/);
+    function expandBody(body) {
+        let parameters = body.slice(1).split("|");
+        let parts = templateParts[body[0]];
+        let expanded = parts[0];
+        for (let n = 1; n < parts.length; n += 2)
+            expanded += parameters[parts[n]] + parts[n + 1];
+        return expanded;
+    }
+    let dictionary = search.htmlDictionary.map((body) => body ? expandBody(body) : ""); // Unused numbers hold ""
+    function expand(html) {
+        let bits = html.split("^"); // Token marks only occur in pairs, so odd elements are tokens
+        for (let n = 1; n < bits.length; n += 2)
+            bits[n] = /^\d/.test(bits[n]) ? dictionary[bits[n]] : expandBody(bits[n]);
+        return bits.join("");
+    }
+
+    for (let item of search.items) {
+        let compressed = item.html;
+        Object.defineProperty(item,"html",{configurable: true, enumerable: true,
+            get() { // Replace this getter with the expanded html
+                let html = expand(compressed);
+                Object.defineProperty(item,"html",{value: html, writable: true, enumerable: true});
+                return html;
+            }
+        });
+    }
+    delete search.htmlTemplates;
+    delete search.htmlDictionary;
+}
+
 function uniqueMatches(regExp,stringList) {
     // Given a regular expression (with /g flag) and a list of strings, return the Set of unique matches
     // Each match must include at least one letter.
@@ -968,6 +1178,7 @@ export class ExcerptSearcher extends PagedSearcher {
 
     loadItemsFomDatabase(database) {
         // Called after SearchDatabase.json is loaded to prepare for searching
+        expandHtml(database.searches[this.code]);
         super.loadItemsFomDatabase(database);
         this.sessionHeader = database.searches[this.code].sessionHeader;
         gCommonWordBlob = database.searches[this.code].commonWordBlob;
@@ -1159,6 +1370,16 @@ class MultiSearcher {
         }
     }
 
+    searchCodes() {
+        return [...new Set(this.searches.flatMap((s) => s.searchCodes()))];
+    }
+
+    loadSearch(code,database,indexData,linkResults) {
+        for (let s of this.searches) {
+            s.loadSearch(code,database,indexData,linkResults);
+        }
+    }
+
     search(searchQuery) {
         debugLog("Multisearch.");
         this.query = searchQuery;
@@ -1207,17 +1428,14 @@ class MultiSearcher {
     }
 }
 
-function searchFromURL() {
+async function searchFromURL() {
     // Find excerpts matching the search query from the page URL.
-    if (!gSearchDatabase) {
-        debugLog("Error: database not loaded.");
-        return;
-    }
-
     let params = frameSearch();
     let query = params.has("q") ? decodeSearchQuery(decodeURIComponent(params.get("q"))) : "";
     let searchKind = params.has("search") ? decodeURIComponent(params.get("search")) : "all";
 
+    await loadSearchDatabase(searchKind);
+
     debugLog("Called searchFromURL. Query:",query);
     frame.querySelector('#search-text').value = query;
 
@@ -1268,7 +1486,11 @@ function searchButtonClick(searchKind) {
     searchFromURL();
 }
 
-let gSearchDatabase = null; // The global search database, loaded from assets/SearchDatabase.json
+const SEARCH_DIRECTORY = './assets/search/'; // SetupSearch.py writes the search shards and manifest.json here
+let gSearchManifest = null; // A promise of manifest.json, which lists the shards of each search and their hashes
+let gSearchLoads = {}; // A promise for each search code that resolves when the search has been loaded
+let gSearchLinkResults = null; // A promise of links.json, the precomputed results of the queries in search links
+let gSearchDatabase = {searches: {}}; // The searches loaded so far in the format of assets/SearchDatabase.json
 
 let gTextSearcher = new TruncatedSearcher("p","text",8);
 gTextSearcher.nameInResults = "Sutta and Vinaya texts";
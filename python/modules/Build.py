@@ -19,7 +19,6 @@ from enum import Enum
 import itertools
 import FileRegister
 from contextlib import nullcontext
-from functools import lru_cache
 import urllib.parse
 
 BASE_MENU_STYLE = dict(separator="\n"+6*" ",highlight={"class":"active"})
@@ -220,9 +219,13 @@ def EncodeSearchQuery(query: str) -> str:
     encoding = {charsToEncode[n]:chr(0xA4 + n) for n in range(len(charsToEncode))}
     return re.sub(f"[{charsToEncode}]",lambda m:encoding[m[0]],query)
 
+gSearchLinks:set[tuple[str,str]] = set() # (searchType,query) for every link made by SearchLink; SetupSearch precomputes their results
+gBuiltAllPages = False # Set by main if it built every page, so that gSearchLinks contains the links in all pages
+gRenderedAllExcerpts = False # Set by Render.main if it rendered every excerpt, so that gSearchLinks contains the links in all excerpts
 def SearchLink(query:str,searchType:str = "x",featured:bool = True,relevant: bool = True) -> str:
     """Returns a link to the search page with a specifed search string."""
 
+    gSearchLinks.add((searchType,query))
     query = EncodeSearchQuery(query)
     queryDict = {"q":query,"search":searchType}
     if featured:
@@ -265,6 +268,12 @@ def ListLinkedTeachers(teachers:List[str],*args,**kwargs) -> str:
     """Write a list of hyperlinked teachers.
     teachers is a list of abbreviated teacher names"""
     
+    return LinkedTeacherList(tuple(teachers),*args,**kwargs)
+
+@Utils.CacheDerivedData
+def LinkedTeacherList(teachers:tuple[str],*args,**kwargs) -> str:
+    "Implement ListLinkedTeachers, caching the result for each tuple of teachers."
+
     fullNameList = [gDatabase["teacher"][t]["attributionName"] for t in teachers]
     
     return LinkTeachersInText(ItemList(fullNameList,*args,**kwargs))
@@ -335,7 +344,7 @@ def IndentedHtmlTagList(tagList:list[dict] = [],showSubtagCount = True,showStar
     
     return str(a)
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def DrilldownTemplate(showStar:bool = False) -> pyratemp.Template:
     """Return a pyratemp template for an indented list of tags which can be expanded using
     the javascript toggle-view class.
@@ -3009,6 +3018,7 @@ def YieldAllIf(iterator:Iterator,yieldAll:bool) -> Iterator:
         yield next(iter(iterator))
 
 def main():
+    global gBuiltAllPages
     if not os.path.exists(gOptions.pagesDir):
         os.makedirs(gOptions.pagesDir)
     
@@ -3074,6 +3084,7 @@ def main():
         WriteIndexPages(writer)
         WriteRedirectPages(writer)
         Alert.extra("html files:",writer.StatusSummary())
+        gBuiltAllPages = gOptions.buildOnly == gAllSections and not limitedBuild
         if not limitedBuild:
             if gOptions.buildOnly == gAllSections and writer.Count(FileRegister.Status.STALE):
                 Alert.extra("stale files:",writer.FilesWithStatus(FileRegister.Status.STALE))
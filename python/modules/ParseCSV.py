@@ -925,14 +925,16 @@ def AddAnnotation(database: dict, excerpt: dict,annotation: dict) -> None:
     
     excerpt["annotations"].append(annotation)
 
-gAuthorRegexList = None
 def ReferenceAuthors(textToScan: str) -> list[str]:
-    global gAuthorRegexList
-    if not gAuthorRegexList:
-        gAuthorRegexList = Render.ReferenceMatchRegExs(gDatabase["reference"])
+    matcher = Render.ReferenceMatchers()
+    regexList = []
+    if matcher.LinkCandidate(textToScan):
+        regexList += [matcher.form2,matcher.form3]
+    if matcher.PageCandidate(textToScan):
+        regexList.append(matcher.form4)
     authors = []
-    for regex in gAuthorRegexList:
-        matches = re.findall(regex,textToScan,flags = re.IGNORECASE)
+    for regex in regexList:
+        matches = regex.findall(textToScan)
         for match in matches:
             Utils.ExtendUnique(authors,gDatabase["reference"][match[0].lower()]["author"])
 
@@ -1731,6 +1733,9 @@ def main():
     SortTags(gDatabase)
     IndexTags(gDatabase)  
     CountSubtagExcerpts(gDatabase)
+    Database.InternVocabulary(gDatabase)
+    Database.BuildAnnotationTrees(gDatabase["excerpts"])
+    Utils.NewDatabaseGeneration() # Discard data cached from the partially built database
 
     gDatabase["keyCaseTranslation"] = {key:gCamelCaseTranslation[key] for key in sorted(gCamelCaseTranslation)}
 
@@ -1739,7 +1744,6 @@ def main():
     Alert.extra("Spreadsheet database contents:",indent = 0)
     Utils.SummarizeDict(gDatabase,Alert.extra)
 
-    with open(gOptions.spreadsheetDatabase, 'w', encoding='utf-8') as file:
-        json.dump(gDatabase, file, ensure_ascii=False, indent=2)
+    Database.WriteDatabase(gDatabase,gOptions.spreadsheetDatabase)
 
     Alert.info(Build.ExcerptDurationStr(gDatabase["excerpts"],countSessionExcerpts=True,sessionExcerptDuration=False),indent = 0)
\ No newline at end of file
@@ -59,10 +59,8 @@ def MinifyDatabases(minify: bool) -> None:
     for databaseFile in ["SearchDatabase.json","AutoCompleteDatabase.json","FeaturedDatabase.json"]:
         databaseFile = Utils.PosixJoin("pages/assets",databaseFile)
 
-        with open(databaseFile, 'r', encoding='utf-8') as file:
-            database = json.load(file)
-        with open(databaseFile, 'w', encoding='utf-8') as file:
-            json.dump(database,file,ensure_ascii=False,indent = None if minify else 2)
+        database = Utils.ReadJson(databaseFile)
+        Utils.WriteJson(database,databaseFile,indent = None if minify else 2)
 
 def CheckJavascriptFiles() -> None:
     "Print cautions if debug flags are set in .js files."
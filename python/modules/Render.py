@@ -3,15 +3,18 @@ The only remaining work for Build.py to do is substitute the list of teachers fo
 
 from __future__ import annotations
 
-import json, re
+import os, json, re, time, hashlib
+from collections import Counter
+from contextlib import contextmanager, nullcontext
 import markdown
 import Database
+import markdown_newtab_remote
 from markdown_newtab_remote import NewTabRemoteExtension
 from typing import Tuple, Type, Callable, TypedDict, Iterable, NamedTuple
 from inspect import signature
 import pyratemp
 from functools import lru_cache
-import ParseCSV, Build, Utils, Alert, Link, Filter
+import ParseCSV, Build, Utils, Alert, Link, Filter, TextUtils
 import Suttaplex
 import Html2 as Html
 import urllib.parse
@@ -27,23 +30,36 @@ def FStringToPyratemp(fString: str) -> str:
     
     return fString.replace("{","$!").replace("}","!$")
     
-def ApplyToBodyText(transform: Callable[...,Tuple[str,int]]) -> int:
-    """Apply operation transform on each string considered body text in the database.
-    transform can have the form transform(bodyText,item) or transform(bodyText).
-    transform returns a tuple (changedText,changeCount). Return the total number of changes made."""
-
+def TwoVariableTransform(transform: Callable[...,Tuple[str,int]]) -> Callable[[str,dict],Tuple[str,int]]:
+    "Convert transform(bodyText) to the form transform(bodyText,item)."
     if len(signature(transform).parameters) == 1:
-        twoVariableTransform = lambda bodyStr,_: transform(bodyStr)
+        return lambda bodyStr,_: transform(bodyStr)
     else:
-        twoVariableTransform = transform
+        return transform
+
+def ApplyToExcerpts(transform: Callable[...,Tuple[str,int]]) -> int:
+    """Apply transform to the body text of the excerpts to render and their annotations only.
+    Return the total number of changes made."""
+
+    twoVariableTransform = TwoVariableTransform(transform)
 
     changeCount = 0
-    for x in gDatabase["excerpts"]:
+    for x in ExcerptsToRender():
         x["body"],count = twoVariableTransform(x["body"],x)
         changeCount += count
         for a in x["annotations"]:
             a["body"],count = twoVariableTransform(a["body"],a)
             changeCount += count
+    return changeCount
+
+def ApplyToBodyText(transform: Callable[...,Tuple[str,int]]) -> int:
+    """Apply operation transform on each string considered body text in the database.
+    transform can have the form transform(bodyText,item) or transform(bodyText).
+    transform returns a tuple (changedText,changeCount). Return the total number of changes made."""
+
+    twoVariableTransform = TwoVariableTransform(transform)
+
+    changeCount = ApplyToExcerpts(twoVariableTransform)
 
     for e in gDatabase["event"].values():
         e["description"],count = twoVariableTransform(e["description"],e)
@@ -74,7 +90,120 @@ def ApplyToBodyText(transform: Callable[...,Tuple[str,int]]) -> int:
             changeCount += count
 
     return changeCount
-    
+
+class TransformStage():
+    "A transform within a TextTransformPipeline and its statistics."
+    def __init__(self,transform: Callable[...,Tuple[str,int]],name: str) -> None:
+        self.transform = TwoVariableTransform(transform)
+        self.name = name
+        self.count = 0      # Total changes made by this transform
+        self.time = 0.0     # Total seconds spent in this transform if the pipeline is timed
+        self.calls = 0      # The number of strings transformed if the pipeline is timed
+
+class TextTransformPipeline():
+    """Apply a sequence of transforms to each body text string in a single traversal of the database.
+    Transforms have the same form as those passed to ApplyToBodyText and are applied in the order they are added.
+    Each transform must depend only on the string and item it is given, not on the state of other items."""
+
+    def __init__(self,timed: bool = False) -> None:
+        self.stages:list[TransformStage] = []
+        self.reports:list[Callable[[],None]] = []
+        self.timed = timed
+
+    def Add(self,transform: Callable[...,Tuple[str,int]],name: str = "") -> TransformStage:
+        "Add transform to the end of the pipeline. Its change count is available in .count after Apply."
+        stage = TransformStage(transform,name or transform.__name__)
+        self.stages.append(stage)
+        return stage
+
+    def AfterApply(self,report: Callable[[],None]) -> None:
+        "Call report after the pipeline has been applied; typically to print change counts."
+        self.reports.append(report)
+
+    def Transform(self,bodyStr: str,item: dict|None = None) -> Tuple[str,int]:
+        "Apply all transforms to bodyStr."
+        changeCount = 0
+        if self.timed:
+            for stage in self.stages:
+                startTime = time.perf_counter()
+                bodyStr,count = stage.transform(bodyStr,item)
+                stage.time += time.perf_counter() - startTime
+                stage.calls += 1
+                stage.count += count
+                changeCount += count
+        else:
+            for stage in self.stages:
+                bodyStr,count = stage.transform(bodyStr,item)
+                stage.count += count
+                changeCount += count
+        return bodyStr,changeCount
+
+    def Apply(self,ApplyToFunction:Callable = ApplyToBodyText) -> int:
+        "Apply the pipeline using ApplyToFunction, then call the reports. Return the total number of changes."
+        changeCount = ApplyToFunction(self.Transform)
+        for report in self.reports:
+            report()
+        return changeCount
+
+    def ReportTiming(self,printer: Alert.AlertClass) -> None:
+        "Print the change count and time spent in each stage."
+        for stage in self.stages:
+            timeStr = f", {stage.time:.3f} seconds" if self.timed else ""
+            printer(f"{stage.name}: {stage.count} changes{timeStr}")
+
+class RenderProfiler():
+    """Accumulate the wall time and call count of each stage of Render (--profileRender).
+    Categories are: stage - the steps of Render.main; transform - each body text transform;
+    kind - RenderItem by excerpt or annotation kind."""
+
+    categories = ("stage","transform","kind")
+
+    def __init__(self) -> None:
+        self.timings:dict[str,dict[str,list]] = {category:{} for category in self.categories}
+            # timings[category][name] = [seconds,calls]
+
+    def Add(self,category: str,name: str,seconds: float,calls: int = 1) -> None:
+        entry = self.timings[category].setdefault(name,[0.0,0])
+        entry[0] += seconds
+        entry[1] += calls
+
+    @contextmanager
+    def Stage(self,name: str):
+        "Time the code within this context as a stage."
+        startTime = time.perf_counter()
+        yield
+        self.Add("stage",name,time.perf_counter() - startTime)
+
+    def AddPipeline(self,pipeline: TextTransformPipeline) -> None:
+        "Add the times of the stages of a timed pipeline."
+        for stage in pipeline.stages:
+            self.Add("transform",stage.name,stage.time,stage.calls)
+
+    def Merge(self,other: RenderProfiler) -> None:
+        "Add the timings recorded by other, e.g. in a worker process."
+        for category,timings in other.timings.items():
+            for name,(seconds,calls) in timings.items():
+                self.Add(category,name,seconds,calls)
+
+    def Report(self,printer: Alert.AlertClass) -> None:
+        "Print the timings in each category sorted by total time."
+        for category in self.categories:
+            printer(f"Render profile by {category}:",indent = 0)
+            for name,(seconds,calls) in sorted(self.timings[category].items(),key=lambda item: -item[1][0]):
+                printer(f"{seconds:8.3f} s {calls:7} calls {1000 * seconds / max(calls,1):8.3f} ms/call   {name}")
+
+    def Write(self,filename: str) -> None:
+        "Write the timings to a json file for comparison between runs."
+        output = {category:{name:{"seconds": round(seconds,6),"calls": calls} for name,(seconds,calls) in timings.items()}
+                  for category,timings in self.timings.items()}
+        Utils.WriteJson(output,filename)
+
+gProfiler:RenderProfiler|None = None # Set if --profileRender is specified
+
+def ProfileStage(name: str):
+    "Return a context which times a Render stage if we are profiling."
+    return gProfiler.Stage(name) if gProfiler else nullcontext()
+
 
 def ExtractAttribution(form: str) -> Tuple[str,str]:
     """Split the form into body and attribution parts, which are separated by ||.
@@ -165,7 +294,7 @@ class TextRuleMatcher(TypedDict):
 
     matchFields = ("uid","n0","refCount","translator")   # The fields to match
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def TextRuleMatchers() -> dict[TextRuleMatcher]:
     """Evaluate the set operations in gDatabase["textLink"] to create Render.gTextRuleMatchers"""
 
@@ -193,7 +322,7 @@ def TextRuleMatchers() -> dict[TextRuleMatcher]:
 
 def AddImplicitAttributions() -> None:
     "If an excerpt or annotation of kind Reading doesn't have a Read by annotation, attribute it to the session or excerpt teachers"
-    for session,x in Database.PairWithSession(gDatabase["excerpts"]):
+    for session,x in Database.PairWithSession(ExcerptsToRender()):
         if x["kind"] == "Reading":
             readBy = [a for a in x["annotations"] if a["kind"] == "Read by"]
             if not readBy:
@@ -215,6 +344,21 @@ def AddImplicitAttributions() -> None:
 def CompileTemplate(template: str) -> Type[pyratemp.Template]:
     return pyratemp.Template(template)
 
+@lru_cache(maxsize = 4096)
+def EvaluateTemplate(template: str,renderItems: tuple[tuple[str,str]]) -> str:
+    """Evaluate template using the frozen render dictionary renderItems.
+    Many annotations (e.g. Read by) render identically, so we cache the results."""
+    return CompileTemplate(template)(**dict(renderItems))
+
+gTemplateCacheStatistics = Counter() # EvaluateTemplate cache hits and misses in worker processes
+
+def ReportTemplateCache(printer: Alert.AlertClass) -> None:
+    "Print the EvaluateTemplate cache statistics for this process and its workers."
+    info = EvaluateTemplate.cache_info()
+    hits = info.hits + gTemplateCacheStatistics["hits"]
+    misses = info.misses + gTemplateCacheStatistics["misses"]
+    printer(f"Template cache: {hits} hits, {misses} misses, {info.currsize} entries (maximum {info.maxsize}).")
+
 def AppendAnnotationToExcerpt(a: dict, x: dict) -> None:
     "Append annotation a to the end of excerpt x."
 
@@ -239,13 +383,19 @@ def AppendAnnotationToExcerpt(a: dict, x: dict) -> None:
     del a["attribution"]
         
 
+formNumberRegex = re.compile(r"[0-9]+")
+smartDoubleQuoteRegex = re.compile(r"[“”]")
+lowercaseStartRegex = re.compile(r"\s*[a-z]")
+fullStopRegex = re.compile(r"[.?!][^a-zA-Z]*\{attribution\}")
+firstLetterRegex = re.compile(r"^[^<]*?[a-zA-Z]")
+
 def RenderItem(item: dict,container: dict|None = None) -> None:
     """Render an excerpt or annotation by adding "body" and "attribution" keys.
     If item is an attribution, container is the excerpt containing it."""
     
     kind = gDatabase["kind"][item["kind"]]
 
-    formNumberStr = re.search("[0-9]+",item["flags"])
+    formNumberStr = formNumberRegex.search(item["flags"])
     if formNumberStr:
         formNumber = int(formNumberStr[0]) - 1
         if formNumber >= 0:
@@ -262,10 +412,7 @@ def RenderItem(item: dict,container: dict|None = None) -> None:
         bodyTemplateStr,attributionTemplateStr = ExtractAttribution(FStringToPyratemp(item["text"]))
     
     if ParseCSV.ExcerptFlag.UNQUOTE in item["flags"]: # This flag indicates no quotes
-        bodyTemplateStr = re.sub('[“”]','',bodyTemplateStr) # Templates should use only double smart quotes
-
-    bodyTemplate = CompileTemplate(bodyTemplateStr)
-    attributionTemplate = CompileTemplate(attributionTemplateStr)
+        bodyTemplateStr = smartDoubleQuoteRegex.sub('',bodyTemplateStr) # Templates should use only double smart quotes
 
     plural = "s" if (ParseCSV.ExcerptFlag.PLURAL in item["flags"]) else "" # Is the excerpt heading plural?
 
@@ -314,33 +461,28 @@ def RenderItem(item: dict,container: dict|None = None) -> None:
             if len(parts) > 3:
                 Alert.warning("'|' occurs more than two times in '",item["text"],"'. Latter sections will be truncated.")
 
-    colon = "" if not text or re.match(r"\s*[a-z]",text) else ":"
+    colon = "" if not text or lowercaseStartRegex.match(text) else ":"
     renderDict = {"text": text, "s": plural, "colon": colon, "prefix": prefix, "suffix": suffix, "teachers": teacherStr}
 
     if item["kind"] == "Fragment": # Note that fragments must be annotations, so container is our excerpt
-        fragmentFileNumber = container["fileNumber"] + 1
-        for a in container["annotations"]:
-            if a is item:
-                break
-            if a["kind"] in ("Fragment","Main fragment"):
-                fragmentFileNumber += 1 # count fragments before this one
+        fragmentFileNumber = container["fileNumber"] + 1 + Database.FragmentOrdinal(container,item)
 
         renderDict["player"] = f"[](player:{Database.ItemCode(event=container['event'],session=container['sessionNumber'],fileNumber=fragmentFileNumber)})"
 
-    item["body"] = bodyTemplate(**renderDict)
+    item["body"] = EvaluateTemplate(bodyTemplateStr,tuple(renderDict.items()))
 
     if teachers and showAttribution:
 
         # Does the text before the attribution end in a full stop?
-        fullStop = "." if re.search(r"[.?!][^a-zA-Z]*\{attribution\}",item["body"]) else ""
+        fullStop = "." if fullStopRegex.search(item["body"]) else ""
         renderDict["fullStop"] = fullStop
         
-        attributionStr = attributionTemplate(**renderDict) # Utils.SmartQuotes(attributionTemplate(**renderDict))
+        attributionStr = EvaluateTemplate(attributionTemplateStr,tuple(renderDict.items()))
 
         # If the template itself doesn't specify how to handle fullStop, capitalize the first letter of the attribution string
         # Avoid capitalizing html tags
         if fullStop and "fullStop" not in attributionTemplateStr:
-            attributionStr = re.sub("^[^<]*?[a-zA-Z]",lambda match: match.group(0).upper(),attributionStr,count = 1)
+            attributionStr = firstLetterRegex.sub(lambda match: match.group(0).upper(),attributionStr,count = 1)
     else:
         item["body"] = item["body"].replace("{attribution}","")
         attributionStr = ""
@@ -359,17 +501,225 @@ def RenderItem(item: dict,container: dict|None = None) -> None:
                 parts[-2] = Build.LinkTeachersInText(parts[-2],[quotedTeacher])
                 item["body"] = "".join(parts)
 
+def ProfiledRenderItem(item: dict,container: dict|None = None) -> None:
+    "Call RenderItem and record its time by kind."
+    startTime = time.perf_counter()
+    RenderItem(item,container)
+    gProfiler.Add("kind",item["kind"],time.perf_counter() - startTime)
+
 def RenderExcerpts() -> None:
     """Use the templates in gDatabase["kind"] to add "body" and "attribution" keys to each except and its annotations"""
 
     kinds = gDatabase["kind"]
-    for x in gDatabase["excerpts"]:
-        RenderItem(x)
+    renderItem = ProfiledRenderItem if gProfiler else RenderItem
+    for x in ExcerptsToRender():
+        renderItem(x)
         for a in x["annotations"]:
-            RenderItem(a,x)
+            renderItem(a,x)
             if kinds[a["kind"]]["appendToExcerpt"]:
                 AppendAnnotationToExcerpt(a,x)
 
+gExcerptsToRender:list[dict]|None = None # The excerpts which need rendering; None means all excerpts
+gExcerptFingerprints:list[str] = [] # The fingerprint of each excerpt in gDatabase["excerpts"] before rendering
+gRenderVersion = "" # The fingerprint of everything else which affects rendering
+gReusedExcerptCount = 0 # The number of excerpts reused from the previous rendered database
+
+RENDER_DEPENDENCIES = { # The tables read when rendering excerpts and the fields in them which don't affect rendering
+    "kind": (),
+    "teacher": ("eventCount","excerptCount"),
+    "text": (),
+    "textLink": (),
+    "reference": (),
+    "tag": ("copies","primaries","excerptCount","fTagCount","subtopicFTagCount"),
+    "tagSubsumed": (),
+    "tagDisplayList": ("excerptCount","text"),
+    "subtopic": ("excerptCount","fTagCount"),
+    "event": None, # None means only the keys matter
+    "keyTopic": None
+}
+RENDER_OPTIONS = ("attributeAll","pagesDir") # The options which affect rendering
+RENDER_MODULES = (Build,Database,Utils,Html,TextUtils,BuildReferences,Link,Suttaplex) # Modules whose code affects rendering in addition to this one
+
+def ExcerptsToRender() -> list[dict]:
+    "Return the excerpts which were not reused from the previous rendered database."
+    if gExcerptsToRender is None:
+        return gDatabase["excerpts"]
+    else:
+        return gExcerptsToRender
+
+def ReferenceDatabaseHash() -> str:
+    "Return a hash of ReferenceDatabase.json, which BuildReferences.ReferenceLink reads to render text and book links."
+    try:
+        with open(Utils.PosixJoin(gOptions.pagesDir,"assets/ReferenceDatabase.json"),"rb") as file:
+            return hashlib.blake2b(file.read(),digest_size=16).hexdigest()
+    except OSError:
+        return ""
+
+def RenderVersion() -> str:
+    "Return a fingerprint of the code, options, global tables, and reference links which affect the rendering of all excerpts."
+    return Utils.VersionFingerprint([__file__] + [module.__file__ for module in RENDER_MODULES],RENDER_DEPENDENCIES,RENDER_OPTIONS,
+                              MarkdownCacheVersion(),ReferenceDatabaseHash())
+
+def RenderDependsOnOtherExcerpts(excerpt: dict) -> bool:
+    """Returns True if rendering this excerpt reads information outside of its fingerprint.
+    Audio player links read the excerpt they play; about page links read the about page directory."""
+    for item in Filter.AllItems(excerpt):
+        if item["kind"] == "Fragment" or "player:" in item["text"] or "about:" in item["text"]:
+            return True
+    return False
+
+def ReusePreviousRender() -> None:
+    """Fingerprint each excerpt and replace the excerpts which haven't changed since the last run
+    with their rendered versions from the previous rendered database.
+    Set gExcerptsToRender to the list of excerpts which remain to be rendered.
+    Call before PrepareTemplates and PrepareTexts modify the global tables."""
+    global gExcerptsToRender, gExcerptFingerprints, gRenderVersion, gReusedExcerptCount
+
+    excerpts = gDatabase["excerpts"]
+    gRenderVersion = RenderVersion()
+    gExcerptFingerprints = [Utils.Fingerprint(session["teachers"],x) for session,x in Database.PairWithSession(excerpts)]
+    gExcerptsToRender = None
+    if not gOptions.renderCache:
+        return
+    
+    try:
+        cache = Utils.ReadJson(gOptions.renderCache)
+    except (OSError,ValueError):
+        return
+    if cache.get("version") != gRenderVersion:
+        Alert.info("Rendering code, options, global tables, or reference links have changed; will render all excerpts.")
+        return
+    try:
+        compactRecords = bool(excerpts) and isinstance(excerpts[0],Database.Record)
+        previousExcerpts = Database.LoadDatabase(gOptions.renderedDatabase,compactRecords)["excerpts"]
+            # Convert the previous excerpts in the same way as the current ones, e.g. clips to SplitMp3.Clip
+    except (OSError,ValueError,KeyError):
+        return
+    if len(cache["excerpts"]) != len(previousExcerpts):
+        Alert.caution("Render cache",gOptions.renderCache,"does not match",gOptions.renderedDatabase,"; will render all excerpts.")
+        return
+
+    previousRender = dict(zip(cache["excerpts"],previousExcerpts))
+    gExcerptsToRender = []
+    for n,(fingerprint,x) in enumerate(zip(gExcerptFingerprints,excerpts)):
+        if fingerprint in previousRender and not RenderDependsOnOtherExcerpts(x):
+            excerpts[n] = previousRender[fingerprint]
+        else:
+            gExcerptsToRender.append(x)
+    
+    gReusedExcerptCount = len(excerpts) - len(gExcerptsToRender)
+    if gReusedExcerptCount:
+        Utils.NewDatabaseGeneration() # Discard caches which refer to the replaced excerpts
+        Database.BuildAnnotationTrees(excerpts)
+
+def DiscardRenderCache() -> None:
+    """Delete the render cache before writing the rendered database.
+    If the run is interrupted before WriteRenderCache, the next run renders all excerpts
+    rather than pairing the old fingerprints with the new database."""
+    if gOptions.renderCache and os.path.exists(gOptions.renderCache):
+        os.remove(gOptions.renderCache)
+
+def WriteRenderCache() -> None:
+    "Write the excerpt fingerprints so that the next run can reuse unchanged excerpts."
+    if not gOptions.renderCache:
+        return
+    with Utils.AtomicWrite(gOptions.renderCache) as file:
+        file.write(Utils.JsonString({"version": gRenderVersion,"excerpts": gExcerptFingerprints}))
+
+class RenderedBatch(NamedTuple):
+    "The results of rendering a batch of excerpts in a worker process."
+    excerpts: list[dict]                # The rendered excerpts
+    stageStatistics: list[tuple[int,float,int]] # The change count, time, and calls of each stage in the body text pipeline
+    markdownHtml: dict[str,str]         # The markdown cache entries used by this batch
+    referenceScanCount: Counter         # gReferenceScanCount for this batch
+    templateCache: Counter              # EvaluateTemplate cache hits and misses for this batch
+    alertCounts: dict[str,int]          # The number of alerts of each type generated
+    searchLinks: set[tuple[str,str]]    # The links made by Build.SearchLink while rendering this batch
+    profile: RenderProfiler|None        # The timings of this batch if we are profiling
+
+def InitializeRenderWorker(tables: dict[str],options,verbosity: int) -> None:
+    """Set up the global namespace of a worker process.
+    tables contains all of gDatabase except the excerpts, which are sent in batches."""
+
+    Utils.InitializeWorkerGlobals(dict(tables,excerpts=[]),options,verbosity)
+    global gProfiler
+    gProfiler = RenderProfiler() if options.profileRender else None
+    ReadMarkdownCache()
+
+def RenderExcerptBatch(excerpts: list[dict]) -> RenderedBatch:
+    "Render a batch of excerpts in a worker process."
+    global gExcerptsToRender, gMarkdownCacheUsed, gProfiler
+
+    startingAlerts = Alert.AlertCounts()
+    startingCacheInfo = EvaluateTemplate.cache_info()
+    gExcerptsToRender = excerpts
+    gMarkdownCacheUsed = {}
+    Build.gSearchLinks.clear()
+    if gProfiler:
+        gProfiler = RenderProfiler()
+
+    with ProfileStage("AddImplicitAttributions"):
+        AddImplicitAttributions()
+    with ProfileStage("RenderExcerpts"):
+        RenderExcerpts()
+    pipeline = BodyTextPipeline()
+    with ProfileStage("Body text transforms"):
+        ApplyToExcerpts(pipeline.Transform)
+    with ProfileStage("AccumulateReferences"):
+        AccumulateReferences()
+
+    alertCounts = {name:count - startingAlerts[name] for name,count in Alert.AlertCounts().items()}
+    cacheInfo = EvaluateTemplate.cache_info()
+    templateCache = Counter(hits=cacheInfo.hits - startingCacheInfo.hits,misses=cacheInfo.misses - startingCacheInfo.misses)
+    return RenderedBatch(excerpts,[(stage.count,stage.time,stage.calls) for stage in pipeline.stages],
+                         gMarkdownCacheUsed,gReferenceScanCount,templateCache,alertCounts,set(Build.gSearchLinks),gProfiler)
+
+PARALLEL_MIN_EXCERPTS = 200 # Starting worker processes and sending them excerpts takes longer than rendering fewer excerpts
+
+def RenderInParallel(pipeline: TextTransformPipeline,jobs: int) -> bool:
+    """Render the excerpts which don't depend on other excerpts in batches using jobs worker processes.
+    Replace them in gDatabase["excerpts"] and add their statistics to pipeline.
+    Set gExcerptsToRender to the excerpts which remain to be rendered in this process.
+    Return False without rendering anything if there are fewer than PARALLEL_MIN_EXCERPTS such excerpts."""
+    global gExcerptsToRender, gMarkdownCacheHits
+
+    remaining = []
+    independent = []
+    for x in ExcerptsToRender():
+        (remaining if RenderDependsOnOtherExcerpts(x) else independent).append(x)
+    if len(independent) < PARALLEL_MIN_EXCERPTS:
+        return False
+    
+    batchSize = max(1,-(-len(independent) // (jobs * 4))) # Four batches per process balances the load
+    batches = [independent[n:n + batchSize] for n in range(0,len(independent),batchSize)]
+    tables = {key:value for key,value in gDatabase.items() if key != "excerpts"}
+
+    position = {id(x):n for n,x in enumerate(gDatabase["excerpts"])}
+    with Utils.WorkerPool(jobs,InitializeRenderWorker,(tables,gOptions,Alert.verbosity)) as pool:
+        for batch,result in zip(batches,pool.map(RenderExcerptBatch,batches)):
+            for original,rendered in zip(batch,result.excerpts):
+                gDatabase["excerpts"][position[id(original)]] = rendered
+            for stage,(count,stageTime,calls) in zip(pipeline.stages,result.stageStatistics):
+                stage.count += count
+                stage.time += stageTime
+                stage.calls += calls
+            for key,html in result.markdownHtml.items():
+                if key not in gMarkdownCacheUsed:
+                    gMarkdownCacheUsed[key] = html
+                    if key in gMarkdownCache:
+                        gMarkdownCacheHits += 1
+            gReferenceScanCount.update(result.referenceScanCount)
+            gTemplateCacheStatistics.update(result.templateCache)
+            Build.gSearchLinks.update(result.searchLinks)
+            if result.profile:
+                gProfiler.Merge(result.profile)
+            for name,count in result.alertCounts.items():
+                getattr(Alert,name).count += count
+
+    gExcerptsToRender = remaining
+    Utils.NewDatabaseGeneration() # Discard caches which refer to the replaced excerpts
+    Database.BuildAnnotationTrees(gDatabase["excerpts"])
+    return True
 
 class SCBookmark(NamedTuple):
     uid: str                # Sutta uid, e.g. 'mil6.3.10'
@@ -502,8 +852,28 @@ def AddTextReference(item:dict,matchObject: re.Match) -> None:
     else:
         item["texts"] = [referenceText]
 
-def LinkSuttas(ApplyToFunction:Callable = ApplyToBodyText) -> None:
-    """Use the list of rules in gDatabase["textLink"] to generate hyperlinks for sutta references."""
+def SuttaReferenceRegexes(trie: bool = True) -> tuple[re.Pattern,re.Pattern]:
+    """Return compiled regular expressions (markdownLinkToSutta,suttasNotInMarkdownLinks) matching sutta references
+    within markdown links, e.g. [Sati](MN 10), and outside of them.
+    trie: Match text uids using a prefix trie rather than a simple alternation; the matches are identical."""
+
+    suttaMatch = r"\b" + Utils.RegexMatchAny(gDatabase["text"],trie=trie)+ r"\s+([0-9]+)(?:[.:]([0-9]+))?(?:[.:]([0-9]+))?(?:-[0-9]+)?(?:\{([a-z]+)\})?"
+    """ Sutta reference pattern: uid n0[.n1[.n2]][-end]{translator}
+        Matching groups:
+        1: uid: SuttaCentral text uid
+        2-4: n0-n2: section numbers
+        5: translator: translator code, e.g. bodhi
+    end is ignored for sutta lookup purposes."""
+
+    markdownLinkToSutta = r"\[[^]\]]+\]\(" + suttaMatch + r"\)"
+    suttasNotInMarkdownLinks = suttaMatch + r"(?![^][]*\]\()"
+        # Use lookahead assertion to ignore suttas which explicitly link elsewhere, e.g. [MN 26](https://...)
+    
+    return re.compile(markdownLinkToSutta,flags = re.IGNORECASE),re.compile(suttasNotInMarkdownLinks,flags = re.IGNORECASE)
+
+def LinkSuttas(ApplyToFunction:Callable = ApplyToBodyText,pipeline: TextTransformPipeline|None = None) -> None:
+    """Use the list of rules in gDatabase["textLink"] to generate hyperlinks for sutta references.
+    If pipeline is given, add the transforms to it rather than applying them immediately."""
 
     def SuttasWithinMarkdownLink(bodyStr: str,item:dict=None) -> Tuple[str,int]:
         def SuttaMatchWrapper(matchObject: re.Match) -> str:
@@ -518,7 +888,7 @@ def LinkSuttas(ApplyToFunction:Callable = ApplyToBodyText) -> None:
                 print()
                 return hyperlinkText
 
-        return re.subn(markdownLinkToSutta,SuttaMatchWrapper,bodyStr,flags = re.IGNORECASE)
+        return markdownLinkToSutta.subn(SuttaMatchWrapper,bodyStr)
     
     def SuttasWithinBodyText(bodyStr: str,item:dict=None) -> Tuple[str,int]:
         def MakeSuttaMarkdownLink(matchObject: re.Match) -> str:
@@ -538,30 +908,23 @@ def LinkSuttas(ApplyToFunction:Callable = ApplyToBodyText) -> None:
                 print()
                 return matchObject[0] # Make no changes
     
-        return re.subn(suttasNotInMarkdownLinks,MakeSuttaMarkdownLink,bodyStr,flags = re.IGNORECASE)
+        return suttasNotInMarkdownLinks.subn(MakeSuttaMarkdownLink,bodyStr)
 
-    suttaMatch = r"\b" + Utils.RegexMatchAny(gDatabase["text"])+ r"\s+([0-9]+)(?:[.:]([0-9]+))?(?:[.:]([0-9]+))?(?:-[0-9]+)?(?:\{([a-z]+)\})?"
-    """ Sutta reference pattern: uid n0[.n1[.n2]][-end]{translator}
-        Matching groups:
-        1: uid: SuttaCentral text uid
-        2-4: n0-n2: section numbers
-        5: translator: translator code, e.g. bodhi
-    end is ignored for sutta lookup purposes."""
+    markdownLinkToSutta,suttasNotInMarkdownLinks = SuttaReferenceRegexes()
 
-    markdownLinkToSutta = r"\[[^]\]]+\]\(" + suttaMatch + r"\)"
-    markdownLinksMatched = ApplyToFunction(SuttasWithinMarkdownLink)
+    runPipeline = pipeline is None
+    if runPipeline:
+        pipeline = TextTransformPipeline()
+    markdownLinks = pipeline.Add(SuttasWithinMarkdownLink,"LinkSuttas (markdown links)")
         # First match suttas links within markdown format, e.g. [Sati](MN 10)
-
-    suttasNotInMarkdownLinks = suttaMatch + r"(?![^][]*\]\()"
-        # Use lookahead assertion to ignore suttas which explicitly link elsewhere, e.g. [MN 26](https://...)
-    suttasMatched = ApplyToFunction(SuttasWithinBodyText)
+    suttas = pipeline.Add(SuttasWithinBodyText,"LinkSuttas")
         # Then match all remaining sutta links
-
-    Alert.extra(f"{suttasMatched + markdownLinksMatched} links generated to suttas, {markdownLinksMatched} within markdown links")
+    pipeline.AfterApply(lambda: Alert.extra(f"{suttas.count + markdownLinks.count} links generated to suttas, {markdownLinks.count} within markdown links"))
+    if runPipeline:
+        pipeline.Apply(ApplyToFunction)
 
 def ReferenceMatchRegExs(referenceDB: dict[dict]) -> tuple[str]:
-    escapedTitles = [re.escape(abbrev) for abbrev in referenceDB]
-    titleRegex = Utils.RegexMatchAny(escapedTitles)
+    titleRegex = Utils.RegexMatchAny(referenceDB,trie=True)
     pageReference = r'(?:pages?|pp?\.)\s+-?[0-9]+(?:[-–][0-9]+)?' 
 
     refForm2 = r'\[' + titleRegex + r'\]\((' + pageReference + r')?\)'
@@ -571,6 +934,34 @@ def ReferenceMatchRegExs(referenceDB: dict[dict]) -> tuple[str]:
 
     return refForm2, refForm3, refForm4
 
+class ReferenceMatcher():
+    """Compiled regular expressions matching the reference forms used by LinkKnownReferences.
+    The Candidate functions are cheap literal tests which return False if the regular expressions can't match."""
+
+    def __init__(self,referenceDB: dict[dict]) -> None:
+        refForm2, refForm3, refForm4 = ReferenceMatchRegExs(referenceDB)
+        self.form2 = re.compile(refForm2,flags = re.IGNORECASE)
+        self.form3 = re.compile(refForm3,flags = re.IGNORECASE)
+        self.form4 = re.compile(refForm4,flags = re.IGNORECASE)
+
+    @staticmethod
+    def LinkCandidate(text: str) -> bool:
+        "Could text contain reference form 2 or 3?"
+        return "](" in text
+
+    @staticmethod
+    def PageCandidate(text: str) -> bool:
+        "Could text contain reference form 4, which requires a page reference?"
+        text = text.lower()
+        return "p." in text or "page" in text
+
+gReferenceScanCount = Counter() # The number of strings scanned by LinkKnownReferences and each reference form
+
+@Utils.CacheDerivedData
+def ReferenceMatchers() -> ReferenceMatcher:
+    "Return the ReferenceMatcher for gDatabase['reference'], which is compiled once per database."
+    return ReferenceMatcher(gDatabase["reference"])
+
 def AddBookReference(item:dict,book: dict[str],page: int = 0) -> None:
     """Add a book reference to this item.
     item: an excerpt, annotation, or event.
@@ -598,9 +989,10 @@ def BookLinkWrapper(url: str,book: str,altLink: bool = True) -> Html.Wrapper:
         linkData["data-alt-href"] = textPageLink
     return Html.Tag("a",linkData)
 
-def LinkKnownReferences(ApplyToFunction:Callable = ApplyToBodyText) -> None:
+def LinkKnownReferences(ApplyToFunction:Callable = ApplyToBodyText,pipeline: TextTransformPipeline|None = None) -> None:
     """Search for references of the form [abbreviation]() OR abbreviation page|p. N, add author and link information.
-    ApplyToFunction allows us to apply these same operations to other collections of text (e.g. documentation)"""
+    ApplyToFunction allows us to apply these same operations to other collections of text (e.g. documentation)
+    If pipeline is given, add the transforms to it rather than applying them immediately."""
 
     def ParsePageNumber(text: str) -> int|None:
         "Extract the page number from a text string"
@@ -638,6 +1030,11 @@ def LinkKnownReferences(ApplyToFunction:Callable = ApplyToBodyText) -> None:
     def ReferenceForm2(bodyStr: str,item: dict[str] = None) -> tuple[str,int]:
         """Search for references of the form: [title]() or [title](page N)"""
 
+        gReferenceScanCount["strings"] += 1
+        if not matcher.LinkCandidate(bodyStr):
+            return bodyStr,0
+        gReferenceScanCount["ReferenceForm2"] += 1
+
         def ReferenceForm2Substitution(matchObject: re.Match) -> str:
             try:
                 reference = gDatabase["reference"][matchObject[1].lower()]
@@ -671,11 +1068,15 @@ def LinkKnownReferences(ApplyToFunction:Callable = ApplyToBodyText) -> None:
 
             return returnValue
 
-        return re.subn(refForm2,ReferenceForm2Substitution,bodyStr,flags = re.IGNORECASE)
+        return matcher.form2.subn(ReferenceForm2Substitution,bodyStr)
 
     def ReferenceForm3(bodyStr: str,item: dict[str] = None) -> tuple[str,int]:
         """Search for references of the form: [xxxxx](title) or [xxxxx](title page N)"""
 
+        if not matcher.LinkCandidate(bodyStr):
+            return bodyStr,0
+        gReferenceScanCount["ReferenceForm3"] += 1
+
         def ReferenceForm3Substitution(matchObject: re.Match) -> str:
             hyperlinkText = re.match(r"\[([^\]]+)\]",matchObject[0])[1]
             try:
@@ -694,11 +1095,15 @@ def LinkKnownReferences(ApplyToFunction:Callable = ApplyToBodyText) -> None:
             url = ProcessLocalReferences(url)
             return BookLinkWrapper(url,reference["abbreviation"])(hyperlinkText)
 
-        return re.subn(refForm3,ReferenceForm3Substitution,bodyStr,flags = re.IGNORECASE)
+        return matcher.form3.subn(ReferenceForm3Substitution,bodyStr)
 
     def ReferenceForm4(bodyStr: str,item: dict[str] = None) -> tuple[str,int]:
         """Search for references of the form: title page N"""
 
+        if not matcher.PageCandidate(bodyStr):
+            return bodyStr,0
+        gReferenceScanCount["ReferenceForm4"] += 1
+
         def ReferenceForm4Substitution(matchObject: re.Match) -> str:
             try:
                 reference = gDatabase["reference"][matchObject[1].lower()]
@@ -722,21 +1127,28 @@ def LinkKnownReferences(ApplyToFunction:Callable = ApplyToBodyText) -> None:
 
             return "".join(items)
     
-        return re.subn(refForm4,ReferenceForm4Substitution,bodyStr,flags = re.IGNORECASE)
+        return matcher.form4.subn(ReferenceForm4Substitution,bodyStr)
         
-    refForm2, refForm3, refForm4 = ReferenceMatchRegExs(gDatabase["reference"])
-
-    referenceCount = ApplyToFunction(ReferenceForm2)
-    referenceCount += ApplyToFunction(ReferenceForm3)
-    referenceCount += ApplyToFunction(ReferenceForm4)
-    
-    Alert.extra(f"{referenceCount} links generated to references")
-
-def LinkSubpages(ApplyToFunction:Callable = ApplyToBodyText,pathToPages:str = "../",pathToHome:str = "../../") -> None:
+    matcher = ReferenceMatchers()
+    gReferenceScanCount.clear()
+
+    runPipeline = pipeline is None
+    if runPipeline:
+        pipeline = TextTransformPipeline()
+    stages = [pipeline.Add(form,f"LinkKnownReferences ({form.__name__})") for form in (ReferenceForm2,ReferenceForm3,ReferenceForm4)]
+    def Report() -> None:
+        Alert.extra(f"{sum(stage.count for stage in stages)} links generated to references")
+        Alert.debug(f"Reference prefilter passed {gReferenceScanCount['ReferenceForm2']} strings to ReferenceForm2, {gReferenceScanCount['ReferenceForm3']} to ReferenceForm3, and {gReferenceScanCount['ReferenceForm4']} to ReferenceForm4 out of {gReferenceScanCount['strings']} strings.")
+    pipeline.AfterApply(Report)
+    if runPipeline:
+        pipeline.Apply(ApplyToFunction)
+
+def LinkSubpages(ApplyToFunction:Callable = ApplyToBodyText,pathToPages:str = "../",pathToHome:str = "../../",pipeline: TextTransformPipeline|None = None) -> None:
     """Link references to subpages of the form [subpage](pageType:pageName) as described in LinkReferences().
     pathToPages is the path from the directory where the files are written to the pages directory.
     pathToBaseForNonPages is the path to root directory from this file for links that don't go to html pages.
-    It is necessary to distinguish between the two since frame.js modifies paths to local html files"""
+    It is necessary to distinguish between the two since frame.js modifies paths to local html files
+    If pipeline is given, add the transform to it rather than applying it immediately."""
 
     tagTypes = {"tag","drilldown"}
     excerptTypes = {"event","excerpt","session"}
@@ -854,8 +1266,67 @@ def LinkSubpages(ApplyToFunction:Callable = ApplyToBodyText,pathToPages:str = ".
     def ReplaceSubpageLinks(bodyStr) -> tuple[str,int]:
         return re.subn(linkRegex,SubpageSubstitution,bodyStr,flags = re.IGNORECASE)
     
-    linkCount = ApplyToFunction(ReplaceSubpageLinks)
-    Alert.extra(f"{linkCount} links generated to subpages")
+    runPipeline = pipeline is None
+    if runPipeline:
+        pipeline = TextTransformPipeline()
+    links = pipeline.Add(ReplaceSubpageLinks,"LinkSubpages")
+    pipeline.AfterApply(lambda: Alert.extra(f"{links.count} links generated to subpages"))
+    if runPipeline:
+        pipeline.Apply(ApplyToFunction)
+
+gMarkdown:markdown.Markdown|None = None # A reusable Markdown instance
+gMarkdownCache:dict[str,str] = {} # Rendered html indexed by the hash of the markdown text; read from gOptions.markdownCache
+gMarkdownCacheUsed:dict[str,str] = {} # The cache entries used or created during this run
+gMarkdownCacheHits = 0
+
+def MarkdownCacheVersion() -> str:
+    "Cached html is valid only if the Markdown and extension versions match."
+    return f"Markdown {markdown.__version__}, markdown_newtab_remote {markdown_newtab_remote.__version__}"
+
+def ReadMarkdownCache() -> None:
+    "Read the markdown cache from disk if the version matches."
+    global gMarkdownCache
+    gMarkdownCache = {}
+    if not gOptions.markdownCache:
+        return
+    try:
+        cache = Utils.ReadJson(gOptions.markdownCache)
+    except (OSError,ValueError):
+        return
+    if cache.get("version") == MarkdownCacheVersion():
+        gMarkdownCache = cache["html"]
+    else:
+        Alert.info("Markdown cache",gOptions.markdownCache,"was created by a different version of Markdown; will render all text.")
+
+def WriteMarkdownCache() -> None:
+    """Write the cache entries used during this run to disk.
+    If we reused excerpts from the previous run, we don't know which entries they need, so keep all the previous entries.
+    The unused entries are discarded the next time we render every excerpt."""
+    if not gOptions.markdownCache:
+        return
+    entries = gMarkdownCacheUsed
+    if gReusedExcerptCount:
+        entries = gMarkdownCache | gMarkdownCacheUsed
+    Utils.WriteJson({"version": MarkdownCacheVersion(),"html": entries},gOptions.markdownCache)
+    Alert.extra(f"Markdown cache: {gMarkdownCacheHits} hits; {len(gMarkdownCacheUsed) - gMarkdownCacheHits} new entries.")
+
+def RenderMarkdown(text: str) -> str:
+    "Convert text to html using a reusable Markdown instance and the markdown cache."
+    global gMarkdown, gMarkdownCacheHits
+
+    key = hashlib.blake2b(text.encode("utf-8"),digest_size=16).hexdigest()
+    html = gMarkdownCacheUsed.get(key)
+    if html is not None:
+        return html
+    html = gMarkdownCache.get(key)
+    if html is not None:
+        gMarkdownCacheHits += 1
+    else:
+        if gMarkdown is None:
+            gMarkdown = markdown.Markdown(extensions = [NewTabRemoteExtension()])
+        html = gMarkdown.reset().convert(text)
+    gMarkdownCacheUsed[key] = html
+    return html
 
 def MarkdownFormat(text: str,element: dict[str]) -> Tuple[str,int]:
     """Format a single-line string using markdown, and eliminate the <p> tags.
@@ -867,7 +1338,7 @@ def MarkdownFormat(text: str,element: dict[str]) -> Tuple[str,int]:
     if re.search(r"\]\((\w*:)(?!//)",text):
         badLink = re.search(r"\]\((\w*:[^)]*)\)",text) 
         Alert.warning("Unevaluated reference",repr(badLink[1]),"in",element)
-    md = re.sub("(^<P>|</P>$)", "", markdown.markdown(text,extensions = [NewTabRemoteExtension()]), flags=re.IGNORECASE)
+    md = re.sub("(^<P>|</P>$)", "", RenderMarkdown(text), flags=re.IGNORECASE)
     if md != text:
         return md, 1
     else:
@@ -879,7 +1350,7 @@ def RemoveHTMLPassthroughComments(html: str) -> tuple[str,int]:
     html,changeCount = re.subn(r"<!--HTML(.*?)-->",r"\1",html) # Remove comments around HTML code
     return html,changeCount
 
-def LinkReferences() -> None:
+def LinkReferences(pipeline: TextTransformPipeline|None = None) -> None:
     """Add hyperlinks to references contained in the excerpts and annotations.
     Allowable formats are:
     1. [reference](link) - Markdown format for arbitrary hyperlinks
@@ -900,22 +1371,39 @@ def LinkReferences() -> None:
         image - Link to images in pagesDir/images
         photo - Link to photos in pagesDir/images/photos
         topic - Link to the subtopic page corresponding to this tag
-        topicList - Link to the topic list page specified by this topic code"""
+        topicList - Link to the topic list page specified by this topic code
+    
+    If pipeline is given, add the transforms to it rather than applying them immediately."""
+
+    runPipeline = pipeline is None
+    if runPipeline:
+        pipeline = TextTransformPipeline()
+
+    LinkSubpages(pipeline=pipeline)
+    LinkKnownReferences(pipeline=pipeline)
+    LinkSuttas(pipeline=pipeline)
 
-    LinkSubpages()
-    LinkKnownReferences()
-    LinkSuttas()
+    markdownChanges = pipeline.Add(MarkdownFormat)
+    pipeline.AfterApply(lambda: Alert.extra(f"{markdownChanges.count} items changed by markdown"))
+    pipeline.Add(RemoveHTMLPassthroughComments)
 
-    markdownChanges = ApplyToBodyText(MarkdownFormat)
-    Alert.extra(f"{markdownChanges} items changed by markdown")
-    ApplyToBodyText(RemoveHTMLPassthroughComments)
+    if runPipeline:
+        pipeline.Apply()
+
+def BodyTextPipeline() -> TextTransformPipeline:
+    "Return the pipeline of transforms applied to body text after the excerpts are rendered."
+    pipeline = TextTransformPipeline(timed=gOptions.debug or bool(gOptions.profileRender))
+    LinkReferences(pipeline)
+    pipeline.Add(SmartQuotes)
+        # SmartQuotes doesn't interact with AccumulateReferences, so we can apply all transforms in one pass
+    return pipeline
 
 def AccumulateReferences() -> None:
     """Combine text references in annotations with their parent excerpt;
     remove text references from fragments."""
 
     for refKind in ("texts","books"):
-        for excerpt in gDatabase["excerpts"]:
+        for excerpt in ExcerptsToRender():
             accumulatedTexts = []
             for item in Filter.AllItems(excerpt):
                 accumulatedTexts += item.get(refKind) or []
@@ -933,6 +1421,9 @@ def SmartQuotes(text: str) -> tuple[str,int]:
 def AddArguments(parser) -> None:
     "Add command-line arguments used by this module"
     parser.add_argument('--renderedDatabase',type=str,default='pages/RenderedDatabase.json',help='Database after rendering each excerpt; Default: pages/RenderedDatabase.json')
+    parser.add_argument('--renderCache',type=str,default='pages/assets/RenderCache.json',help='Fingerprints of the excerpts in the rendered database; empty string to render all excerpts; Default: pages/assets/RenderCache.json')
+    parser.add_argument('--profileRender',type=str,default='',help='Print the time spent in each stage of Render and write it to this json file')
+    parser.add_argument('--markdownCache',type=str,default='pages/assets/MarkdownCache.json',help='Cache of text rendered by Markdown; empty string to disable; Default: pages/assets/MarkdownCache.json')
 
 def ParseArguments() -> None:
     pass
@@ -944,18 +1435,48 @@ gOptions = None
 gDatabase:dict[str] = {} # These globals are overwritten by QSArchive.py, but we define them to keep Pylance happy
 
 def main() -> None:
-
-    PrepareTemplates()
-    PrepareTexts()
-
-    AddImplicitAttributions()
-
-    RenderExcerpts()
-
-    LinkReferences()
-    AccumulateReferences()
-
-    ApplyToBodyText(SmartQuotes)
+    global gProfiler
+    gProfiler = RenderProfiler() if gOptions.profileRender else None
+
+    with ProfileStage("ReusePreviousRender"):
+        ReusePreviousRender()
+    Build.gRenderedAllExcerpts = not gReusedExcerptCount
+    if gExcerptsToRender is not None:
+        Alert.info(f"Rendering {len(gExcerptsToRender)} new or changed excerpts; reusing {len(gDatabase['excerpts']) - len(gExcerptsToRender)} from {gOptions.renderedDatabase}.")
+
+    with ProfileStage("PrepareTemplates"):
+        PrepareTemplates()
+    with ProfileStage("PrepareTexts"):
+        PrepareTexts()
+
+    startTime = time.perf_counter()
+    excerptCount = len(ExcerptsToRender())
+    with ProfileStage("ReadMarkdownCache"):
+        ReadMarkdownCache()
+    pipeline = BodyTextPipeline()
+    jobs = Utils.ProcessCount()
+    if jobs > 1:
+        with ProfileStage("RenderInParallel (wall time)"):
+            if not RenderInParallel(pipeline,jobs):
+                jobs = 1
+
+    with ProfileStage("AddImplicitAttributions"):
+        AddImplicitAttributions()
+
+    with ProfileStage("RenderExcerpts"):
+        RenderExcerpts()
+
+    with ProfileStage("Body text transforms"):
+        pipeline.Apply()
+    with ProfileStage("WriteMarkdownCache"):
+        WriteMarkdownCache()
+    if gOptions.debug:
+        ReportTemplateCache(Alert.debug)
+        Alert.debug("Body text transforms:")
+        pipeline.ReportTiming(Alert.debug)
+    with ProfileStage("AccumulateReferences"):
+        AccumulateReferences()
+    Alert.info(f"Rendered {excerptCount} excerpts in {time.perf_counter() - startTime:.2f} seconds using {jobs} process{'es' if jobs > 1 else ''}.")
 
     for key in ["tagRedacted","tagRemoved","summary","keyCaseTranslation"]:
         del gDatabase[key]
@@ -963,5 +1484,12 @@ def main() -> None:
     #Alert.extra("Rendered database contents:",indent = 0)
     #Utils.SummarizeDict(gDatabase,Alert.extra)
 
-    with open(gOptions.renderedDatabase, 'w', encoding='utf-8') as file:
-        json.dump(gDatabase, file, ensure_ascii=False, indent=2)
+    with ProfileStage("WriteDatabase"):
+        DiscardRenderCache()
+        Database.WriteDatabase(gDatabase,gOptions.renderedDatabase)
+    WriteRenderCache()
+
+    if gProfiler:
+        gProfiler.AddPipeline(pipeline)
+        gProfiler.Report(Alert.essential)
+        gProfiler.Write(gOptions.profileRender)
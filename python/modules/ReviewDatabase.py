@@ -4,7 +4,6 @@
 from __future__ import annotations
 
 import os, bisect, csv, re
-from functools import lru_cache
 from itertools import accumulate
 from datetime import timedelta
 from Mp3DirectCut import TimeDeltaToStr
@@ -15,7 +14,7 @@ import ParseCSV
 from typing import Iterable
 from collections import defaultdict
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def AllKeyTopicTags() -> set[str]:
     """Return the set of tags included under any key topic."""
 
@@ -26,7 +25,7 @@ def AllKeyTopicTags() -> set[str]:
     
     return keyTopicTags
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def SignificantSubtagsWithoutFTags() -> set[str]:
     """Return the set of tags that: 
     1) Are included under a subtopic but are not the subtopic itself.
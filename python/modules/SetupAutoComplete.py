@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-import os,json,itertools,re
+import os,json,itertools,re,unicodedata
 import Utils, Alert, Database
 from typing import TypedDict, Iterable
 from Build import FA_STAR, RemoveLanguageTag, HtmlIcon
@@ -209,9 +209,57 @@ def BookEntries() -> Iterable[AutoCompleteEntry]:
         entry = re.sub(r'["“”]',"",Utils.RemoveHtmlTags(reference.FullName(showAuthors=True,showYear=False)))
         yield Entry(entry,bookData["link"],icon="book-open",excerptCount=bookData["count"])
     
+PREFIX_LENGTH = 2 # Bucket entries by the first PREFIX_LENGTH characters of the query
+ONE_CHARACTER_BUCKET_SIZE = 100 # One-character queries match nearly every entry, so their buckets contain only the first entries that match
+
+def NormalizedText(text: str) -> str:
+    "Return text converted to lowercase without diacritics as autoComplete.js compares it."
+    return unicodedata.normalize("NFC",re.sub("[\u0300-\u036f]","",unicodedata.normalize("NFD",text.lower())))
+
+def PrefixBuckets(entries: list[AutoCompleteEntry]) -> dict[str,list[AutoCompleteEntry]]:
+    """Return a dict mapping each string of one to PREFIX_LENGTH characters to the entries which contain it.
+    autoComplete.js matches the query anywhere in an entry, so the bucket for the start of a query contains every entry it can match.
+    Buckets list their entries in database order, which is the order autoComplete.js displays them in.
+    Thus the first ONE_CHARACTER_BUCKET_SIZE entries of one-character buckets are enough to display the same results."""
+    buckets:dict[str,list[AutoCompleteEntry]] = {}
+    for entry in entries:
+        substrings = set()
+        for key in ("short","long","number"):
+            text = NormalizedText(entry[key])
+            substrings.update(text[start:start + n] for n in range(1,PREFIX_LENGTH + 1) for start in range(len(text) - n + 1))
+        for substring in substrings:
+            bucket = buckets.setdefault(substring,[])
+            if len(substring) > 1 or len(bucket) < ONE_CHARACTER_BUCKET_SIZE:
+                bucket.append(entry)
+    return dict(sorted(buckets.items()))
+
+def BucketFileName(prefix: str) -> str:
+    "Return the name of the file containing the bucket for prefix."
+    if re.fullmatch(r"[a-z0-9]+",prefix):
+        return prefix + ".json"
+    else:
+        return "_" + "-".join(f"{ord(c):x}" for c in prefix) + ".json"
+
+def WritePrefixIndex(entries: list[AutoCompleteEntry],directory: str) -> None:
+    """Write each prefix bucket to a small json file in directory so that homepage.js can fetch only the bucket matching the query.
+    index.json lists the bucket files and their hashes, which change whenever the bucket does."""
+    os.makedirs(directory,exist_ok=True)
+    writer = Utils.HashedJsonWriter(directory)
+    index = {"prefixLength": PREFIX_LENGTH,"buckets": {}}
+    for prefix,bucket in PrefixBuckets(entries).items():
+        index["buckets"][prefix] = writer.Write(BucketFileName(prefix),bucket)
+    with Utils.AtomicWrite(Utils.PosixJoin(directory,"index.json")) as file:
+        file.write(Utils.JsonString(index))
+    writer.RemoveOtherFiles(keep=["index.json"])
+
+    sizes = [os.path.getsize(Utils.PosixJoin(directory,bucket["file"])) for bucket in index["buckets"].values()]
+    sizes.sort()
+    Alert.info(f"Wrote {len(sizes)} auto complete prefix buckets to {directory}; median size {sizes[len(sizes) // 2]:,} bytes; largest {sizes[-1]:,} bytes.")
+
 def AddArguments(parser) -> None:
     "Add command-line arguments used by this module"
     parser.add_argument('--autoCompleteDatabase',type=str,default="pages/assets/AutoCompleteDatabase.json",help="AutoComplete database filename.")
+    parser.add_argument('--autoCompleteIndex',type=str,default="pages/assets/autocomplete",help="Directory of auto complete prefix buckets; empty string to skip writing them.")
 
 
 def ParseArguments() -> None:
@@ -237,9 +285,10 @@ def main() -> None:
 
     filename = gOptions.autoCompleteDatabase
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(newDatabase, file, ensure_ascii=False, indent=2)
+        Utils.WriteJson(newDatabase,filename)
         Alert.info(f"Wrote {len(newDatabase)} auto complete entries to {filename}.")
+        if gOptions.autoCompleteIndex:
+            WritePrefixIndex(newDatabase,gOptions.autoCompleteIndex)
         return True
     except OSError as err:
         Alert.error(f"Could not write {filename} due to {err}")
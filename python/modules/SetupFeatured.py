@@ -1,4 +1,5 @@
-"""Maintain pages/assets/FeaturedDatabase.json, which contains rendered random featured excerpts to display on the homepage.
+"""Maintain pages/assets/FeaturedDatabase.json, which contains rendered random featured excerpts to display on the homepage,
+and write the shards of it in pages/assets/featured that homepage.js loads.
 """
 
 from __future__ import annotations
@@ -97,8 +98,7 @@ def ReadDatabase(backupNumber:int = 0) -> bool:
     
     filename = gOptions.featuredDatabase
     try:
-        with open(filename, 'r', encoding='utf-8') as file: # Otherwise read the database from disk
-            gFeaturedDatabase = json.load(file)
+        gFeaturedDatabase = Utils.ReadJson(filename)
         Alert.info(f"Read featured excerpt DB from {filename} with {len(gFeaturedDatabase['calendar'])} calendar entries.")
         if "oldFTags" not in gFeaturedDatabase:
             gFeaturedDatabase["oldFTags"] = {}
@@ -112,8 +112,7 @@ def WriteDatabase(newDatabase: FeaturedDatabase) -> bool:
     """Write newDatabase to the random excerpt .json file"""
     filename = gOptions.featuredDatabase
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(newDatabase, file, ensure_ascii=False, indent=2)
+        Utils.WriteJson(newDatabase,filename)
         Alert.info(f"Wrote featured excerpt database to {filename}.")
         return True
     except OSError as err:
@@ -552,6 +551,51 @@ def Holidays(paramStr: str) -> bool:
         Alert.info("All future holidays feature relevant excerpts.")
     return bool(changeCount)
 
+FEATURED_WINDOW_DAYS = 14 # current.json contains the calendar entries this many days before and after today
+
+def FeaturedShard(database: FeaturedDatabase,indices: list[int]) -> dict[str]:
+    """Return the calendar entries at indices and the html needed to display them.
+    Calendar keys are the calendar indices as strings, so shards can be merged into a single sparse calendar."""
+    calendar = {str(index):database["calendar"][index] for index in indices}
+    excerpts = {code:{"html": database["excerpts"][code]["html"],"shortHtml": database["excerpts"][code]["shortHtml"]}
+                for code in calendar.values()}
+    return {"calendar": calendar,"excerpts": excerpts}
+
+def WriteShards(database: FeaturedDatabase,directory: str) -> None:
+    """Split database into the small files read by homepage.js so that the homepage doesn't need to load the full database.
+    current.json contains the calendar entries within FEATURED_WINDOW_DAYS of today and the information needed to
+    interpret the calendar. The shard YYYY-MM.json contains the calendar entries for that month.
+    index.json lists the monthly shards and the calendar index at which each excerpt first appears."""
+    writer = Utils.HashedJsonWriter(directory)
+    calendarLength = len(database["calendar"])
+    startDate = date.fromisoformat(database["startDate"])
+
+    months:dict[str,list[int]] = defaultdict(list)
+    for index in range(calendarLength):
+        months[(startDate + timedelta(days=index)).strftime("%Y-%m")].append(index)
+
+    shardIndex = {"months": {},"excerptIndex": {}}
+    for month,indices in months.items():
+        shardIndex["months"][month] = writer.Write(f"{month}.json",FeaturedShard(database,indices)) | {"first": indices[0],"last": indices[-1]}
+    for calendarIndex,code in enumerate(database["calendar"]):
+        shardIndex["excerptIndex"].setdefault(code,calendarIndex)
+    writer.Write("index.json",shardIndex)
+
+    daysPast = (date.today() - startDate).days
+    windowIndices = list(dict.fromkeys((daysPast + offset) % calendarLength
+                                       for offset in range(-FEATURED_WINDOW_DAYS,FEATURED_WINDOW_DAYS + 1)))
+    current = {
+        "startDate": database["startDate"],
+        "calendarLength": calendarLength,
+        "holidays": database["holidays"],
+        **FeaturedShard(database,windowIndices)
+    }
+    writer.Write("current.json",current)
+    writer.RemoveOtherFiles()
+
+    currentSize = os.path.getsize(Utils.PosixJoin(directory,"current.json"))
+    Alert.info(f"Wrote current.json ({currentSize:,} bytes; {len(windowIndices)} days) and {len(months)} monthly shards to {directory}.")
+
 def Write(paramStr: str,goodDatabase:bool = True) -> bool:
     """Write the database to disk if it is good or paramStr contains 'always'."""
     paramStr = paramStr.lower()
@@ -561,7 +605,8 @@ def Write(paramStr: str,goodDatabase:bool = True) -> bool:
         if "never" in paramStr:
             Alert.info("Database not written to disk.")
         else:
-            WriteDatabase(gFeaturedDatabase)
+            if WriteDatabase(gFeaturedDatabase) and gOptions.featuredShards:
+                WriteShards(gFeaturedDatabase,gOptions.featuredShards)
     else:
         Alert.info("The database contains unidentified or improperly linked excerpts and cannot be written.")
 
@@ -590,6 +635,7 @@ def AddArguments(parser) -> None:
     "Add command-line arguments used by this module"
     parser.add_argument('--featured',type=str,default="update",help="Comma-separated list of operations to run on the featured database.")
     parser.add_argument('--featuredDatabase',type=str,default="pages/assets/FeaturedDatabase.json",help="Featured database filename.")
+    parser.add_argument('--featuredShards',type=str,default="pages/assets/featured",help="Directory for the date-windowed shards of the featured database read by the homepage; empty string to skip.")
     parser.add_argument('--randomExcerptCount',type=int,default=0,help="Include only this many random excerpts in the calendar.")
     parser.add_argument('--updateThreshold',type=float,default=0.8,help="SetupFeatured.Update replaces old text with new if ratio is at least this.")
 
@@ -654,5 +700,7 @@ def main() -> None:
     if databaseChanged:
         RunSubmodule(Write,alwaysRun=True,goodDatabase=goodDatabase)
     else:
+        if gOptions.featuredShards: # current.json depends on today's date, so write the shards even if the database is unchanged
+            WriteShards(gFeaturedDatabase,gOptions.featuredShards)
         AnnounceSubmodule(None)
         Alert.info("No changes need to be written to disk.")
\ No newline at end of file
@@ -1,18 +1,21 @@
 """Create assets/SearchDatabase.json for easily searching the excerpts.
+Also split the database into the shards and indexes in assets/search, which search.js loads as needed.
 """
 
 from __future__ import annotations
 
-import os, json, re
+import os, json, re, gzip, time
 import Database, BuildReferences, Suttaplex
-import Utils, Alert, ParseCSV, Build, Filter, Mp3DirectCut
+import Utils, Alert, ParseCSV, Build, Filter, Mp3DirectCut, TextUtils
 import Html2 as Html
-from typing import Iterable, Iterator, Callable
+from typing import Iterable, Iterator, Callable, NamedTuple
 import itertools
 from collections import Counter
 from datetime import timedelta
 from bisect import bisect_right
 from SetupFeatured import FeaturedExcerptFilter
+from TextUtils import RawBlobify
+import SearchEngine
 
 def Enclose(items: Iterable[str],encloseChars: str = "()") -> str:
     """Enclose the strings in items in the specified characters:
@@ -27,55 +30,55 @@ def Enclose(items: Iterable[str],encloseChars: str = "()") -> str:
     return startChar + joinChars.join(items) + endChar
 
 
-def RawBlobify(item: str) -> str:
-    """Convert item to lowercase, remove diacritics, special characters, 
-    remove html tags, ++Kind++ markers, and Markdown hyperlinks, and normalize whitespace."""
-    output = re.sub(r'[‘’"“”]',"'",item) # Convert all quotes to single quotes
-    output = output.replace("–","-").replace("—","-") # Conert all dashes to hypens
-    output = Utils.RemoveDiacritics(output.lower())
-    output = re.sub(r"\<[^>]*\>","",output) # Remove html tags
-    output = re.sub(r"\{[^>]*\}","",output) # Remove template evaluation expressions, e.g. {teachers}
-    output = re.sub(r"!?\[([^]]*)\]\([^)]*\)",r"\1",output) # Extract text from Markdown hyperlinks
-    output = output.replace("++","") # Remove ++ bold format markers
-    output = re.sub(r"[|]"," ",output) # convert these characters to a space
-    output = re.sub(r"[][#()@_*^]","",output) # remove these characters
-    output = re.sub(r"\s+"," ",output.strip()) # normalize whitespace
-    return output
-
 gInputChars:set[str] = set()
 gOutputChars:set[str] = set()
-gNonSearchableTeacherRegex = None
-def Blobify(items: Iterable[str],alphanumericOnly = False) -> Iterator[str]:
+
+@Utils.CacheDerivedData
+def NonSearchableTeacherRegex() -> re.Pattern:
+    "Return a regex matching the names of teachers who haven't given search consent."
+    nonSearchableTeachers = set()
+    for teacher in gDatabase["teacher"].values(): # Add teacher names
+        if teacher["searchable"]:
+            continue
+        nonSearchableTeachers.update(RawBlobify(teacher["fullName"]).split(" "))
+
+    for prefix in gDatabase["prefix"]: # But discard generic titles
+        nonSearchableTeachers.discard(RawBlobify(prefix))
+    if gOptions.explainExcludes or gOptions.debug:
+        Alert.essential(len(nonSearchableTeachers),"non-consenting teachers:",nonSearchableTeachers)
+
+    if nonSearchableTeachers:
+        return re.compile(Utils.RegexMatchAny(nonSearchableTeachers,literal=True))
+    else:
+        return re.compile(r"^a\bc") # Matches nothing
+
+nonWordRegex = re.compile(r"\W")
+
+def BlobifyString(item: str,alphanumericOnly = False) -> str:
+    "Return the blob of a single string. See Blobify."
+    gInputChars.update(item)
+    blob = NonSearchableTeacherRegex().sub("",RawBlobify(item)) # Remove nonconsenting teachers
+    blob = " ".join(blob.split()) # Normalize or remove whitespace
+    if alphanumericOnly:
+        blob = nonWordRegex.sub("",blob) # Remove all non-alphanumeric characters
+    gOutputChars.update(blob)
+    return blob
+
+@Utils.CacheDerivedData
+def VocabularyBlob(item: str,alphanumericOnly = False) -> str:
+    """Return BlobifyString(item,alphanumericOnly).
+    Cached because the same tags, teacher names, and kinds occur in thousands of blobs."""
+    return BlobifyString(item,alphanumericOnly)
+
+def Blobify(items: Iterable[str],alphanumericOnly = False,vocabulary = False) -> Iterator[str]:
     """Convert strings to lowercase, remove diacritics, special characters, 
     remove html tags, ++ markers, and Markdown hyperlinks, and normalize whitespace.
-    Also remove teacher names who haven't given search consent."""
-
-    global gNonSearchableTeacherRegex
-    if gNonSearchableTeacherRegex is None:
-        nonSearchableTeachers = set()
-        for teacher in gDatabase["teacher"].values(): # Add teacher names
-            if teacher["searchable"]:
-                continue
-            nonSearchableTeachers.update(RawBlobify(teacher["fullName"]).split(" "))
-
-        for prefix in gDatabase["prefix"]: # But discard generic titles
-            nonSearchableTeachers.discard(RawBlobify(prefix))
-        if gOptions.explainExcludes or gOptions.debug:
-            Alert.essential(len(nonSearchableTeachers),"non-consenting teachers:",nonSearchableTeachers)
-
-        if nonSearchableTeachers:
-            gNonSearchableTeacherRegex = Utils.RegexMatchAny(nonSearchableTeachers,literal=True)
-        else:
-            gNonSearchableTeacherRegex = r"^a\bc" # Matches nothing
-
+    Also remove teacher names who haven't given search consent.
+    vocabulary: items are tags, names, or other strings that recur often, so cache their blobs."""
 
+    blobFunction = VocabularyBlob if vocabulary else BlobifyString
     for item in items:
-        gInputChars.update(item)
-        blob = re.sub(gNonSearchableTeacherRegex,"",RawBlobify(item)) # Remove nonconsenting teachers
-        blob = re.sub(r"\s+"," ",blob.strip()) # Normalize or remove whitespace
-        if alphanumericOnly:
-            blob = re.sub(r"\W","",blob.strip()) # Remove all non-alphanumeric characters
-        gOutputChars.update(blob)
+        blob = blobFunction(item,alphanumericOnly)
         if blob:
             yield blob
 
@@ -90,9 +93,17 @@ def AllNames(teachers:Iterable[str]) -> Iterator[str]:
 DURATION_BOUNDARIES = tuple(timedelta(minutes = n) for n in (1,2,5,10))
 DURATION_NAMES = ("veryshort","short","medium","long","verylong")
 
+@Utils.CacheDerivedData
+def TagCode(tag: str) -> str:
+    "Return the code of tag in excerpt blobs."
+    return f"[{RawBlobify(tag)}]"
+
+tagCodeRegex = re.compile(r"\[[^]]*\]")
+
 def ExcerptBlobs(excerpt: dict) -> list[str]:
     """Create a list of search strings corresponding to the items in excerpt."""
     returnValue = []
+    fTagCodes = set(TagCode(fTag) for fTag in itertools.chain(excerpt["fTags"],excerpt.get("fragmentFTags",()))) # Mark these tags with '+'
     for item in Filter.AllItems(excerpt):
         if gDatabase["kind"][item["kind"]]["category"] in ("Fragment","Audio"):
             continue
@@ -111,40 +122,294 @@ def ExcerptBlobs(excerpt: dict) -> list[str]:
             kindList.append(DURATION_NAMES[bisect_right(DURATION_BOUNDARIES,Mp3DirectCut.ToTimeDelta(item["duration"]))])
         bits = [
             Enclose(Blobify([text]),"^"),
-            Enclose(Blobify(AllNames(item.get("teachers",[]))),"{}"),
-            Enclose(Blobify(qTags),"[]") if qTags else "",
+            Enclose(Blobify(AllNames(item.get("teachers",[])),vocabulary=True),"{}"),
+            Enclose(Blobify(qTags,vocabulary=True),"[]") if qTags else "",
             "//",
-            Enclose(Blobify(aTags),"[]"),
+            Enclose(Blobify(aTags,vocabulary=True),"[]"),
             "|",
-            Enclose(Blobify(kindList,alphanumericOnly=True),"#"),
-            Enclose(Blobify([gDatabase["kind"][item["kind"]]["category"]],alphanumericOnly=True),"&")
+            Enclose(Blobify(kindList,alphanumericOnly=True,vocabulary=True),"#"),
+            Enclose(Blobify([gDatabase["kind"][item["kind"]]["category"]],alphanumericOnly=True,vocabulary=True),"&")
         ]
         if item is excerpt:
-            bits.append(Enclose(Blobify(Database.ExcerptNumberCode(excerpt).split("_")),"@"))
+            bits.append(Enclose(Blobify(Database.ExcerptNumberCode(excerpt).split("_"),vocabulary=True),"@"))
         
         joined = "".join(bits)
-        for fTag in itertools.chain(excerpt["fTags"],excerpt.get("fragmentFTags",())):
-            tagCode = f"[{RawBlobify(fTag)}]"
-            joined = joined.replace(tagCode,tagCode + "+")
+        if fTagCodes:
+            joined = tagCodeRegex.sub(lambda match: match[0] + "+" if match[0] in fTagCodes else match[0],joined)
         returnValue.append(joined)
     return returnValue
 
-def OptimizedExcerpts() -> list[dict]:
-    returnValue = []
+SEARCH_CACHE_DEPENDENCIES = { # The tables read when making cached search items and the fields in them which don't affect the items
+    "kind": (),
+    "teacher": ("eventCount","excerptCount"),
+    "prefix": (),
+    "tag": ("copies","primaries","excerptCount","fTagCount","subtopicFTagCount"),
+    "tagSubsumed": (),
+    "keyTopic": None # None means only the keys matter
+}
+SEARCH_CACHE_OPTIONS = ("attributeAll","draftFTags","maxPlayerTitleLength","uploadMirror","pagesDir") # The options which affect cached search items
+SEARCH_CACHE_MODULES = (Build,Database,Utils,Html,Filter,Mp3DirectCut,TextUtils) # Modules whose code affects cached search items in addition to this one
+CACHED_SEARCHES = {"x": "excerpts","g": "tags","s": "sessions"} # The searches whose unchanged items are reused from the previous run
+
+gSearchVersion = "" # The fingerprint of everything other than the item itself which affects cached search items
+gItemFingerprints:dict[str,list[str]] = {} # The fingerprint of each item in the searches in CACHED_SEARCHES
+gPreviousItems:dict[str,dict[str,dict]] = {} # gPreviousItems[code][fingerprint] is the item of search code made by the previous run
+gRegenerated:Counter[str] = Counter() # The number of items in each search which weren't reused
+gPreviousHtmlDictionary:list[str] = [] # The html dictionary of the excerpt search made by the previous run
+
+def ReadSearchCache() -> None:
+    """Read the item fingerprints written by the previous run and pair them with the items in the previous SearchDatabase.json.
+    CachedItem then reuses the items whose fingerprints haven't changed.
+    Also read the previous html dictionary so that CompressExcerptHtml can keep its numbering."""
+    global gSearchVersion, gPreviousHtmlDictionary
+
+    gSearchVersion = Utils.VersionFingerprint([__file__] + [module.__file__ for module in SEARCH_CACHE_MODULES],
+                                              SEARCH_CACHE_DEPENDENCIES,SEARCH_CACHE_OPTIONS)
+    gItemFingerprints.clear()
+    gItemFingerprints.update((code,[]) for code in CACHED_SEARCHES)
+    gPreviousItems.clear()
+    gRegenerated.clear()
+    gPreviousHtmlDictionary = []
+    if not gOptions.searchCache:
+        return
+
+    try:
+        cache = Utils.ReadJson(gOptions.searchCache)
+        previousSearches = Utils.ReadJson(Utils.PosixJoin(gOptions.pagesDir,"assets","SearchDatabase.json"))["searches"]
+    except (OSError,ValueError,KeyError):
+        return
+    if previousSearches.get("x",{}).get("htmlTemplates") == HtmlTemplates():
+        gPreviousHtmlDictionary = previousSearches["x"]["htmlDictionary"]
+    if cache.get("version") != gSearchVersion:
+        Alert.info("Search code, options, or global tables have changed; will regenerate all search items.")
+        return
+
+    for code,fingerprints in cache["items"].items():
+        previousItems = previousSearches.get(code,{}).get("items",[])
+        if len(fingerprints) != len(previousItems):
+            Alert.caution("Search cache",gOptions.searchCache,"does not match SearchDatabase.json; will regenerate all",CACHED_SEARCHES[code],".")
+            continue
+        if code == "x": # Expand the html to the form made by OptimizedExcerpts
+            templates,dictionary = previousSearches[code]["htmlTemplates"],previousSearches[code]["htmlDictionary"]
+            for item in previousItems:
+                item["html"] = ExpandExcerptHtml(item["html"],templates,dictionary)
+        gPreviousItems[code] = dict(zip(fingerprints,previousItems))
+
+def PreviousItem(code: str,fingerprint: str) -> dict|None:
+    """Record fingerprint as that of the next item of search code.
+    Return the item with this fingerprint made by the previous run or None if the item must be regenerated."""
+    gItemFingerprints[code].append(fingerprint)
+    item = gPreviousItems.get(code,{}).get(fingerprint)
+    if item is None:
+        gRegenerated[code] += 1
+    return item
+
+def CachedItem(code: str,fingerprint: str,MakeItem: Callable[[],dict]) -> dict:
+    """Return the item of search code with this fingerprint made by the previous run.
+    If there is none, call MakeItem to make it."""
+    item = PreviousItem(code,fingerprint)
+    return MakeItem() if item is None else item
+
+def WriteSearchCache() -> None:
+    "Write the item fingerprints so that the next run can reuse unchanged items and report how many items were regenerated."
+    regenerated = ", ".join(f"{gRegenerated[code]} of {len(gItemFingerprints[code])} {name}" for code,name in CACHED_SEARCHES.items())
+    Alert.info(f"Regenerated {regenerated}; reused the rest from the previous run.")
+    if gOptions.searchCache:
+        Utils.WriteJson({"version": gSearchVersion,"items": gItemFingerprints},gOptions.searchCache)
+
+def ExcerptFormatter() -> Build.Formatter:
+    "Return the formatter for excerpt search results."
     formatter = Build.Formatter()
     formatter.SetHeaderlessFormat()
     formatter.excerptNumbers = True
+    return formatter
+
+def OptimizedExcerpt(x: dict,featured: bool,formatter: Build.Formatter) -> dict:
+    "Return the search item for excerpt x; featured means x appears on the homepage."
+    xDict = {"session": Database.ItemCode(event=x["event"],session=x["sessionNumber"]),
+             "blobs": ExcerptBlobs(x),
+             "html": formatter.HtmlExcerptList([x]),
+             "uniqueTeachers": len(Filter.AllTeachers(x))}
+    if featured:
+        xDict["blobs"][0] = xDict["blobs"][0].replace("|#","|#homepage#")
+    return xDict
+
+class ExcerptBatch(NamedTuple):
+    "The search items made from a batch of excerpts in a worker process."
+    items: list[dict]                   # The search items in the order of the excerpts
+    inputChars: set[str]                # gInputChars and gOutputChars for this batch
+    outputChars: set[str]
+    alertCounts: dict[str,int]          # The number of alerts of each type generated
+
+def InitializeSearchWorker(tables: dict[str],options,verbosity: int) -> None:
+    """Set up the global namespace of a worker process.
+    tables contains all of gDatabase except the excerpts, which are sent in batches."""
+    Utils.InitializeWorkerGlobals(dict(tables,excerpts=[]),options,verbosity)
+
+def OptimizedExcerptBatch(batch: list[tuple[dict,bool]]) -> ExcerptBatch:
+    "Make the search items for a batch of (excerpt,featured) in a worker process."
+    startingAlerts = Alert.AlertCounts()
+    gInputChars.clear()
+    gOutputChars.clear()
+    formatter = ExcerptFormatter()
+    items = [OptimizedExcerpt(x,featured,formatter) for x,featured in batch]
+    alertCounts = {name:count - startingAlerts[name] for name,count in Alert.AlertCounts().items()}
+    return ExcerptBatch(items,set(gInputChars),set(gOutputChars),alertCounts)
+
+PARALLEL_MIN_EXCERPTS = 200 # Starting worker processes takes longer than making fewer items
+
+def OptimizedExcerptsInParallel(excerpts: list[tuple[dict,bool]],jobs: int) -> list[dict]:
+    """Return the search items for a list of (excerpt,featured) made in batches by jobs worker processes.
+    The items are in the same order as excerpts."""
+
+    batchSize = max(1,-(-len(excerpts) // (jobs * 4))) # Four batches per process balances the load
+    batches = [excerpts[n:n + batchSize] for n in range(0,len(excerpts),batchSize)]
+    tables = {key:value for key,value in gDatabase.items() if key != "excerpts"}
+
+    items = []
+    with Utils.WorkerPool(jobs,InitializeSearchWorker,(tables,gOptions,Alert.verbosity)) as pool:
+        for result in pool.map(OptimizedExcerptBatch,batches):
+            items.extend(result.items)
+            gInputChars.update(result.inputChars)
+            gOutputChars.update(result.outputChars)
+            for name,count in result.alertCounts.items():
+                getattr(Alert,name).count += count
+    return items
+
+def OptimizedExcerpts() -> list[dict]:
+    """Return the search item for each excerpt. Reuse the items made by the previous run for unchanged excerpts
+    and make the rest in parallel if --jobs allows."""
+    items:list[dict|None] = []
+    toMake:list[tuple[int,dict,bool]] = [] # (item number,excerpt,featured) for each item not made by the previous run
     featuredFilter = FeaturedExcerptFilter()
     for fragmentGroup in Database.GroupFragments(gDatabase["excerpts"]):
         x = fragmentGroup[0]
-        xDict = {"session": Database.ItemCode(event=x["event"],session=x["sessionNumber"]),
-                 "blobs": ExcerptBlobs(x),
-                 "html": formatter.HtmlExcerptList([x]),
-                 "uniqueTeachers": len(Filter.AllTeachers(x))}
-        if featuredFilter(fragmentGroup):
-            xDict["blobs"][0] = xDict["blobs"][0].replace("|#","|#homepage#")
-        returnValue.append(xDict)
-    return returnValue
+        featured = bool(featuredFilter(fragmentGroup))
+        session = Database.SessionDict()[x["event"]][x["sessionNumber"]]
+        event = {key:value for key,value in gDatabase["event"][x["event"]].items() if key not in ("sessions","excerpts")}
+        item = PreviousItem("x",Utils.Fingerprint(fragmentGroup,session,event,featured))
+        if item is None:
+            toMake.append((len(items),x,featured))
+        items.append(item)
+    if not toMake:
+        return items
+
+    startTime = time.perf_counter()
+    jobs = Utils.ProcessCount()
+    if jobs > 1 and len(toMake) >= PARALLEL_MIN_EXCERPTS:
+        made = OptimizedExcerptsInParallel([(x,featured) for _,x,featured in toMake],jobs)
+    else:
+        jobs = 1
+        formatter = ExcerptFormatter()
+        made = [OptimizedExcerpt(x,featured,formatter) for _,x,featured in toMake]
+    for (n,_,_),item in zip(toMake,made):
+        items[n] = item
+    Alert.info(f"Made {len(toMake)} excerpt search items in {time.perf_counter() - startTime:.2f} seconds using {jobs} process{'es' if jobs > 1 else ''}.")
+    return items
+
+HTML_TOKEN_MARK = "^" # Encloses template tokens in compressed excerpt html
+HTML_PARAMETER_SEPARATOR = "|" # Separates template parameters within a token
+HTML_TEMPLATES = { # Repeated html structures in excerpts: key: (regex matching the html,template with parameters {0}, {1}, ...)
+    "m": (re.escape(HTML_TOKEN_MARK),HTML_TOKEN_MARK), # Escapes token marks in the original html
+    "a": (r'<audio-chip src="([^"]*)" title="([^"]*)" data-title-link="([^"]*)" data-duration="([^"]*)"><a href="\1" download="\2\.mp3">Download audio</a> \(([^)]*)\)</audio-chip>',
+          '<audio-chip src="{0}" title="{1}" data-title-link="{2}" data-duration="{3}"><a href="{0}" download="{1}.mp3">Download audio</a> ({4})</audio-chip>'),
+    "t": (r'\[<a href = "\.\./tags/([^"]*)\.html">([^<]*)</a>\]','[<a href = "../tags/{0}.html">{1}</a>]'),
+    "p": (r'<a href="\.\./teachers/([^"]*)\.html">([^<]*)</a>','<a href="../teachers/{0}.html">{1}</a>'),
+    "e": (r'<a href="\.\./events/([^"]*)">([^<]*)</a>','<a href="../events/{0}">{1}</a>'),
+    "s": (r'<a href="([^"]*)" target="_blank" data-alt-href="([^"]*)">([^<]*)</a>','<a href="{0}" target="_blank" data-alt-href="{1}">{2}</a>'),
+    "n": (r'<span class="excerpt-number">([^<]*)</span>','<span class="excerpt-number">{0}</span>'),
+    "i": (r'<i class="([^"]*)"></i>','<i class="{0}"></i>'),
+    "f": (r'<p id="([^"]*)">\n  ','<p id="{0}">\n  '),
+    "b": (r'\n</p>\n<p class="([^"]*)">\n  ','\n</p>\n<p class="{0}">\n  '),
+}
+htmlTokenRegex = re.compile(re.escape(HTML_TOKEN_MARK) + r"(\d+|[a-z])([^" + re.escape(HTML_TOKEN_MARK) + r"]*)" + re.escape(HTML_TOKEN_MARK))
+templateParameterRegex = re.compile(r"\{(\d)\}")
+
+def HtmlTemplates() -> dict[str,str]:
+    "Return the templates listed in search[\"htmlTemplates\"]."
+    return {key:template for key,(_,template) in HTML_TEMPLATES.items()}
+
+def HtmlDictionary(tokenCount: Counter[str],previousDictionary: list[str]) -> list[str]:
+    """Return the list of tokens to refer to by number.
+    Tokens keep their numbers in previousDictionary as long as they are used so that editing one event doesn't change the shards of the others.
+    New tokens which occur more than once fill the numbers of tokens no longer used and then go at the end, most frequent first.
+    Unfilled numbers hold empty strings."""
+
+    dictionary = [token if tokenCount[token] else "" for token in previousDictionary]
+    kept = set(dictionary)
+    newTokens = sorted((token for token,count in tokenCount.items() if count > 1 and len(token) > 3 and token not in kept),
+                       key=lambda t: (-tokenCount[t],t))
+    newTokens.reverse() # So that pop() returns the most frequent token
+    for n,token in enumerate(dictionary):
+        if not token and newTokens:
+            dictionary[n] = newTokens.pop()
+    dictionary.extend(reversed(newTokens))
+    while dictionary and not dictionary[-1]:
+        dictionary.pop()
+    return dictionary
+
+def ExpandExcerptHtml(html: str,templates: dict[str,str],dictionary: list[str]) -> str:
+    """Expand html compressed by CompressExcerptHtml. search.js has the equivalent function expandHtml."""
+    def ExpandToken(match: re.Match) -> str:
+        body = dictionary[int(match[1])] if match[1].isdigit() else match[1] + match[2]
+        parameters = body[1:].split(HTML_PARAMETER_SEPARATOR)
+        return templateParameterRegex.sub(lambda p: parameters[int(p[1])],templates[body[0]])
+    return htmlTokenRegex.sub(ExpandToken,html)
+
+def CompressExcerptHtml(search: dict,previousDictionary: list[str] = ()) -> None:
+    """Factor repeated html structures (tag and teacher links, audio players, icons, etc.) out of the excerpt html in search.
+    Each structure becomes a token containing its template key and parameters, e.g. ^tmerit|Merit^ for a tag link.
+    Tokens which occur more than once are stored in search["htmlDictionary"] and referred to by number, e.g. ^17^.
+    Tokens in previousDictionary keep their numbers; see HtmlDictionary.
+    search["htmlTemplates"] lists the templates so that search.js can expand the html again.
+    Html which doesn't survive this round trip is stored with only its token marks escaped."""
+
+    templateRegexes = {key:re.compile(regex) for key,(regex,_) in HTML_TEMPLATES.items()}
+    def Tokenize(key: str) -> Callable[[re.Match],str]:
+        def Token(match: re.Match) -> str:
+            if any(HTML_TOKEN_MARK in p or HTML_PARAMETER_SEPARATOR in p for p in match.groups()):
+                return match[0] # This structure can't be represented as a token
+            return HTML_TOKEN_MARK + key + HTML_PARAMETER_SEPARATOR.join(match.groups()) + HTML_TOKEN_MARK
+        return Token
+
+    originalHtml = [x["html"] for x in search["items"]]
+    tokenized = []
+    for html in originalHtml:
+        for key,regex in templateRegexes.items():
+            html = regex.sub(Tokenize(key),html)
+        tokenized.append(html)
+
+    tokenCount = Counter(match[1] + match[2] for html in tokenized for match in htmlTokenRegex.finditer(html))
+    repeatedTokens = HtmlDictionary(tokenCount,previousDictionary)
+    dictionaryIndex = {token:n for n,token in enumerate(repeatedTokens) if token}
+    def DictionaryReference(match: re.Match) -> str:
+        n = dictionaryIndex.get(match[1] + match[2])
+        return match[0] if n is None else f"{HTML_TOKEN_MARK}{n}{HTML_TOKEN_MARK}"
+
+    templates = HtmlTemplates()
+    escapedMark = HTML_TOKEN_MARK + "m" + HTML_TOKEN_MARK # The token for HTML_TEMPLATES["m"]
+    failures = 0
+    for x,original,html in zip(search["items"],originalHtml,tokenized):
+        html = htmlTokenRegex.sub(DictionaryReference,html)
+        if ExpandExcerptHtml(html,templates,repeatedTokens) == original:
+            x["html"] = html
+        else:
+            x["html"] = original.replace(HTML_TOKEN_MARK,escapedMark)
+            failures += 1
+    if failures:
+        Alert.warning(f"Html of {failures} excerpt(s) could not be compressed and is stored uncompressed.")
+
+    search["htmlTemplates"] = templates
+    search["htmlDictionary"] = repeatedTokens
+
+    def Sizes(htmlList: list[str],extra = None) -> tuple[int,int]:
+        "Return the size in bytes of the json encoding of htmlList and extra and its gzip-compressed size."
+        encoded = json.dumps([htmlList,extra],ensure_ascii=False,separators=(",",":")).encode("utf-8")
+        return len(encoded),len(gzip.compress(encoded))
+    before = Sizes(originalHtml)
+    after = Sizes([x["html"] for x in search["items"]],[templates,repeatedTokens])
+    Alert.info(f"Compressed excerpt html from {before[0]:,} to {after[0]:,} bytes ({after[0] / before[0]:.0%}); "
+               f"gzipped: {before[1]:,} to {after[1]:,} bytes ({after[1] / before[1]:.0%}). {len(repeatedTokens)} dictionary entries.")
 
 def SessionHeader() -> dict[str,str]:
     "Return a dict of session headers rendered into html."
@@ -258,7 +523,7 @@ def TagBlobs() -> Iterator[dict]:
     alphabetizedTags.sort()
 
     for _,tag in alphabetizedTags:
-        yield TagBlobEntry(tag)
+        yield CachedItem("g",Utils.Fingerprint(gDatabase["tag"][tag]),lambda: TagBlobEntry(tag))
 
 def TeacherBlobs() -> Iterator[dict]:
     """Return a blob for each teacher, sorted alphabetically."""
@@ -282,8 +547,8 @@ def EventBlob(event: dict[str],listedTeachers: list[str]) -> str:
 
     bits = [
         Enclose(Blobify(titles),"^"),
-        Enclose(Blobify(AllNames(listedTeachers)),"{}"),
-        Enclose(Blobify(event["tags"]),"[]"),
+        Enclose(Blobify(AllNames(listedTeachers),vocabulary=True),"{}"),
+        Enclose(Blobify(event["tags"],vocabulary=True),"[]"),
         "|",
         Enclose(Blobify(event["series"],alphanumericOnly=True),"#"),
         Enclose(Blobify([event["venue"]],alphanumericOnly=True),"&"),
@@ -318,33 +583,36 @@ def SessionBlob(session: dict[str]) -> str:
 
     bits = [
         Enclose(Blobify([session["sessionTitle"]]),"^"),
-        Enclose(Blobify(AllNames(session["teachers"])),"{}"),
-        Enclose(Blobify(session["tags"]),"[]"),
+        Enclose(Blobify(AllNames(session["teachers"]),vocabulary=True),"{}"),
+        Enclose(Blobify(session["tags"],vocabulary=True),"[]"),
         "|",
         Enclose(Blobify([Database.ItemCode(session).replace("_","@")]),"@")
     ]
     return "".join(bits)
 
+def SessionBlobEntry(session: dict[str]) -> dict:
+    tagString = " ".join(f'[{Build.HtmlTagLink(tag)}]' for tag in session["tags"])
+    if session["teachers"]:
+        teacherList = " – " + Build.ItemList(([gDatabase["teacher"][t]["attributionName"] for t in session["teachers"]]),lastJoinStr = " and ")
+    else:
+        teacherList = ""
+    title = session["sessionTitle"] or f"Session {session['sessionNumber'] or 1}"
+    title = Html.Tag("a",{"href":Database.EventLink(session["event"],session["sessionNumber"])})(title)
+
+    lines = [
+        Build.HtmlIcon("Cushion-black.png") + f" {title}{teacherList} {tagString}",
+    ]
+
+    return {
+        "blobs": [SessionBlob(session)],
+        "html": "<br>".join(lines),
+        "event": session["event"]
+    }
+
 def SessionBlobs() -> Iterator[dict]:
     """Return a blob for each session."""
     for session in gDatabase["sessions"]:
-        tagString = " ".join(f'[{Build.HtmlTagLink(tag)}]' for tag in session["tags"])
-        if session["teachers"]:
-            teacherList = " – " + Build.ItemList(([gDatabase["teacher"][t]["attributionName"] for t in session["teachers"]]),lastJoinStr = " and ")
-        else:
-            teacherList = ""
-        title = session["sessionTitle"] or f"Session {session['sessionNumber'] or 1}"
-        title = Html.Tag("a",{"href":Database.EventLink(session["event"],session["sessionNumber"])})(title)
-
-        lines = [
-            Build.HtmlIcon("Cushion-black.png") + f" {title}{teacherList} {tagString}",
-        ]
-
-        yield {
-            "blobs": [SessionBlob(session)],
-            "html": "<br>".join(lines),
-            "event": session["event"]
-        } 
+        yield CachedItem("s",Utils.Fingerprint(session),lambda: SessionBlobEntry(session))
 
 def SessionEventHtml() -> dict[str,str]:
     """Return a dict of the event information to display after each group of sessions by event."""
@@ -410,7 +678,7 @@ def BookBlobs() -> Iterator[dict]:
         htmlLink = Html.Tag("a",{"href":"../" + linkInfo["link"]})(linkedPart) + suffix
         yield {
             "blobs": [Enclose(Blobify(textSearches),"^") + 
-                      Enclose(Blobify(AllNames(book["author"])),"{}")],
+                      Enclose(Blobify(AllNames(book["author"]),vocabulary=True),"{}")],
             "html": Build.HtmlIcon("book-open") + " " + htmlLink
         }
 
@@ -458,9 +726,123 @@ def AllBlobs(database:dict[str]) -> Iterable[str]:
         for item in search["items"]:
             yield from item["blobs"]
     
+def DeltaEncode(numbers: list[int]) -> list[int]:
+    "Encode a sorted list of numbers as the first number followed by the differences between successive numbers."
+    return [n - previous for previous,n in zip([0] + numbers,numbers)]
+
+def SearchIndex(search: dict) -> dict:
+    """Return an inverted index of the n-grams contained in the blobs of search.
+    postings maps each n-gram to the delta-encoded list of items containing it.
+    search.js uses the index to narrow the items it matches against a query; python/utils/SearchEngine.py reads it.
+    N-grams contained in more than gOptions.searchIndexCommon of the items narrow little and are listed in common instead."""
+
+    gramLength = gOptions.searchIndexGram
+    postings:dict[str,list[int]] = {}
+    for itemNumber,item in enumerate(search["items"]):
+        grams = set()
+        for blob in item["blobs"]:
+            grams.update(blob[n:n + gramLength] for n in range(len(blob) - gramLength + 1))
+        for gram in grams:
+            postings.setdefault(gram,[]).append(itemNumber)
+
+    commonCount = gOptions.searchIndexCommon * len(search["items"])
+    return {
+        "gramLength": gramLength,
+        "itemCount": len(search["items"]),
+        "common": sorted(gram for gram,items in postings.items() if len(items) > commonCount),
+        "postings": {gram:DeltaEncode(items) for gram,items in sorted(postings.items()) if len(items) <= commonCount}
+    }
+
+SEARCH_INDEX_MIN_ITEMS = 1000 # Matching every item of smaller searches is faster than downloading their index
+
+def SearchShards(code: str,search: dict) -> Iterator[tuple[str,dict]]:
+    """Split search into shards and yield (file name,shard) for each.
+    The excerpt search has a shard for each event and a first shard with the data common to all events.
+    search.js concatenates the items of the shards in order and merges their other dict keys."""
+
+    if code != "x":
+        yield f"{code}.json",search
+        return
+
+    sessionEvent = {Database.ItemCode(s):s["event"] for s in gDatabase["sessions"]}
+    eventItems:dict[str,list[dict]] = {}
+    for event,items in itertools.groupby(search["items"],key=lambda item: sessionEvent[item["session"]]):
+        if event in eventItems: # Concatenating the shards must reproduce the order of the items
+            Alert.error("Excerpts from event",event,"are not contiguous in the excerpt search; writing it as a single shard.")
+            yield "x.json",search
+            return
+        eventItems[event] = list(items)
+
+    yield "x.json",{key:value for key,value in search.items() if key != "sessionHeader"} | {"items": []}
+    for event,items in eventItems.items():
+        yield f"x/{event}.json",{
+            "items": items,
+            "sessionHeader": {session:header for session,header in search["sessionHeader"].items() if sessionEvent[session] == event}
+        }
+
+def LinkResults(searches: dict[str,dict],oldLinks: dict[str,dict]) -> dict[str,dict]:
+    """Return the precomputed results of the queries in the search links made by Build.SearchLink.
+    Returns {code: {"itemCount": number of items,"results": {queryText: delta-encoded item numbers}}}.
+    search.js displays these results without searching unless the user selects strict search.
+    Build.gSearchLinks holds the links made by Render and Build during this run. Unless Render rendered every excerpt
+    and Build built every page, it misses some links, so we also recompute the queries in oldLinks, the previous links.json."""
+
+    queries:dict[str,set[str]] = {}
+    for searchType,query in Build.gSearchLinks:
+        queries.setdefault(searchType,set()).add(query)
+    allLinksMade = Build.gBuiltAllPages and Build.gRenderedAllExcerpts
+    if not allLinksMade:
+        for code,links in oldLinks.items():
+            queries.setdefault(code,set()).update(links["results"])
+
+    linkResults = {}
+    for code,codeQueries in sorted(queries.items()):
+        if code not in searches: # Search types such as "all" combine several searches; search.js handles these itself
+            continue
+        items = searches[code]["items"]
+        results = {}
+        for query in codeQueries:
+            searchQuery = SearchEngine.SearchQuery(query)
+            results[searchQuery.queryText] = DeltaEncode([n for n,item in enumerate(items) if searchQuery.searcher.MatchesItem(item)])
+        linkResults[code] = {"itemCount": len(items),"results": dict(sorted(results.items()))}
+    return linkResults
+
+def WriteSearchShards(searches: dict[str,dict],directory: str) -> None:
+    """Write the shards and indexes of each search to directory together with manifest.json,
+    which lists the files and their hashes so that browsers can cache them until they change.
+    Skip writing files which haven't changed and delete files which are no longer in the manifest."""
+
+    manifestFile = Utils.PosixJoin(directory,"manifest.json")
+    try:
+        oldManifest = Utils.ReadJson(manifestFile)
+        oldLinks = Utils.ReadJson(Utils.PosixJoin(directory,oldManifest["links"]["file"]))
+    except (OSError,ValueError,KeyError):
+        oldLinks = {}
+
+    writer = Utils.HashedJsonWriter(directory)
+    manifest = {"searches": {}}
+    for code,search in searches.items():
+        entry = {"name": search["name"],
+                 "shards": [writer.Write(fileName,shard) for fileName,shard in SearchShards(code,search)]}
+        if gOptions.searchIndexGram > 0 and len(search["items"]) >= SEARCH_INDEX_MIN_ITEMS:
+            entry["index"] = writer.Write(f"index/{code}.json",SearchIndex(search))
+        manifest["searches"][code] = entry
+    linkResults = LinkResults(searches,oldLinks)
+    if linkResults:
+        manifest["links"] = writer.Write("links.json",linkResults)
+    with Utils.AtomicWrite(manifestFile) as file:
+        file.write(Utils.JsonString(manifest))
+    removed = writer.RemoveOtherFiles(keep=["manifest.json"])
+
+    Alert.info(f"Search shards: wrote {writer.written}, {writer.unchanged} unchanged, removed {removed} in {directory}.")
+    if linkResults:
+        Alert.info(f"Precomputed the results of {sum(len(links['results']) for links in linkResults.values())} search link queries.")
+
 def AddArguments(parser) -> None:
     "Add command-line arguments used by this module"
-    pass
+    parser.add_argument('--searchIndexGram',type=int,default=3,help="Length of the n-grams in the search indexes; 0 = don't write indexes")
+    parser.add_argument('--searchIndexCommon',type=float,default=0.5,help="Omit postings for n-grams in more than this fraction of items; default 0.5")
+    parser.add_argument('--searchCache',type=str,default='pages/assets/SearchCache.json',help='Fingerprints of the items in the search database; empty string to regenerate all items; Default: pages/assets/SearchCache.json')
 
 def ParseArguments() -> None:
     pass
@@ -474,6 +856,7 @@ gDatabase:dict[str] = {} # These globals are overwritten by QSArchive.py, but we
 
 def main() -> None:
     optimizedDB = {"searches": {}}
+    ReadSearchCache()
 
     AddSearch(optimizedDB["searches"],"k","key topic",KeyTopicBlobs())
     AddSearch(optimizedDB["searches"],"b","subtopic",SubtopicBlobs())
@@ -488,6 +871,7 @@ def main() -> None:
     AddSearch(optimizedDB["searches"],"x","excerpt",OptimizedExcerpts())
     optimizedDB["searches"]["x"]["sessionHeader"] = SessionHeader()
     optimizedDB["searches"]["x"]["commonWordBlob"] = CommonWordBlob()
+    CompressExcerptHtml(optimizedDB["searches"]["x"],gPreviousHtmlDictionary)
 
     if gOptions.debug:        
         Alert.debug("Removed these chars:","".join(sorted(gInputChars - gOutputChars)))
@@ -506,5 +890,6 @@ def main() -> None:
         Alert.debug("Characters remaining in teacher blobs               :","".join(sorted(teacherBlobChars)))
         Alert.debug("Characters remaining in tag blobs                   :","".join(sorted(tagBlobChars)))
 
-    with open(Utils.PosixJoin(gOptions.pagesDir,"assets","SearchDatabase.json"), 'w', encoding='utf-8') as file:
-        json.dump(optimizedDB, file, ensure_ascii=False, indent=2)
\ No newline at end of file
+    Utils.WriteJson(optimizedDB,Utils.PosixJoin(gOptions.pagesDir,"assets","SearchDatabase.json"))
+    WriteSearchShards(optimizedDB["searches"],Utils.PosixJoin(gOptions.pagesDir,"assets","search"))
+    WriteSearchCache()
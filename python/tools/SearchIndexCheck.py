@@ -0,0 +1,55 @@
+"""Check that narrowing searches with the indexes in pages/assets/search finds exactly the same items as matching every item.
+Run from the home directory: python python/tools/SearchIndexCheck.py [queries]
+By default the queries are those in tools/unitTest/searchUnitTest.js, which are run against every search kind.
+Also checks that the search shards contain the same items as SearchDatabase.json
+and reports whether the excerpt counts match those expected by the unit tests."""
+
+import sys, time
+
+sys.path.append('python/modules')
+sys.path.append('python/utils')
+
+import Utils
+from SearchEngine import SearchQuery, ReadSearchShards, UnitTestQueries
+
+if __name__ == "__main__":
+    tests = [(query,None) for query in sys.argv[1:]] or UnitTestQueries()
+    database = Utils.ReadJson("pages/assets/SearchDatabase.json")
+    shardedSearches,indexes = ReadSearchShards()
+    if shardedSearches != database["searches"]:
+        print("MISMATCH: The search shards differ from SearchDatabase.json.")
+        sys.exit(1)
+
+    mismatches = unexpected = 0
+    fullScan = narrowed = 0
+    scanTime = indexTime = 0.0
+    for query,expected in tests:
+        searchQuery = SearchQuery(query)
+        for code,search in database["searches"].items():
+            items = search["items"]
+            start = time.perf_counter()
+            fullResults = [n for n,item in enumerate(items) if searchQuery.searcher.MatchesItem(item)]
+            scanTime += time.perf_counter() - start
+
+            start = time.perf_counter()
+            candidates = searchQuery.Candidates(indexes[code]) if code in indexes else None
+            if candidates is None:
+                candidates = range(len(items))
+            narrowedResults = [n for n in candidates if searchQuery.searcher.MatchesItem(items[n])]
+            indexTime += time.perf_counter() - start
+
+            fullScan += len(items)
+            narrowed += len(candidates)
+            if narrowedResults != fullResults:
+                mismatches += 1
+                print(f"MISMATCH: {query!r} in search {code}: full scan found {len(fullResults)}; index found {len(narrowedResults)}")
+            if code == "x" and expected is not None and len(fullResults) != expected:
+                unexpected += 1
+                print(f"Note: {query!r} found {len(fullResults)} excerpts; unit test expects {expected}")
+
+    print(f"{len(tests)} queries x {len(database['searches'])} searches: {mismatches} mismatches between index and full scan.")
+    print(f"Index narrowed {fullScan} items to {narrowed} candidates ({narrowed / fullScan:.1%}); "
+          f"matching time {scanTime:.3f} -> {indexTime:.3f} s.")
+    if unexpected:
+        print(f"{unexpected} excerpt counts differ from the unit test expectations; the database may have changed since they were written.")
+    sys.exit(1 if mismatches else 0)
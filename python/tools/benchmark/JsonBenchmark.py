@@ -0,0 +1,51 @@
+"""Compare the load and dump times of the json backends in Utils.ReadJson and Utils.WriteJson.
+Run from the home directory: python python/tools/benchmark/JsonBenchmark.py [database files]
+Checks that both backends write byte-identical files."""
+
+import os, sys, time, tempfile
+
+sys.path.append('python/modules')
+sys.path.append('python/utils')
+
+import Utils
+
+DEFAULT_FILES = ["SpreadsheetDatabase.json","RenderedDatabase.json","SearchDatabase.json",
+                 "AutoCompleteDatabase.json","FeaturedDatabase.json","ReferenceDatabase.json"]
+
+def BestTime(function,repeat: int = 3) -> float:
+    "Return the fastest of repeat calls to function in seconds."
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best,time.perf_counter() - start)
+    return best
+
+def Benchmark(filename: str) -> None:
+    with tempfile.TemporaryDirectory() as tempDir:
+        outputs = {}
+        times = {}
+        for fast in (False,True):
+            Utils.gFastJson = fast
+            data = Utils.ReadJson(filename)
+            outputPath = os.path.join(tempDir,f"{fast}.json")
+            times[fast] = (BestTime(lambda: Utils.ReadJson(filename)),BestTime(lambda: Utils.WriteJson(data,outputPath)))
+            with open(outputPath,'rb') as file:
+                outputs[fast] = file.read()
+
+    size = os.path.getsize(filename) / 1e6
+    identical = "identical" if outputs[False] == outputs[True] else "DIFFERENT"
+    print(f"{os.path.basename(filename):28} {size:6.2f} MB   load {times[False][0]:6.3f} -> {times[True][0]:6.3f} s   "
+          f"dump {times[False][1]:6.3f} -> {times[True][1]:6.3f} s   output {identical}")
+
+if __name__ == "__main__":
+    if Utils.orjson is None:
+        print("orjson is not installed; nothing to compare.")
+        sys.exit(1)
+    files = sys.argv[1:] or [Utils.PosixJoin("pages/assets",f) for f in DEFAULT_FILES]
+    print("File                           Size        json -> orjson")
+    for filename in files:
+        if os.path.isfile(filename):
+            Benchmark(filename)
+        else:
+            print(f"{filename}: not found")
@@ -0,0 +1,58 @@
+"""Time the queries in tools/unitTest/searchUnitTest.js using the Python port of search.js in SearchEngine.py.
+Run from the home directory: python python/tools/benchmark/SearchBenchmark.py [source] [search codes]
+source is a shard directory (default pages/assets/search) or SearchDatabase.json.
+Searches the excerpts by default; list search codes (e.g. "k g t x") or "all" to time other searches.
+Reports the latency of each query with a full scan and with the index, the number of items found,
+and whether the excerpt counts match those expected by the unit tests."""
+
+import sys, time
+
+sys.path.append('python/modules')
+sys.path.append('python/utils')
+
+from SearchEngine import SearchQuery, ReadSearches, UnitTestQueries
+
+def BestTime(function,repeat: int = 5) -> float:
+    "Return the fastest of repeat calls to function in seconds."
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best,time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "pages/assets/search"
+    searches,indexes = ReadSearches(source)
+    codes = sys.argv[2:] or ["x"]
+    if codes == ["all"]:
+        codes = list(searches)
+
+    tests = UnitTestQueries()
+    for code in codes:
+        items = searches[code]["items"]
+        index = indexes.get(code)
+        print(f"Search {code} ({searches[code]['name']}): {len(items)} items{'' if index else '; no index'}")
+        print("   Scan ms  Index ms  Found Expected  Query")
+        totalScan = totalIndex = 0.0
+        failures = 0
+        for query,expected in tests:
+            parseTime = BestTime(lambda: SearchQuery(query))
+            searchQuery = SearchQuery(query)
+            found = len(searchQuery.Search(items))
+            if index and len(searchQuery.Search(items,index)) != found:
+                print(f"Index and full scan results differ for {query!r}.")
+                failures += 1
+            scanTime = parseTime + BestTime(lambda: searchQuery.Search(items))
+            indexTime = parseTime + BestTime(lambda: searchQuery.Search(items,index)) if index else scanTime
+            totalScan += scanTime
+            totalIndex += indexTime
+            if code == "x":
+                expectedStr = str(expected) if found == expected else f"{expected} !"
+            else:
+                expectedStr = ""
+            print(f"{scanTime * 1000:10.2f}{indexTime * 1000:10.2f}{found:7}{expectedStr:>9}  {query}")
+        print(f"{totalScan * 1000:10.1f}{totalIndex * 1000:10.1f}  Total for {len(tests)} queries ({totalScan / totalIndex:.1f}x speedup)")
+        if failures:
+            print(f"{failures} queries found different results with the index.")
+        print()
@@ -0,0 +1,46 @@
+"""Compare the speed of the sutta reference regexes used by Render.LinkSuttas with and without Utils.TrieRegex.
+Run from the home directory: python python/tools/benchmark/SuttaRegexBenchmark.py [database]
+The corpus is every string in the database; the default is pages/assets/RenderedDatabase.json.
+Checks that both regexes find identical matches."""
+
+import sys, time
+
+sys.path.append('python/modules')
+sys.path.append('python/utils')
+
+import Utils, Render
+
+def AllStrings(item) -> list[str]:
+    "Return all strings contained in item."
+    if isinstance(item,str):
+        return [item]
+    elif isinstance(item,dict):
+        return [s for value in item.values() for s in AllStrings(value)]
+    elif isinstance(item,list):
+        return [s for value in item for s in AllStrings(value)]
+    else:
+        return []
+
+def Matches(regex,corpus: list[str]) -> list:
+    return [(n,m.span(),m.groups()) for n,text in enumerate(corpus) for m in regex.finditer(text)]
+
+def BestTime(function,repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best,time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    databaseFile = sys.argv[1] if len(sys.argv) > 1 else "pages/assets/RenderedDatabase.json"
+    Render.gDatabase = Utils.ReadJson(databaseFile)
+    corpus = AllStrings(Render.gDatabase)
+    print(f"Corpus: {len(corpus)} strings, {sum(len(s) for s in corpus) / 1e6:.2f} million characters")
+
+    regexes = {trie:Render.SuttaReferenceRegexes(trie=trie) for trie in (False,True)}
+    for n,name in enumerate(["markdownLinkToSutta","suttasNotInMarkdownLinks"]):
+        matches = {trie:Matches(regexes[trie][n],corpus) for trie in (False,True)}
+        times = {trie:BestTime(lambda: Matches(regexes[trie][n],corpus)) for trie in (False,True)}
+        identical = "identical" if matches[False] == matches[True] else "DIFFERENT"
+        print(f"{name:25} {len(matches[True]):5} matches ({identical})   alternation {times[False]:.3f} s -> trie {times[True]:.3f} s")
@@ -0,0 +1,76 @@
+"""Compare the text normalization functions in TextUtils with the chains of re.sub calls they replace.
+Run from the home directory: python python/tools/benchmark/TextBenchmark.py [database]
+The corpus is every string in the database; the default is pages/assets/RenderedDatabase.json.
+Checks that both versions return identical results."""
+
+import sys, re, time
+
+sys.path.append('python/modules')
+sys.path.append('python/utils')
+
+import Utils, TextUtils, DjangoTextUtils
+
+def OriginalRemoveHtmlTags(html: str) -> str:
+    return re.sub(r"\<[^>]*\>","",html)
+
+def OriginalSmartQuotes(s: str):
+    s = re.sub(r'([a-zA-Z0-9.,?!;:)>%/\'\"])"', r'\1”', s)
+    s = s.replace('"', '“')
+    s = re.sub(r'=“(.*?)”', r'="\1"', s)
+    s = re.sub(r"([a-zA-Z0-9.,?!;:)>%/\"\'])'", r'\1’', s)
+    s = s.replace("'", '‘')
+    s = re.sub(r'=‘(.*?)’', r"='\1'", s)
+    return s
+
+def OriginalRawBlobify(item: str) -> str:
+    output = re.sub(r'[‘’"“”]',"'",item)
+    output = output.replace("–","-").replace("—","-")
+    output = DjangoTextUtils.RemoveDiacritics(output.lower())
+    output = re.sub(r"\<[^>]*\>","",output)
+    output = re.sub(r"\{[^>]*\}","",output)
+    output = re.sub(r"!?\[([^]]*)\]\([^)]*\)",r"\1",output)
+    output = output.replace("++","")
+    output = re.sub(r"[|]"," ",output)
+    output = re.sub(r"[][#()@_*^]","",output)
+    output = re.sub(r"\s+"," ",output.strip())
+    return output
+
+COMPARISONS = [
+    ("RemoveDiacritics",DjangoTextUtils.RemoveDiacritics,TextUtils.RemoveDiacritics),
+    ("RemoveHtmlTags",OriginalRemoveHtmlTags,TextUtils.RemoveHtmlTags),
+    ("SmartQuotes",OriginalSmartQuotes,TextUtils.SmartQuotes),
+    ("RawBlobify",OriginalRawBlobify,TextUtils.RawBlobify)
+]
+
+def AllStrings(item) -> list[str]:
+    "Return all strings contained in item."
+    if isinstance(item,str):
+        return [item]
+    elif isinstance(item,dict):
+        return [s for value in item.values() for s in AllStrings(value)]
+    elif isinstance(item,list):
+        return [s for value in item for s in AllStrings(value)]
+    else:
+        return []
+
+def BestTime(function,repeat: int = 5) -> float:
+    "Return the fastest of repeat calls to function in seconds."
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best,time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    databaseFile = sys.argv[1] if len(sys.argv) > 1 else "pages/assets/RenderedDatabase.json"
+    corpus = AllStrings(Utils.ReadJson(databaseFile))
+    megabytes = sum(len(s) for s in corpus) / 1e6
+    print(f"Corpus: {len(corpus)} strings, {megabytes:.2f} million characters")
+
+    for name,original,new in COMPARISONS:
+        differences = sum(1 for s in corpus if original(s) != new(s))
+        originalTime = BestTime(lambda: [original(s) for s in corpus])
+        newTime = BestTime(lambda: [new(s) for s in corpus])
+        identical = "identical" if not differences else f"{differences} DIFFERENT"
+        print(f"{name:17} {megabytes / originalTime:7.1f} -> {megabytes / newTime:7.1f} million chars/s ({originalTime:.3f} -> {newTime:.3f} s)   results {identical}")
@@ -95,6 +95,10 @@ extra = AlertClass("Extra","",printAtVerbosity = 2,indent = 3)
 
 debug = AlertClass("Debug","DEBUG:",printAtVerbosity=999)
 
+def AlertCounts() -> dict[str,int]:
+    "Return the count of each type of alert."
+    return {name:alert.count for name,alert in globals().items() if isinstance(alert,AlertClass)}
+
 def Debugging(flag: bool):
     if flag:
         debug.printAtVerbosity = -999
@@ -16,7 +16,6 @@ import Database
 import Render
 import Build
 import Alert
-from functools import lru_cache
 
 gOptions = None
 gDatabase:dict[str] = {} # These will be set later by QSarchive.py
@@ -51,8 +50,7 @@ def ReadReferenceDatabase() -> None:
     if gSavedReferences:
         return
     try:
-        with open(Utils.PosixJoin(gOptions.pagesDir,"assets/ReferenceDatabase.json"), 'r', encoding='utf-8') as file:
-            gSavedReferences = json.load(file)
+        gSavedReferences = Utils.ReadJson(Utils.PosixJoin(gOptions.pagesDir,"assets/ReferenceDatabase.json"))
     except OSError as error:
         Alert.error(error, "When reading pages/assets/ReferenceDatabase.json. Will use a blank database.")
         gSavedReferences = ReferenceLinkDatabase(text={},author={},book={})
@@ -90,8 +88,7 @@ def WriteReferenceDatabase() -> bool:
     if not changed:
         return False
     
-    with open(Utils.PosixJoin(gOptions.pagesDir,"assets/ReferenceDatabase.json"), 'w', encoding='utf-8') as file:
-        json.dump(gNewReferences, file, ensure_ascii=False, indent=2)
+    Utils.WriteJson(gNewReferences,Utils.PosixJoin(gOptions.pagesDir,"assets/ReferenceDatabase.json"))
     
     gSavedReferences = gNewReferences
     gReferencesChanged = True
@@ -110,17 +107,17 @@ def ReferenceLink(kind: Literal["text","author","book"],key: str) -> str:
     else:
         return ""
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def TextSortOrder() -> dict[str,int]:
     """Return the sort order of the texts."""
     return {text:n for n,text in enumerate(gDatabase["text"])}
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def TextGroupSet(which: str) -> set[str]:
     """Return a set of the texts in this group."""
     return set(gDatabase["textGroup"][which])
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def UIDGroupSet(which: str) -> set[str]:
     """Return a set of the uids in this group."""
     return set(t.lower() for t in TextGroupSet(which))
@@ -330,7 +327,7 @@ class ConsecutiveTexts(TextReference):
         return f"{super().FullName()}-{self.RangeEnd()}"
 
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def AlphabetizedTeachers() -> dict[str,tuple[int,str]]:
     """Return a dict of alphabetized teachers.
     keys: teacher code
@@ -1,8 +1,8 @@
 """Functions for reading and writing the json databases used in QSArchive."""
 
-from collections.abc import Iterable
+from collections.abc import Iterable, MutableMapping
 from collections import defaultdict
-import json, re, itertools
+import json, re, itertools, sys, tracemalloc
 import Html2 as Html
 import Link
 from Build import gDatabase
@@ -11,24 +11,202 @@ import Utils
 import Alert
 import Filter
 import ParseCSV
-from functools import lru_cache
+from typing import NamedTuple
 
 
 gOptions = None
 gDatabase:dict[str] = {} # These will be set later by QSarchive.py
 
-def LoadDatabase(filename: str) -> dict:
-    """Read the database indicated by filename"""
+class Record(MutableMapping):
+    """A dict-compatible record which stores its common keys in __slots__ to save memory.
+    Subclasses list their common keys in __slots__; any other keys are stored in the _extra dict.
+    Like a dict, keys iterate in insertion order, so records write the same json as the dicts they replace."""
 
-    with open(filename, 'r', encoding='utf-8') as file: # Otherwise read the database from disk
-        newDB = json.load(file)
+    __slots__ = ("_extra","_keys")
+    _fieldSet:frozenset[str] = frozenset()
+    _keyOrders:dict[tuple[str],tuple[str]] = {} # Most records share the same key order, so we store each order only once
+
+    def __init_subclass__(cls,**kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fieldSet = frozenset(cls.__slots__)
+
+    def __init__(self,source:dict[str] = {}):
+        self._extra = None
+        for key,value in source.items():
+            self._Store(key,value)
+        self._SetKeys(tuple(source))
+
+    def _SetKeys(self,keys: tuple[str]) -> None:
+        self._keys = Record._keyOrders.setdefault(keys,keys)
+
+    def _Store(self,key:str,value) -> None:
+        if key in self._fieldSet:
+            setattr(self,key,value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __getitem__(self,key:str):
+        if key in self._fieldSet:
+            try:
+                return getattr(self,key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self,key:str,value) -> None:
+        if key not in self:
+            self._SetKeys(self._keys + (key,))
+        self._Store(key,value)
+
+    def __delitem__(self,key:str) -> None:
+        if key in self._fieldSet:
+            try:
+                delattr(self,key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+        self._SetKeys(tuple(k for k in self._keys if k != key))
+
+    def __contains__(self,key:str) -> bool:
+        if key in self._fieldSet:
+            return hasattr(self,key)
+        return bool(self._extra) and key in self._extra
+
+    def get(self,key:str,default=None):
+        if key in self._fieldSet:
+            return getattr(self,key,default)
+        if self._extra:
+            return self._extra.get(key,default)
+        return default
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __copy__(self) -> "Record":
+        return type(self)(self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+class Excerpt(Record):
+    __slots__ = ("event","sessionNumber","excerptNumber","fileNumber","kind","flags","text","teachers","fTags",
+                 "annotations","tags","qTagCount","duration","body","attribution","clips","mirror","books","fragmentFTags",
+                 "attribution2","teachers2","fTagOrder","fTagOrderFlags","texts","startTimeInSession")
+
+class Annotation(Record):
+    __slots__ = ("kind","flags","text","teachers","indentLevel","body","attribution","startTime","endTime","tags","texts","books")
+
+class Session(Record):
+    __slots__ = ("event","sessionNumber","date","filename","duration","teachers","sessionTitle","tags","rawDuration")
+
+class Event(Record):
+    __slots__ = ("title","subtitle","code","series","venue","teachers","startDate","endDate","format","medium",
+                 "tags","website","description","sessions","excerpts","texts","books")
+
+def CompactRecords(database: dict) -> None:
+    """Convert the excerpts, annotations, sessions, and events in database to Record objects in place."""
+
+    excerpts = database["excerpts"]
+    for n,x in enumerate(excerpts):
+        if "annotations" in x:
+            x["annotations"] = [Annotation(a) for a in x["annotations"]]
+        excerpts[n] = Excerpt(x)
+    
+    sessions = database["sessions"]
+    for n,s in enumerate(sessions):
+        sessions[n] = Session(s)
+    
+    events = database["event"]
+    for code in events:
+        events[code] = Event(events[code])
+
+def RecordToDict(item):
+    "Convert Records to dicts when writing json files; pass as default to Utils.WriteJson."
+    if isinstance(item,Record):
+        return dict(item)
+    raise TypeError(f"Object of type {type(item).__name__} is not JSON serializable")
+
+def InternVocabulary(database: dict) -> None:
+    """Replace vocabulary strings (tags, teachers, kinds, flags, and event codes) with interned copies.
+    json.load and the csv reader create a new string for each occurrence; interning stores each distinct
+    string only once and lets dict and set lookups succeed on pointer equality."""
+
+    intern = sys.intern
+    def InternKeys(item: dict,stringKeys: tuple[str],listKeys: tuple[str]) -> None:
+        for key in stringKeys:
+            value = item.get(key)
+            if type(value) == str:
+                item[key] = intern(value)
+        for key in listKeys:
+            value = item.get(key)
+            if value:
+                item[key] = [intern(s) for s in value]
+
+    excerptStrings = ("event","kind","flags")
+    excerptLists = ("teachers","tags","fTags","fragmentFTags","teachers2","teachers3")
+    for x in database["excerpts"]:
+        InternKeys(x,excerptStrings,excerptLists)
+        for a in x["annotations"]:
+            InternKeys(a,excerptStrings,excerptLists)
+    for s in database["sessions"]:
+        InternKeys(s,("event",),("teachers","tags"))
+    for e in database["event"].values():
+        InternKeys(e,("code","venue","format","medium"),("teachers","tags","series"))
+    for t in database["tag"].values():
+        InternKeys(t,("tag","flags"),("subtags","supertags","related"))
+    for t in database["tagDisplayList"]:
+        InternKeys(t,("tag","name","flags"),())
+
+    for vocabulary in ("event","tag","teacher","kind"):
+        database[vocabulary] = {intern(key):value for key,value in database[vocabulary].items()}
+
+def LoadDatabase(filename: str,compactRecords: bool = False) -> dict:
+    """Read the database indicated by filename and intern its vocabulary strings.
+    compactRecords: convert excerpts, annotations, sessions, and events to Record objects."""
+
+    measureMemory = gOptions and gOptions.debug
+    if measureMemory:
+        tracemalloc.start()
+
+    newDB = Utils.ReadJson(filename)
     
     for x in newDB["excerpts"]:
         if "clips" in x:
             x["clips"] = [SplitMp3.Clip(*c) for c in x["clips"]]
     
+    if measureMemory:
+        memoryReport = [f"{tracemalloc.get_traced_memory()[0] / 1e6:.1f} MB as loaded"]
+    InternVocabulary(newDB)
+    if measureMemory:
+        memoryReport.append(f"{tracemalloc.get_traced_memory()[0] / 1e6:.1f} MB after interning vocabulary")
+
+    if compactRecords:
+        CompactRecords(newDB)
+        if measureMemory:
+            memoryReport.append(f"{tracemalloc.get_traced_memory()[0] / 1e6:.1f} MB as compact records")
+    
+    if measureMemory:
+        tracemalloc.stop()
+        Alert.debug(f"Memory used by {filename}:","; ".join(memoryReport))
+
     return newDB
 
+def WriteDatabase(database: dict,filename: str) -> None:
+    """Write database to filename in json format one section and one item at a time.
+    Records are written as dicts."""
+
+    Utils.WriteJsonStream(database,filename,default=RecordToDict)
+
 def RemoveFragments(excerpts: Iterable[dict[str]]) -> Iterable[dict[str]]:
     """Yield these excerpts but skip fragments if their source excerpt is present."""
 
@@ -117,37 +295,49 @@ def ItemCitation(item: dict) -> str:
     return ", ".join(parts)
 
 
-def TagLookup(tagRef:str,tagDictCache:dict = {}) -> str|None:
+@Utils.CacheDerivedData
+def TagLookupDict() -> dict[str,str]:
+    "Return a dict mapping all potential tag references to their base tag name."
+
+    tagDict = {}
+    tagDB = gDatabase["tag"]
+    tagDict.update((tag,tag) for tag in tagDB)
+    tagDict.update((tagDB[tag]["fullTag"],tag) for tag in tagDB)
+    tagDict.update((tagDB[tag]["pali"],tag) for tag in tagDB if tagDB[tag]["pali"])
+    tagDict.update((tagDB[tag]["fullPali"],tag) for tag in tagDB if tagDB[tag]["fullPali"])
+
+    subsumedDB = gDatabase["tagSubsumed"]
+    tagDict.update((tag,subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB)
+    tagDict.update((subsumedDB[tag]["fullTag"],subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB)
+    tagDict.update((subsumedDB[tag]["pali"],subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB if subsumedDB[tag]["pali"])
+    tagDict.update((subsumedDB[tag]["fullPali"],subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB if subsumedDB[tag]["fullPali"])
+
+    return tagDict
+
+def TagLookup(tagRef:str) -> str|None:
     "Search for a tag based on any of its various names. Return the base tag name."
 
-    if not tagDictCache: # modify the value of a default argument to create a cache of potential tag references
-        tagDB = gDatabase["tag"]
-        tagDictCache.update((tag,tag) for tag in tagDB)
-        tagDictCache.update((tagDB[tag]["fullTag"],tag) for tag in tagDB)
-        tagDictCache.update((tagDB[tag]["pali"],tag) for tag in tagDB if tagDB[tag]["pali"])
-        tagDictCache.update((tagDB[tag]["fullPali"],tag) for tag in tagDB if tagDB[tag]["fullPali"])
+    return TagLookupDict().get(tagRef,None)
 
-        subsumedDB = gDatabase["tagSubsumed"]
-        tagDictCache.update((tag,subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB)
-        tagDictCache.update((subsumedDB[tag]["fullTag"],subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB)
-        tagDictCache.update((subsumedDB[tag]["pali"],subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB if subsumedDB[tag]["pali"])
-        tagDictCache.update((subsumedDB[tag]["fullPali"],subsumedDB[tag]["subsumedUnder"]) for tag in subsumedDB if subsumedDB[tag]["fullPali"])
+@Utils.CacheDerivedData
+def TagClusterLookupDict() -> dict[str,str]:
+    "Return a dict mapping all potential tag cluster references to their base tag name."
 
-    return tagDictCache.get(tagRef,None)
+    tagClusterDict = {}
+    clusterDB = gDatabase["subtopic"]
+    tagDB = gDatabase["tag"]
+    tagClusterDict.update((cluster,cluster) for cluster in clusterDB)
+    tagClusterDict.update((clusterDB[cluster]["displayAs"],cluster) for cluster in clusterDB)
+    tagClusterDict.update((tagDB[cluster]["fullTag"],cluster) for cluster in clusterDB)
 
-def TagClusterLookup(clusterRef:str,tagClusterDictCache:dict = {}) -> str|None:
-    "Search for a tag cluster based on any of its various names. Return the base tag name."
+    return tagClusterDict
 
-    if not tagClusterDictCache: # modify the value of a default argument to create a cache of potential tag references
-        clusterDB = gDatabase["subtopic"]
-        tagDB = gDatabase["tag"]
-        tagClusterDictCache.update((cluster,cluster) for cluster in clusterDB)
-        tagClusterDictCache.update((clusterDB[cluster]["displayAs"],cluster) for cluster in clusterDB)
-        tagClusterDictCache.update((tagDB[cluster]["fullTag"],cluster) for cluster in clusterDB)
+def TagClusterLookup(clusterRef:str) -> str|None:
+    "Search for a tag cluster based on any of its various names. Return the base tag name."
 
-    return tagClusterDictCache.get(clusterRef,None)
+    return TagClusterLookupDict().get(clusterRef,None)
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def KeyTopicTags() -> dict[str,None]:
     "Return a dict of tag names which appear in key topics. The dict class simulates an ordered set."
 
@@ -158,7 +348,7 @@ def KeyTopicTags() -> dict[str,None]:
             returnValue[tag] = None
     return returnValue
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def SoloSubtopics() -> set[str]:
     "Return a set of tag names which are subtopics without subtags."
 
@@ -168,7 +358,7 @@ def SoloSubtopics() -> set[str]:
             returnValue.add(subtopic["tag"])
     return returnValue
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def SecondarySubtopics() -> set[str]:
     "Return a set of tag names which are subtopics of more than one key topic."
 
@@ -199,20 +389,25 @@ def ParentTagListEntry(listIndex: int) -> dict|None:
     return None
 
 
-def TeacherLookup(teacherRef:str,teacherDictCache:dict = {}) -> str|None:
-    "Search for a tag based on any of its various names. Return the base tag name."
+@Utils.CacheDerivedData
+def TeacherLookupDict() -> dict[str,str]:
+    "Return a dict mapping teacher codes and lowercase teacher names to teacher codes."
+
+    teacherDB = gDatabase["teacher"]
+    teacherDict = {t:t for t in teacherDB}
+    teacherDict.update((teacherDB[t]["attributionName"].lower(),t) for t in teacherDB)
+    teacherDict.update((teacherDB[t]["fullName"].lower(),t) for t in teacherDB)
+    return teacherDict
 
-    if not teacherDictCache: # modify the value of a default argument to create a cache of potential teacher references
-        teacherDB = gDatabase["teacher"]
-        teacherDictCache.update((t,t) for t in teacherDB)
-        teacherDictCache.update((teacherDB[t]["attributionName"].lower(),t) for t in teacherDB)
-        teacherDictCache.update((teacherDB[t]["fullName"].lower(),t) for t in teacherDB)
+def TeacherLookup(teacherRef:str) -> str|None:
+    "Search for a teacher based on any of its various names. Return the teacher code."
 
     # First try matching case, then not
-    return teacherDictCache.get(teacherRef) or teacherDictCache.get(teacherRef.lower()) or None
+    teacherDict = TeacherLookupDict()
+    return teacherDict.get(teacherRef) or teacherDict.get(teacherRef.lower()) or None
 
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def ExcerptDict() -> dict[str,dict[int,dict[int,dict[str]]]]:
     """Return a dictionary of excerpts that can be referenced as:
     ExcerptDict()[eventCode][sessionNumber][fileNumber]"""
@@ -221,7 +416,7 @@ def ExcerptDict() -> dict[str,dict[int,dict[int,dict[str]]]]:
         excerptDict[x["event"]][x["sessionNumber"]][x["fileNumber"]] = x
     return excerptDict
 
-@lru_cache(maxsize=None)
+@Utils.CacheDerivedData
 def SessionDict() -> dict[str,dict[int,dict[str]]]:
     """Returns a dictionary of sessions that can be referenced as:
     SessionDict()[eventCode][sessionNumber]"""
@@ -363,7 +558,7 @@ def ItemRepr(item: dict) -> str:
     Check the dict keys to guess what it is.
     If we can't identify it, return repr(item)."""
 
-    if type(item) == dict:
+    if type(item) == dict or isinstance(item,Record):
         if "tag" in item:
             if "level" in item:
                 kind = "tagDisplay"
@@ -421,51 +616,108 @@ def ItemRepr(item: dict) -> str:
         return repr(item)
 
 
+class AnnotationTree(NamedTuple):
+    """Index of the annotation hierarchy of an excerpt; annotations are referred to by their list index."""
+    annotations: list[dict]         # excerpt["annotations"] when the tree was built
+    length: int                     # len(annotations) when the tree was built
+    position: dict[int,int]         # id(annotation) -> index in annotations
+    parent: list[int|None]          # Index of each annotation's parent; -1 = the excerpt; None = no parent
+    subtreeEnd: list[int]           # Annotations under annotation n are annotations[n + 1:subtreeEnd[n]]
+    children: list[list[int]]       # Indexes of the annotations directly under each annotation
+    topLevel: list[int]             # Indexes of the annotations directly under the excerpt
+    fragmentOrdinal: list[int]      # The number of Fragment and Main fragment annotations before each annotation
+    fragmentCount: int              # The number of Fragment and Main fragment annotations in the excerpt
+
+gAnnotationTrees:dict[int,AnnotationTree] = {} # id(excerpt) -> its annotation tree; the trees don't refer to the excerpts
+
+def BuildAnnotationTree(excerpt: dict) -> AnnotationTree:
+    """Build the annotation tree for this excerpt."""
+
+    annotations = excerpt["annotations"]
+    levels = [a["indentLevel"] for a in annotations]
+    parent = [None] * len(annotations)
+    subtreeEnd = [len(annotations)] * len(annotations)
+    children = [[] for _ in annotations]
+    topLevel = []
+    fragmentOrdinal = []
+
+    stack = [] # Indexes of the ancestors of the current annotation
+    fragmentCount = 0
+    for n,level in enumerate(levels):
+        while stack and levels[stack[-1]] >= level:
+            subtreeEnd[stack.pop()] = n
+        if level == 1:
+            parent[n] = -1
+            topLevel.append(n)
+        elif stack:
+            parent[n] = stack[-1]
+            if levels[stack[-1]] == level - 1:
+                children[stack[-1]].append(n)
+        stack.append(n)
+
+        fragmentOrdinal.append(fragmentCount)
+        if annotations[n]["kind"] in ("Fragment","Main fragment"):
+            fragmentCount += 1
+
+    return AnnotationTree(annotations,len(annotations),{id(a):n for n,a in enumerate(annotations)},
+                          parent,subtreeEnd,children,topLevel,fragmentOrdinal,fragmentCount)
+
+def AnnotationIndex(excerpt: dict) -> AnnotationTree:
+    """Return the annotation tree for this excerpt, building it if needed.
+    The tree is rebuilt if excerpt["annotations"] has been replaced or changed length. Code which changes
+    the kind or indentLevel of annotations in place must call InvalidateAnnotationTree."""
+
+    tree = gAnnotationTrees.get(id(excerpt))
+    annotations = excerpt["annotations"]
+    if tree is None or tree.annotations is not annotations or tree.length != len(annotations):
+        tree = gAnnotationTrees[id(excerpt)] = BuildAnnotationTree(excerpt)
+    return tree
+
+def InvalidateAnnotationTree(excerpt: dict) -> None:
+    """Call after changing the annotations of excerpt in place."""
+    gAnnotationTrees.pop(id(excerpt),None)
+
+def AnnotationPosition(excerpt: dict,tree: AnnotationTree,annotation: dict) -> int|None:
+    """Return the index of annotation in tree.annotations.
+    Report an error and return None if annotation doesn't belong to the excerpt."""
+    n = tree.position.get(id(annotation))
+    if n is None:
+        Alert.error("Annotation",annotation,"is not an annotation of",excerpt)
+    return n
+
+def BuildAnnotationTrees(excerpts: Iterable[dict]) -> None:
+    """Index the annotations of all these excerpts and discard the trees of all other excerpts.
+    Call whenever the excerpt list is created or its excerpts are replaced."""
+    gAnnotationTrees.clear()
+    for x in excerpts:
+        AnnotationIndex(x)
+
 def ChildAnnotations(excerpt: dict,annotation: dict|None = None) -> list[dict]:
     """Return the annotations that are directly under this annotation or excerpt."""
 
-    if annotation is excerpt:
-        scanLevel = 1
-        scanning = True
+    tree = AnnotationIndex(excerpt)
+    if annotation is None or annotation is excerpt:
+        indexes = tree.topLevel
     else:
-        scanLevel = annotation["indentLevel"] + 1
-        scanning = False
-
-    children = []
-    for a in excerpt["annotations"]:
-        if scanning:
-            if a["indentLevel"] == scanLevel:
-                children.append(a)
-            elif a["indentLevel"] < scanLevel:
-                scanning = False
-                break
-        elif a is annotation:
-            scanning = True
+        n = AnnotationPosition(excerpt,tree,annotation)
+        if n is None:
+            return []
+        indexes = tree.children[n]
 
-    return children
+    return [tree.annotations[i] for i in indexes]
 
 
 def SubAnnotations(excerpt: dict,annotation: dict|None = None) -> list[dict]:
     """Return all annotations contained by this excerpt or annotation."""
 
-    if annotation is excerpt:
-        scanLevel = 1
-        scanning = True
-    else:
-        scanLevel = annotation["indentLevel"] + 1
-        scanning = False
-
-    subs = []
-    for a in excerpt["annotations"]:
-        if scanning:
-            if a["indentLevel"] >= scanLevel:
-                subs.append(a)
-            else:
-                break
-        elif a is annotation:
-            scanning = True
+    tree = AnnotationIndex(excerpt)
+    if annotation is None or annotation is excerpt:
+        return list(tree.annotations)
+    n = AnnotationPosition(excerpt,tree,annotation)
+    if n is None:
+        return []
 
-    return subs
+    return tree.annotations[n + 1:tree.subtreeEnd[n]]
 
 
 def ParentAnnotation(excerpt: dict,annotation: dict) -> dict|None:
@@ -474,18 +726,31 @@ def ParentAnnotation(excerpt: dict,annotation: dict) -> dict|None:
         return None
     if annotation["indentLevel"] == 1:
         return excerpt
-    searchForLevel = 0
-    found = False
-    for searchAnnotation in reversed(excerpt["annotations"]):
-        if searchAnnotation["indentLevel"] <= searchForLevel:
-            if searchAnnotation["indentLevel"] < searchForLevel:
-                Alert.error("Annotation",annotation,f"doesn't have a parent at level {searchForLevel}. Returning prior annotation at level {searchAnnotation['indentLevel']}.")
-            return searchAnnotation
-        if searchAnnotation is annotation:
-            searchForLevel = annotation["indentLevel"] - 1
-    if not found:
+    
+    tree = AnnotationIndex(excerpt)
+    n = AnnotationPosition(excerpt,tree,annotation)
+    if n is None:
+        return None
+    parentIndex = tree.parent[n]
+    if parentIndex is None:
         Alert.error("Annotation",annotation,"doesn't have a proper parent.")
         return None
+    
+    parent = tree.annotations[parentIndex]
+    if parent["indentLevel"] < annotation["indentLevel"] - 1:
+        Alert.error("Annotation",annotation,f"doesn't have a parent at level {annotation['indentLevel'] - 1}. Returning prior annotation at level {parent['indentLevel']}.")
+    return parent
+
+
+def FragmentOrdinal(excerpt: dict,annotation: dict) -> int:
+    """Return the number of Fragment and Main fragment annotations which precede this annotation.
+    If annotation doesn't belong to excerpt, return the number of fragments in the excerpt."""
+
+    tree = AnnotationIndex(excerpt)
+    n = AnnotationPosition(excerpt,tree,annotation)
+    if n is None:
+        return tree.fragmentCount
+    return tree.fragmentOrdinal[n]
 
 
 def SubsumesTags() -> dict:
@@ -48,8 +48,7 @@ class FileRegister():
 
         cachePath = posixpath.join(self.basePath,self.cacheFile)
         try:
-            with open(cachePath, 'r', encoding='utf-8') as file:
-                rawCache = json.load(file)
+            rawCache = Utils.ReadJson(cachePath)
         except FileNotFoundError:
             rawCache = {}
         except json.JSONDecodeError:
@@ -156,8 +155,7 @@ class FileRegister():
             writeDict = {fileName:copy.copy(data) for fileName,data in self.record.items()}
         writeDict = {fileName:self.RecordToJsonItem(data) for fileName,data in writeDict.items()}
 
-        with open(posixpath.join(self.basePath,self.cacheFile), 'w', encoding='utf-8') as file:
-            json.dump(writeDict, file, ensure_ascii=False, indent=2)
+        Utils.WriteJson(writeDict,posixpath.join(self.basePath,self.cacheFile))
         
         if markAsStale:
             for key in self.record:
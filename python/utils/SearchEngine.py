@@ -0,0 +1,385 @@
+"""A Python port of the query engine in pages/js/search.js.
+SearchQuery parses a query string into search groups and terms exactly as search.js does and matches
+them against the items in SearchDatabase.json. SearchIndex reads the n-gram indexes written by SetupSearch.py
+and returns the candidate items which could possibly match a query. ReadSearchShards assembles the searches
+and indexes from the shards in assets/search as search.js does.
+This module doesn't port the parts of search.js which display results (bold text, relevance sorting).
+
+Command line usage (from the home directory):
+python python/utils/SearchEngine.py [--kind x] [--source pages/assets/search] [--strict] [--noIndex] query...
+prints the number of items found, the time taken, and the first blob of the first few items found.
+python/tools/benchmark/SearchBenchmark.py times the unit test queries."""
+
+from __future__ import annotations
+
+import re, unicodedata, argparse, ast, os, sys, time
+import Utils
+from typing import Iterable
+
+TEXT_DELIMITERS = "][{}<>^"
+METADATA_DELIMITERS = "#&@"
+METADATA_SEPERATOR = "|"
+SPECIAL_SEARCH_CHARS = TEXT_DELIMITERS + METADATA_DELIMITERS + "()"
+
+HAS_METADATADELIMITERS = re.compile(f".*[{METADATA_DELIMITERS}]")
+
+def RegExpEscape(literalString: str) -> str:
+    return re.sub(r"[-\[\]{}()*+!<>=:?./\\^$|#\s,]",lambda match: "\\" + match[0],literalString)
+
+ESCAPED_HTML_CHARS = RegExpEscape(SPECIAL_SEARCH_CHARS)
+
+def MatchEnclosedText(separators: str,dontMatchAfterSpace: str) -> str:
+    """Return a regex string that matches the contents between separators.
+    See matchEnclosedText in search.js."""
+
+    escapedStart = RegExpEscape(separators[0])
+    escapedEnd = RegExpEscape(separators[1])
+    return "".join([escapedStart,
+        f"[^{escapedEnd} ]*",
+        "(?:",
+            f"[^{escapedEnd + RegExpEscape(dontMatchAfterSpace)}]*",
+            escapedEnd,
+        ")"
+    ])
+
+def MatchQuotes(quoteChar: str) -> str:
+    "Return a regex string that matches the content between quoteChar."
+    escapedQuoteChar = RegExpEscape(quoteChar)
+    return f"{escapedQuoteChar}[^{escapedQuoteChar}]*{escapedQuoteChar}?"
+
+def SubstituteWildcards(regExpString: str) -> str:
+    """Convert the wildcards * (any characters), _ (one character), and $ (word boundary) to regex strings."""
+
+    bounded = RegExpEscape(re.sub(r"[$*]+$","",re.sub(r"^[$*]+","",regExpString)))
+    if re.match(r"[$*]*",regExpString)[0].endswith("$"):
+        bounded = "\\b" + bounded
+    if re.search(r"[$*]*$",regExpString)[0].startswith("$"):
+        bounded += "\\b"
+
+    return bounded.replace("\\*",f"[^{ESCAPED_HTML_CHARS}]*?").replace("_",f"[^{ESCAPED_HTML_CHARS}]").replace("\\$","\\b")
+
+def CompileJsRegExp(regExp: str) -> re.Pattern:
+    "Compile a Javascript RegExp; without the u flag, \\w, \\b, etc. match only ascii characters."
+    return re.compile(regExp,re.ASCII)
+
+def Grams(text: str,gramLength: int) -> set[str]:
+    "Return the set of substrings of text of length gramLength."
+    return set(text[n:n + gramLength] for n in range(len(text) - gramLength + 1))
+
+def IntersectSorted(a: list[int],b: list[int]) -> list[int]:
+    "Return the intersection of two sorted lists."
+    bSet = set(b)
+    return [n for n in a if n in bSet]
+
+def UnionSorted(lists: Iterable[list[int]]) -> list[int]:
+    "Return the union of sorted lists as a sorted list."
+    return sorted(set().union(*lists))
+
+class SearchIndex:
+    """The n-gram index of one search kind written by SetupSearch.SearchIndex.
+    Postings lists the items whose blobs contain each n-gram, delta-encoded.
+    N-grams which occur in too many items to be useful are listed in common and have no postings."""
+
+    def __init__(self,indexData: dict) -> None:
+        self.gramLength = indexData["gramLength"]
+        self.itemCount = indexData["itemCount"]
+        self.common = set(indexData["common"])
+        self.encodedPostings = indexData["postings"]
+        self.decodedPostings:dict[str,list[int]] = {}
+
+    def Postings(self,gram: str) -> list[int]|None:
+        "Return the sorted item numbers containing gram; None if gram is too common to be indexed."
+        if gram in self.common:
+            return None
+        postings = self.decodedPostings.get(gram)
+        if postings is None:
+            postings = []
+            itemNumber = 0
+            for delta in self.encodedPostings.get(gram,()):
+                itemNumber += delta
+                postings.append(itemNumber)
+            self.decodedPostings[gram] = postings
+        return postings
+
+    def LiteralCandidates(self,literals: Iterable[str]) -> list[int]|None:
+        "Return the items which contain all of literals; None means all items."
+        result = None
+        for literal in literals:
+            for gram in sorted(Grams(literal,self.gramLength)):
+                postings = self.Postings(gram)
+                if postings is None:
+                    continue
+                result = postings if result is None else IntersectSorted(result,postings)
+        return result
+
+UNIT_TEST_FILE = "tools/unitTest/searchUnitTest.js"
+
+def UnitTestQueries(filename: str = UNIT_TEST_FILE) -> list[tuple[str,int]]:
+    "Return (query,expected excerpt count) for each test in unitTestList in searchUnitTest.js."
+    tests = []
+    with open(filename,encoding='utf-8') as file:
+        for line in file:
+            testMatch = re.match(r"\s*(\[.*\]),?\s*$",line)
+            if testMatch:
+                test = ast.literal_eval(testMatch[1]) # Javascript and Python string literals are compatible here
+                if len(test) == 3:
+                    tests.append((test[0],test[1]))
+    return tests
+
+def ReadSearches(source: str) -> tuple[dict[str,dict],dict[str,SearchIndex]]:
+    """Read searches from source, which is either a shard directory or SearchDatabase.json.
+    Return the searches and their indexes; SearchDatabase.json has no indexes."""
+    if os.path.isdir(source):
+        return ReadSearchShards(source)
+    else:
+        return Utils.ReadJson(source)["searches"],{}
+
+def ReadSearchShards(directory: str = "pages/assets/search") -> tuple[dict[str,dict],dict[str,SearchIndex]]:
+    """Read the shards listed in directory/manifest.json.
+    Return the searches in the format of SearchDatabase.json and the SearchIndex of each search that has one."""
+
+    manifest = Utils.ReadJson(Utils.PosixJoin(directory,"manifest.json"))
+    searches = {}
+    indexes = {}
+    for code,entry in manifest["searches"].items():
+        shards = [Utils.ReadJson(Utils.PosixJoin(directory,shard["file"])) for shard in entry["shards"]]
+        search = shards[0]
+        for shard in shards[1:]:
+            search["items"].extend(shard["items"])
+            for key,value in shard.items():
+                if key != "items":
+                    search[key] = search.get(key,{}) | value
+        searches[code] = search
+        if "index" in entry:
+            indexes[code] = SearchIndex(Utils.ReadJson(Utils.PosixJoin(directory,entry["index"]["file"])))
+    return searches,indexes
+
+class SearchBase:
+    "Abstract search class; matches either nothing or everything depending on negate."
+    negate = False
+
+    def MatchesItem(self,item: dict) -> bool:
+        return self.negate
+
+    def FilterItems(self,items: Iterable[dict]) -> list[dict]:
+        return [item for item in items if self.MatchesItem(item)]
+
+    def Candidates(self,index: SearchIndex) -> list[int]|None:
+        """Return the sorted numbers of the items which could match this search; None means all items.
+        The candidates always include every matching item."""
+        return None
+
+class SearchTerm(SearchBase):
+    "A single term in a search query."
+
+    def __init__(self,searchElement: str) -> None:
+        self.negate = False
+        self.matchesMetadata = bool(HAS_METADATADELIMITERS.match(searchElement))
+        self.rawRegExp = searchElement.startswith("`")
+        self.literals:list[str] = [] # Strings that every matching blob must contain
+
+        if self.rawRegExp:
+            finalRegEx = re.sub(r"`$","",re.sub(r"^`","",searchElement))
+        else:
+            if re.fullmatch(r"[0-9]+",searchElement): # Enclose bare numbers in quotes so 7 does not match 37
+                searchElement = '"' + searchElement + '"'
+
+            qTagMatch = aTagMatch = False
+            if re.search(r"\]//$",searchElement): # Does this query match qTags only?
+                searchElement = re.sub(r"/*$","",searchElement,count=1)
+                qTagMatch = True
+            if re.match(r"//\[",searchElement): # Does this query match aTags only?
+                searchElement = re.sub(r"^/*","",searchElement,count=1)
+                aTagMatch = True
+
+            # Replace quote marks at beginning and end with word boundary markers '$'
+            unwrapped = re.sub(r'^"+','$',searchElement,count=1)
+            unwrapped = re.sub(r'"+$','$',unwrapped,count=1)
+            # Remove $ boundary markers if the first/last character is not a word character
+            unwrapped = re.sub(r"^\$(?=\W)","",unwrapped,count=1,flags=re.ASCII)
+            unwrapped = re.sub(r"(\W)\$$",r"\1",unwrapped,count=1,flags=re.ASCII)
+
+            finalRegEx = SubstituteWildcards(unwrapped)
+            if qTagMatch:
+                finalRegEx += "(?=.*//)"
+            if aTagMatch:
+                finalRegEx += "(?!.*//)"
+            self.literals = [s for s in re.split(r"[*_$]",unwrapped) if s]
+
+        try:
+            self.matcher = CompileJsRegExp(finalRegEx)
+        except re.error as error:
+            raise ValueError(f"Invalid {'regular expression' if self.rawRegExp else 'search term'}: {searchElement}") from error
+
+    def MatchesBlob(self,blob: str) -> bool:
+        if not self.matchesMetadata:
+            blob = blob.split(METADATA_SEPERATOR)[0]
+        return bool(self.matcher.search(blob))
+
+    def MatchesItem(self,item: dict) -> bool:
+        for blob in item["blobs"]:
+            if self.MatchesBlob(blob):
+                return not self.negate
+        return self.negate
+
+    def Candidates(self,index: SearchIndex) -> list[int]|None:
+        if self.negate or self.rawRegExp:
+            return None
+        return index.LiteralCandidates(self.literals)
+
+    def __str__(self) -> str:
+        return ("!`" if self.negate else "`") + self.matcher.pattern + "`"
+
+class SearchGroup(SearchBase):
+    "A list of search terms and groups. Subclasses define the operation."
+    prefixChar = ""
+
+    def __init__(self) -> None:
+        self.negate = False
+        self.terms:list[SearchBase] = []
+
+    def AddTerm(self,searchString: str) -> None:
+        self.terms.append(SearchTerm(searchString))
+
+    def Candidates(self,index: SearchIndex) -> list[int]|None:
+        "Items must match all terms by default."
+        if self.negate:
+            return None
+        result = None
+        for term in self.terms:
+            candidates = term.Candidates(index)
+            if candidates is not None:
+                result = candidates if result is None else IntersectSorted(result,candidates)
+        return result
+
+    def __str__(self) -> str:
+        return f"{'!' if self.negate else ''}{self.prefixChar}({' '.join(str(term) for term in self.terms)})"
+
+class SearchAnd(SearchGroup):
+    "Matches an item only if all of its terms match the item."
+    prefixChar = "&"
+
+    def MatchesItem(self,item: dict) -> bool:
+        for term in self.terms:
+            if not term.MatchesItem(item):
+                return self.negate
+        return not self.negate
+
+class SearchOr(SearchGroup):
+    "Matches an item if any of its terms match the item."
+    prefixChar = "|"
+
+    def MatchesItem(self,item: dict) -> bool:
+        for term in self.terms:
+            if term.MatchesItem(item):
+                return not self.negate
+        return self.negate
+
+    def Candidates(self,index: SearchIndex) -> list[int]|None:
+        if self.negate:
+            return None
+        candidateLists = []
+        for term in self.terms:
+            candidates = term.Candidates(index)
+            if candidates is None:
+                return None
+            candidateLists.append(candidates)
+        return UnionSorted(candidateLists)
+
+class SingleItemSearch(SearchGroup):
+    "Matches an item only if all of its terms match a single blob within that item."
+    prefixChar = "~"
+
+    def MatchesItem(self,item: dict) -> bool:
+        for blob in item["blobs"]:
+            singleBlobItem = {"blobs": [blob]}
+            if all(term.MatchesItem(singleBlobItem) for term in self.terms):
+                return not self.negate
+        return self.negate
+
+class SearchQuery:
+    "A search query parsed into search groups."
+
+    def __init__(self,queryText: str,strict: bool = False) -> None:
+        # 0. Convert query to lowercase and remove diacritics
+        queryText = re.sub(r"\\.|[^\\]+",lambda match: match[0] if match[0].startswith("\\") else match[0].lower(),queryText)
+        queryText = re.sub("[\u0300-\u036f]","",unicodedata.normalize("NFD",queryText))
+        self.queryText = queryText
+
+        # 1. Build a regex to parse queryText into items
+        regularTextParts = [
+            "[^()&|~! ]",        # Any character that can't be the start or end of a group
+            "[!](?![&|~]?[(])",  # Any "!" that doesn't begin a group
+            "[&|~](?![(])"       # Any "&", "|", or "~" that doesn't begin a group
+        ]
+        parts = [
+            "[&|~]?\\(",
+            MatchQuotes('"'),
+            MatchQuotes('`'),
+            MatchEnclosedText('{}',SPECIAL_SEARCH_CHARS),
+            "/*" + MatchEnclosedText('[]',SPECIAL_SEARCH_CHARS) + "\\+?/*",
+            f"(?:{'|'.join(regularTextParts)})+"
+        ]
+        partsSearch = f"\\s*\\)|\\s*(!?)({'|'.join(parts)})"
+
+        # 2. Create items and groups from the found parts
+        currentGroup = SingleItemSearch() if strict else SearchAnd()
+        groupStack = [currentGroup]
+        for match in re.finditer(partsSearch,queryText):
+            if match[0].strip() == ")": # ")" ends a group
+                if len(groupStack) >= 2:
+                    groupStack.pop()
+                    currentGroup = groupStack[-1]
+            elif match[2].endswith("("): # "(" begins a new group
+                currentGroup = {"&": SearchAnd,"(": SearchAnd,"|": SearchOr,"~": SingleItemSearch}[match[2][0]]()
+                if match[1]:
+                    currentGroup.negate = True
+                groupStack[-1].terms.append(currentGroup)
+                groupStack.append(currentGroup)
+            else:
+                currentGroup.AddTerm(match[2].strip())
+                if match[1]: # Negate expressions preceeded by '!'
+                    currentGroup.terms[-1].negate = True
+        self.searcher = groupStack[0]
+
+    def FilterItems(self,items: Iterable[dict]) -> list[dict]:
+        "Return the items which match this query."
+        return self.searcher.FilterItems(items)
+
+    def Candidates(self,index: SearchIndex) -> list[int]|None:
+        "Return the numbers of the items which could match this query; None means all items."
+        return self.searcher.Candidates(index)
+
+    def Search(self,items: list[dict],index: SearchIndex|None = None) -> list[dict]:
+        "Return the items which match this query, using index to skip items which can't match."
+        candidates = self.Candidates(index) if index else None
+        if candidates is not None:
+            items = [items[n] for n in candidates]
+        return self.FilterItems(items)
+
+def Main() -> None:
+    parser = argparse.ArgumentParser(description="Search the archive as pages/js/search.js does.")
+    parser.add_argument("query",nargs="+",help="Search query; multiple arguments are joined with spaces")
+    parser.add_argument("--kind",default="x",help="Search code to search; default x (excerpts)")
+    parser.add_argument("--source",default="pages/assets/search",help="Shard directory or SearchDatabase.json; default pages/assets/search")
+    parser.add_argument("--strict",**Utils.STORE_TRUE,help="All terms must match a single blob")
+    parser.add_argument("--noIndex",**Utils.STORE_TRUE,help="Match every item rather than using the index")
+    parser.add_argument("--show",type=int,default=10,help="Number of items to print; default 10")
+    options = parser.parse_args()
+
+    searches,indexes = ReadSearches(options.source)
+    items = searches[options.kind]["items"]
+    index = None if options.noIndex else indexes.get(options.kind)
+    query = SearchQuery(" ".join(options.query),strict=options.strict)
+
+    start = time.perf_counter()
+    found = query.Search(items,index)
+    elapsed = time.perf_counter() - start
+
+    print(f"Query: {query.searcher}")
+    print(f"Found {len(found)} of {len(items)} {searches[options.kind]['name']} items in {elapsed * 1000:.1f} ms{' using the index' if index else ''}.")
+    for item in found[:options.show]:
+        print("  " + item["blobs"][0])
+
+if __name__ == "__main__":
+    Main()
@@ -35,16 +35,14 @@ def CacheJsonFile(cacheDir: str,indent:None|int = 2) -> Callable[...,dict]:
 
             if os.path.isfile(cachedFilePath):
                 try:
-                    with open(cachedFilePath, 'r', encoding='utf-8') as file:
-                        return json.load(file)
+                    return Utils.ReadJson(cachedFilePath)
                 except Exception as error:
                     Alert.error(error,"when opening",cachedFilePath,". Will try to regenerate the json file.")
             
             Alert.info("Generating json file:",cachedFilePath)
             os.makedirs(cacheDir,exist_ok=True)
             returnDict = dictGenerator(*args)
-            with open(cachedFilePath, 'w', encoding='utf-8') as file:
-                json.dump(returnDict,file,ensure_ascii=False,indent=indent)
+            Utils.WriteJson(returnDict,cachedFilePath,indent=indent)
             return returnDict
             
         return CachedDictGenerator
@@ -193,15 +191,13 @@ def MakeSnpIndex() -> None:
     indexDir = "sutta/suttaplex/index"
     os.makedirs(indexDir,exist_ok=True)
     destPath = Utils.PosixJoin(indexDir,"snp-vnp" + ".json")
-    with open(destPath, 'w', encoding='utf-8') as file:
-        json.dump(SuttaIndex("snp","vnp"),file,ensure_ascii=False,indent=2)
+    Utils.WriteJson(SuttaIndex("snp","vnp"),destPath)
 
 def MakeThigIndex() -> None:
     indexDir = "sutta/suttaplex/index"
     os.makedirs(indexDir,exist_ok=True)
     destPath = Utils.PosixJoin(indexDir,"thig-vnp" + ".json")
-    with open(destPath, 'w', encoding='utf-8') as file:
-        json.dump(SuttaIndex("thig","vnp"),file,ensure_ascii=False,indent=2)
+    Utils.WriteJson(SuttaIndex("thig","vnp"),destPath)
 
 @lru_cache(maxsize=None)
 def SuttaIndex(textUid:str) -> dict[str,SuttaIndexEntry]:
@@ -361,8 +357,7 @@ def PrintTranslatorCount():
 
 def DhammapadaVerses() -> dict[int,str]:
     """Return a dict of Dhammapada verses."""
-    with open("sutta/dhammapada/Dhammapada.json", 'r', encoding='utf-8') as file:
-        dhammapada = json.load(file)
+    dhammapada = Utils.ReadJson("sutta/dhammapada/Dhammapada.json")
 
     return {int(n):verse for n,verse in dhammapada.items() if re.match(r"[0-9]",n)}
 
@@ -0,0 +1,72 @@
+"""Text normalization functions which are applied to every string in the database.
+Patterns are compiled once, character mappings use str.translate, and each function skips the work
+when a quick substring test shows it would have no effect. The results are identical to the
+straightforward chains of re.sub calls that these functions replace; python/tools/benchmark/TextBenchmark.py checks this."""
+
+from __future__ import annotations
+
+import re
+import DjangoTextUtils
+
+def RemoveDiacritics(string: str) -> str:
+    "Remove diacritics from string."
+    if string.isascii(): # NFKD normalization doesn't change ascii strings
+        return string
+    return DjangoTextUtils.RemoveDiacritics(string)
+
+htmlTagRegex = re.compile(r"\<[^>]*\>")
+
+def RemoveHtmlTags(html: str) -> str:
+    if "<" not in html:
+        return html
+    return htmlTagRegex.sub("",html)
+
+rightDoubleQuoteRegex = re.compile(r'([a-zA-Z0-9.,?!;:)>%/\'\"])"')
+doubleQuoteAttributeRegex = re.compile(r'=“(.*?)”')
+rightSingleQuoteRegex = re.compile(r"([a-zA-Z0-9.,?!;:)>%/\"\'])'")
+singleQuoteAttributeRegex = re.compile(r'=‘(.*?)’')
+
+def SmartQuotes(s: str):
+    """Takes a string and returns it with dumb quotes, single and double,
+    replaced by smart quotes. Accounts for the possibility of HTML tags
+    within the string.
+    Based on https://gist.github.com/davidtheclark/5521432"""
+
+    if '"' in s or '=“' in s:
+        # Find dumb double quotes coming directly after letters or punctuation,
+        # and replace them with right double quotes.
+        s = rightDoubleQuoteRegex.sub(r'\1”', s)
+        # Find any remaining dumb double quotes and replace them with
+        # left double quotes.
+        s = s.replace('"', '“')
+        # Reverse: Find any SMART quotes that have been (mistakenly) placed around HTML
+        # attributes (following =) and replace them with dumb quotes.
+        if '=“' in s:
+            s = doubleQuoteAttributeRegex.sub(r'="\1"', s)
+    if "'" in s or '=‘' in s:
+        # Follow the same process with dumb/smart single quotes
+        s = rightSingleQuoteRegex.sub(r'\1’', s)
+        s = s.replace("'", '‘')
+        if '=‘' in s:
+            s = singleQuoteAttributeRegex.sub(r"='\1'", s)
+    return s
+
+blobPunctuation = str.maketrans({"‘": "'", "’": "'", '"': "'", "“": "'", "”": "'", # Convert all quotes to single quotes
+                                 "–": "-", "—": "-"}) # Convert all dashes to hypens
+blobSymbols = str.maketrans("|"," ", # Convert these characters to a space
+                            "][#()@_*^") # Remove these characters
+templateExpressionRegex = re.compile(r"\{[^>]*\}")
+markdownLinkRegex = re.compile(r"!?\[([^]]*)\]\([^)]*\)")
+
+def RawBlobify(item: str) -> str:
+    """Convert item to lowercase, remove diacritics, special characters,
+    remove html tags, ++Kind++ markers, and Markdown hyperlinks, and normalize whitespace."""
+    output = RemoveDiacritics(item.translate(blobPunctuation).lower())
+    output = RemoveHtmlTags(output)
+    if "{" in output:
+        output = templateExpressionRegex.sub("",output) # Remove template evaluation expressions, e.g. {teachers}
+    if "](" in output:
+        output = markdownLinkRegex.sub(r"\1",output) # Extract text from Markdown hyperlinks
+    output = output.replace("++","") # Remove ++ bold format markers
+    output = output.translate(blobSymbols)
+    return " ".join(output.split()) # Normalize whitespace
@@ -4,18 +4,125 @@ from __future__ import annotations
 
 from datetime import timedelta, datetime
 import copy
-import re, os,argparse
+import re, os, sys, argparse, json, multiprocessing, hashlib
 from typing import BinaryIO, TypeVar
 import Alert
 import pathlib, posixpath
 from collections import Counter
-from collections.abc import Iterable, Callable
+from collections.abc import Iterable, Callable, Mapping
 from urllib.parse import urljoin,urlparse,quote,urlunparse,unquote
 import urllib.request, urllib.error
-from DjangoTextUtils import slugify, RemoveDiacritics
-from concurrent.futures import ThreadPoolExecutor
+from DjangoTextUtils import slugify
+from TextUtils import RemoveDiacritics, RemoveHtmlTags, SmartQuotes
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 gOptions = None
+gDatabase:dict[str] = {} # These globals are set by QSarchive.py
+
+gDatabaseGeneration = 0 # Incremented whenever gDatabase is replaced; see NewDatabaseGeneration
+gCacheRegistry:dict[str,"DerivedCache"] = {}
+
+class DerivedCache():
+    """Cache the return values of a function whose results are derived from gDatabase or other global data.
+    All DerivedCaches are listed in gCacheRegistry. A cache discards its contents when the database generation changes."""
+
+    def __init__(self,function: Callable,name: str) -> None:
+        self.function = function
+        self.name = name
+        self.values = {}
+        self.generation = gDatabaseGeneration
+        self.hits = self.misses = 0
+        self.__doc__ = function.__doc__
+        self.__wrapped__ = function
+
+    def __call__(self,*args,**kwargs):
+        if self.generation != gDatabaseGeneration:
+            self.Invalidate()
+        key = (args + tuple(kwargs.items())) if kwargs else args
+        try:
+            value = self.values[key]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            value = self.values[key] = self.function(*args,**kwargs)
+        return value
+
+    def Invalidate(self) -> None:
+        "Discard all cached values."
+        self.values = {}
+        self.generation = gDatabaseGeneration
+
+    def Statistics(self) -> str:
+        return f"{self.name}: {self.hits} hits, {self.misses} misses, {len(self.values)} entries"
+
+def CacheDerivedData(function: Callable) -> DerivedCache:
+    """Decorator to register function in gCacheRegistry.
+    Unlike functools.lru_cache, the cache is discarded when the database changes."""
+
+    cache = DerivedCache(function,f"{function.__module__}.{function.__qualname__}")
+    gCacheRegistry[cache.name] = cache
+    return cache
+
+def MappingToDict(item):
+    "Convert Mappings such as Database.Record to dicts when encoding json; pass as default to json.dumps."
+    if isinstance(item,Mapping):
+        return dict(item)
+    raise TypeError(f"Object of type {type(item).__name__} is not JSON serializable")
+
+def Fingerprint(*items) -> str:
+    "Return a hash of the json representation of items."
+    jsonStr = json.dumps(items,sort_keys=True,ensure_ascii=False,default=MappingToDict)
+    return hashlib.blake2b(jsonStr.encode("utf-8"),digest_size=16).hexdigest()
+
+def VersionFingerprint(sourceFiles: Iterable[str],dependencies: dict[str,tuple|None],optionNames: Iterable[str],*extra) -> str:
+    """Return a fingerprint of the code in sourceFiles, the tables of gDatabase in dependencies, the options in optionNames, and extra.
+    dependencies maps table names to the fields which don't matter; see Render.RENDER_DEPENDENCIES."""
+
+    codeHash = hashlib.blake2b(digest_size=16)
+    for sourceFile in sourceFiles:
+        with open(sourceFile,"rb") as file:
+            codeHash.update(file.read())
+
+    tables = {}
+    for tableName,ignoreFields in dependencies.items():
+        table = gDatabase.get(tableName,{})
+        if ignoreFields is None:
+            tables[tableName] = list(table)
+            continue
+        items = table.items() if isinstance(table,dict) else enumerate(table)
+        tables[tableName] = [(key,{field:value for field,value in item.items() if field not in ignoreFields}) for key,item in items]
+    
+    options = {option:getattr(gOptions,option,None) for option in optionNames}
+    return Fingerprint(codeHash.hexdigest(),*extra,options,tables)
+
+def NewDatabaseGeneration() -> int:
+    "Call when gDatabase is replaced or modified to invalidate all derived caches. Returns the new generation number."
+    global gDatabaseGeneration
+    gDatabaseGeneration += 1
+    return gDatabaseGeneration
+
+def InvalidateCaches(names: Iterable[str]|None = None) -> None:
+    "Invalidate the named caches or all caches if names is None."
+    for name in (gCacheRegistry if names is None else names):
+        gCacheRegistry[name].Invalidate()
+
+def WarmCaches(names: Iterable[str]|None = None) -> None:
+    "Fill the named caches (or all caches) which take no arguments."
+    for name in (gCacheRegistry if names is None else names):
+        cache = gCacheRegistry[name]
+        if cache.function.__code__.co_argcount == 0:
+            cache()
+
+def ReportCacheStatistics(printer: Alert.AlertClass) -> None:
+    "Print statistics for all caches which have been used."
+    for cache in gCacheRegistry.values():
+        if cache.hits or cache.misses:
+            printer(cache.Statistics())
 
 def Contents(container:list|dict) -> list:
     "If container is a mapping, return an iterable of its values; otherwise return container itself"
@@ -64,9 +171,6 @@ PosixSplit = posixpath.split
 PosixRelpath = posixpath.relpath
 PosixNorm = posixpath.normpath
 
-def RemoveHtmlTags(html: str) -> str:
-    return re.sub(r"\<[^>]*\>","",html)
-
 def DirectoryURL(url:str) -> str:
     "Ensure that this url specifies a directory path."
     if url.endswith("/"):
@@ -157,19 +261,156 @@ def AppendToFilename(filename:str, appendStr: str) -> str:
     name,ext = os.path.splitext(filename)
     return name + appendStr + ext
 
-def AboutPageLookup(pageName:str,aboutPageCache:dict = {}) -> str|None:
+@CacheDerivedData
+def AboutPageDict() -> dict[str,str]:
+    "Return a dict of the about pages indexed by lowercase name."
+
+    aboutPageDict = {}
+    dirs = ["about"]
+    for dir in dirs:
+        fileList = os.listdir(PosixJoin(gOptions.pagesDir,dir))
+        for file in fileList:
+            m = re.match(r"(.*)\.html",file)
+            if m:
+                aboutPageDict[m[1].lower()] = PosixJoin(dir,m[0])
+    return aboutPageDict
+
+def AboutPageLookup(pageName:str) -> str|None:
     "Search for an about page based on its name. Return the path to the page relative to pagesDir."
 
-    if not aboutPageCache: # modify the value of a default argument to create a cache of potential tag references
-        dirs = ["about"]
-        for dir in dirs:
-            fileList = os.listdir(PosixJoin(gOptions.pagesDir,dir))
-            for file in fileList:
-                m = re.match(r"(.*)\.html",file)
-                if m:
-                    aboutPageCache[m[1].lower()] = PosixJoin(dir,m[0])
+    return AboutPageDict().get(pageName.lower().replace(" ","-"),None)
+
+gFastJson = orjson is not None # Set to False to always use the standard library json module
+
+def ReadJson(filename: str):
+    "Read the json file filename using orjson if it is installed."
+
+    if gFastJson:
+        with open(filename, 'rb') as file:
+            return orjson.loads(file.read())
+    with open(filename, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def JsonString(obj,indent: int|None = 2,default: Callable|None = None) -> str:
+    """Return obj encoded as json. The output is identical to
+    json.dumps(obj,ensure_ascii=False,indent=indent,default=default).
+    orjson is used only when indent == 2, as its other output formats don't match the json module.
+    orjson formats very large and very small floats differently, but our databases don't contain these."""
+
+    if gFastJson and indent == 2:
+        def OrjsonDefault(item):
+            if isinstance(item,tuple): # orjson doesn't serialize NamedTuples
+                return list(item)
+            if default:
+                return default(item)
+            raise TypeError(f"Object of type {type(item).__name__} is not JSON serializable")
+        
+        return orjson.dumps(obj,default=OrjsonDefault,option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    else:
+        return json.dumps(obj, ensure_ascii=False, indent=indent, default=default)
 
-    return aboutPageCache.get(pageName.lower().replace(" ","-"),None)
+def WriteJson(obj,filename: str,indent: int|None = 2,default: Callable|None = None) -> None:
+    """Write obj to filename in json format. The output is identical to
+    json.dump(obj,file,ensure_ascii=False,indent=indent,default=default)."""
+
+    if gFastJson and indent == 2:
+        with open(filename, 'w', encoding='utf-8') as file: # Text mode translates line endings as json.dump does
+            file.write(JsonString(obj,indent,default))
+    else:
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(obj, file, ensure_ascii=False, indent=indent, default=default)
+
+@contextmanager
+def AtomicWrite(filename: str):
+    """Open filename + ".tmp" for writing in text mode. When the context exits, replace filename with it.
+    If an exception occurs, delete the temporary file and leave filename unchanged."""
+
+    tempFilename = filename + ".tmp"
+    try:
+        with open(tempFilename, 'w', encoding='utf-8') as file:
+            yield file
+        os.replace(tempFilename,filename)
+    except BaseException:
+        if os.path.exists(tempFilename):
+            os.remove(tempFilename)
+        raise
+
+def StreamJson(obj,file,level: int = 0,streamDepth: int = 2,indent: int = 2,default: Callable|None = None) -> None:
+    """Write obj to file in json format at nesting level.
+    Dicts and lists nested less than streamDepth deep are written item by item;
+    deeper items are encoded in a single call to JsonString."""
+
+    if streamDepth > 0 and obj and (type(obj) == list or (type(obj) == dict and all(type(key) == str for key in obj))):
+        isDict = type(obj) == dict
+        itemSeparator = "\n" + " " * (indent * (level + 1))
+        file.write("{" if isDict else "[")
+        for n,item in enumerate(obj.items() if isDict else obj):
+            file.write(itemSeparator if n == 0 else "," + itemSeparator)
+            if isDict:
+                key,item = item
+                file.write(json.dumps(key, ensure_ascii=False) + ": ")
+            StreamJson(item,file,level + 1,streamDepth - 1,indent,default)
+        file.write("\n" + " " * (indent * level) + ("}" if isDict else "]"))
+    else:
+        output = JsonString(obj,indent,default)
+        if level:
+            output = output.replace("\n","\n" + " " * (indent * level)) # json strings never contain a literal newline
+        file.write(output)
+
+def WriteJsonStream(obj,filename: str,streamDepth: int = 2,indent: int = 2,default: Callable|None = None) -> None:
+    """Write obj to filename in json format section by section so that we never hold the entire encoded file in memory.
+    The file is replaced atomically, so an interrupted run never leaves a half-written file.
+    The output is identical to WriteJson(obj,filename,indent,default)."""
+
+    with AtomicWrite(filename) as file:
+        StreamJson(obj,file,streamDepth=streamDepth,indent=indent,default=default)
+
+class HashedJsonWriter():
+    """Write json files in compact form to directory. Each call to Write returns an entry {"file","hash"} where
+    hash is the start of the file's md5 hash so that browsers can cache the file until it changes.
+    Files whose contents are unchanged aren't touched; the others are replaced atomically."""
+
+    def __init__(self,directory: str):
+        self.directory = directory
+        self.files:set[str] = set() # The files written or found unchanged so far
+        self.written = 0
+        self.unchanged = 0
+
+    def Write(self,fileName: str,obj) -> dict[str,str]:
+        """Write obj to fileName relative to directory and return its entry."""
+
+        text = json.dumps(obj,ensure_ascii=False,separators=(",",":"))
+        filePath = PosixJoin(self.directory,fileName)
+        try:
+            with open(filePath,'r',encoding='utf-8') as file:
+                unchanged = file.read() == text
+        except (OSError,UnicodeDecodeError):
+            unchanged = False
+
+        if unchanged:
+            self.unchanged += 1
+        else:
+            os.makedirs(PosixSplit(filePath)[0],exist_ok=True)
+            with AtomicWrite(filePath) as file:
+                file.write(text)
+            self.written += 1
+        self.files.add(fileName)
+        return {"file": fileName,"hash": hashlib.md5(text.encode("utf-8"),usedforsecurity=False).hexdigest()[:12]}
+
+    def RemoveOtherFiles(self,keep: Iterable[str] = ()) -> int:
+        """Delete the .json files in directory and its subdirectories which haven't been written and aren't in keep.
+        Then remove empty folders and return the number of files deleted."""
+
+        keep = self.files | set(keep)
+        removed = 0
+        for root,_,files in os.walk(self.directory):
+            for file in files:
+                fileName = PosixRelpath(PosixJoin(root,file),self.directory)
+                if fileName.endswith(".json") and fileName not in keep:
+                    os.remove(PosixJoin(self.directory,fileName))
+                    removed += 1
+        RemoveEmptyFolders(self.directory)
+        return removed
 
 def Singular(noun: str) -> str:
     "Use simple rules to guess the singular form or a noun."
@@ -188,27 +429,6 @@ def EllideText(s: str,maxLength = 50,endAtWordBoundary = False) -> str:
             return wordBoundaryMatch[0].strip() + "..."
     return s[:maxLength - 3] + "..."
 
-def SmartQuotes(s: str):
-    """Takes a string and returns it with dumb quotes, single and double,
-    replaced by smart quotes. Accounts for the possibility of HTML tags
-    within the string.
-    Based on https://gist.github.com/davidtheclark/5521432"""
-
-    # Find dumb double quotes coming directly after letters or punctuation,
-    # and replace them with right double quotes.
-    s = re.sub(r'([a-zA-Z0-9.,?!;:)>%/\'\"])"', r'\1”', s)
-    # Find any remaining dumb double quotes and replace them with
-    # left double quotes.
-    s = s.replace('"', '“')
-    # Reverse: Find any SMART quotes that have been (mistakenly) placed around HTML
-    # attributes (following =) and replace them with dumb quotes.
-    s = re.sub(r'=“(.*?)”', r'="\1"', s)
-    # Follow the same process with dumb/smart single quotes
-    s = re.sub(r"([a-zA-Z0-9.,?!;:)>%/\"\'])'", r'\1’', s)
-    s = s.replace("'", '‘')
-    s = re.sub(r'=‘(.*?)’', r"='\1'", s)
-    return s
-
 def CapitalizeFirst(s: str) -> str:
     """Capitalize the first letter of str without any other changes."""
 
@@ -251,11 +471,43 @@ def SessionIndex(sessions:list, event:str ,sessionNum: int) -> int:
     
     raise ValueError(f"Can't locate session {sessionNum} of event {event}")
 
-def RegexMatchAny(strings: Iterable[str],capturingGroup = True,literal = False):
+def TrieRegex(strings: Iterable[str]) -> str:
+    """Return a regular expression matching any of the literal strings in which common prefixes are shared.
+    For example, ["BiPj","BiPc","Bu"] produces "B(?:iP(?:c|j)|u)".
+    When one string is a prefix of another, the longer string is tried first."""
+
+    trie = {}
+    for string in strings:
+        node = trie
+        for char in string:
+            node = node.setdefault(char,{})
+        node[""] = {} # Marks the end of a string
+
+    def NodeRegex(node: dict) -> str:
+        branches = [re.escape(char) + NodeRegex(child) for char,child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        regex = "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            regex += "?" # Greedy optional group: try to match the longer strings first
+        return regex
+
+    return NodeRegex(trie)
+
+def RegexMatchAny(strings: Iterable[str],capturingGroup = True,literal = False,trie = False):
     """Return a regular expression that matches any item in strings.
-    Optionally make it a capturing group."""
+    Optionally make it a capturing group.
+    trie: Build a prefix-trie regex using TrieRegex, which is faster for long lists.
+        strings are then treated as literals, and when one string is a prefix of another the longer is matched first."""
 
-    if literal:
+    if trie:
+        strings = list(strings)
+        if strings:
+            regex = TrieRegex(strings)
+            return f"({regex})" if capturingGroup else f"(?:{regex})"
+    elif literal:
         strings = [re.escape(s) for s in strings]
     else:
         strings = list(strings)
@@ -326,6 +578,55 @@ class MockThreadPoolExecutor():
 def ConditionalThreader() -> ThreadPoolExecutor|MockThreadPoolExecutor:
     return ThreadPoolExecutor() if gOptions.multithread else MockThreadPoolExecutor()
 
+gWarnedJobs = False # Warn only once that --jobs is being reduced
+
+def CanForkWorkers() -> bool:
+    "Return True if this platform can fork worker processes; see WorkerPool."
+    return "fork" in multiprocessing.get_all_start_methods()
+
+def CpuCount() -> int:
+    "Return the number of CPUs this process can use."
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on Windows or macOS
+        return os.cpu_count() or 1
+
+def ProcessCount() -> int:
+    """Return the number of worker processes specified by --jobs; 0 means one per CPU.
+    More processes than CPUs only add overhead, so return at most CpuCount().
+    Return 1 if this platform can't fork worker processes."""
+    global gWarnedJobs
+    if not CanForkWorkers():
+        if gOptions.jobs > 1 and not gWarnedJobs:
+            gWarnedJobs = True
+            Alert.caution("This platform can't fork worker processes; ignoring --jobs",gOptions.jobs,"and using a single process.")
+        return 1
+    cpus = CpuCount()
+    if gOptions.jobs > cpus and not gWarnedJobs:
+        gWarnedJobs = True
+        Alert.caution("--jobs",gOptions.jobs,f"exceeds the {cpus} available CPU{'s' if cpus > 1 else ''}; using {cpus} process{'es' if cpus > 1 else ''}.")
+    if gOptions.jobs > 0:
+        return min(gOptions.jobs,cpus)
+    else:
+        return cpus
+
+def WorkerPool(jobs: int,initializer: Callable,initargs: tuple) -> ProcessPoolExecutor:
+    """Return a pool of jobs worker processes forked from this process. Call only if ProcessCount() > 1.
+    Workers must be forked whatever the platform's default start method: spawned and forkserver workers
+    would re-run QSarchive.py when they import it and can't receive gOptions, which can't be pickled."""
+    return ProcessPoolExecutor(max_workers=jobs,mp_context=multiprocessing.get_context("fork"),
+                               initializer=initializer,initargs=initargs)
+
+def InitializeWorkerGlobals(database: dict[str],options,verbosity: int) -> None:
+    "Set gDatabase, gOptions, and the alert verbosity of our modules in a worker process."
+    for module in list(sys.modules.values()):
+        if hasattr(module,"gDatabase"): # Our modules define gDatabase and gOptions
+            module.gDatabase = database
+            module.gOptions = options
+    Alert.verbosity = verbosity
+    Alert.Debugging(options.debug)
+    NewDatabaseGeneration()
+
 try:
     STORE_TRUE = dict(action=argparse.BooleanOptionalAction,default=False)
 except AttributeError:
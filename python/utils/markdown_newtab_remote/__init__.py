@@ -17,6 +17,8 @@ from markdown.inlinepatterns import \
 
 from urllib.parse import urlparse
 
+__version__ = "1.0" # Increment when the html output changes; Render.py uses this to version its markdown cache
+
 class NewTabMixin(object):
     def handleMatch(self, m, data):
         el, start, end = super(NewTabMixin, self).handleMatch(m, data)
@@ -30,6 +30,15 @@ async function loadDatabase() {
             gSearcher = new ExcerptSearcher();
             gSearcher.loadItemsFomDatabase(gDatabase);
         });
+        await fetch('../../pages/assets/search/manifest.json')
+        .then((response) => response.json())
+        .then((manifest) => fetch('../../pages/assets/search/' + manifest.searches.x.index.file))
+        .then((response) => response.json())
+        .then((json) => {
+            gSearcher.loadSearch("x",gDatabase,json);
+            showStatus(`Loaded search database and index.`);
+        })
+        .catch(() => showStatus(`Loaded search database; no search index.`));
     }
 }
 